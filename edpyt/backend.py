@@ -0,0 +1,102 @@
+"""Registry of compute backends.
+
+A backend provides the compiled kernels used by the operators:
+    psparse : sparse matrix vector products (see edpyt._psparse).
+    continued_fraction : continued_fraction(z, a, b).
+
+By default the Cython extensions are used if they can be imported,
+otherwise the pure numba implementation (edpyt.numba_backend). The
+default can be overridden with the EDPYT_BACKEND environment variable
+or at runtime with set_backend.
+
+"""
+import os
+from collections import namedtuple
+from importlib import import_module
+
+
+Backend = namedtuple('Backend',['name','psparse','continued_fraction'])
+
+_loaders = {}
+_loaded = {}
+_active = None
+
+
+def register_backend(name, loader):
+    """Register a backend.
+
+    Args:
+        loader : callable returning a Backend. Must raise ImportError
+            if the backend is not available.
+    """
+    _loaders[name] = loader
+    _loaded.pop(name, None)
+
+
+def load_backend(name):
+    """Load (and cache) backend `name`."""
+    if name not in _loaders:
+        raise ValueError(
+            f"Unknown backend {name}. Available are {list(_loaders)}.")
+    if name not in _loaded:
+        _loaded[name] = _loaders[name]()
+    return _loaded[name]
+
+
+def available_backends():
+    """Names of the backends that can be loaded."""
+    names = []
+    for name in _loaders:
+        try:
+            load_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def set_backend(name):
+    """Select the active backend."""
+    global _active
+    _active = load_backend(name)
+    return _active
+
+
+def get_backend():
+    """Return the active backend."""
+    if _active is None:
+        _set_default_backend()
+    return _active
+
+
+def active_backend():
+    """Name of the active backend."""
+    return get_backend().name
+
+
+def _set_default_backend():
+    name = os.environ.get('EDPYT_BACKEND')
+    if name is not None:
+        return set_backend(name)
+    for name in _loaders:
+        try:
+            return set_backend(name)
+        except ImportError:
+            continue
+    raise ImportError('No backend available.')
+
+
+def _load_cython():
+    psparse = import_module('edpyt._psparse')
+    cf = import_module('edpyt._continued_fraction')
+    return Backend('cython', psparse, cf.continued_fraction)
+
+
+def _load_numba():
+    numba_backend = import_module('edpyt.numba_backend')
+    return Backend('numba', numba_backend, numba_backend.continued_fraction)
+
+
+# Order sets the default preference.
+register_backend('cython', _load_cython)
+register_backend('numba', _load_numba)
@@ -1,4 +1,5 @@
 import numpy as np
+from dataclasses import replace
 from warnings import warn
 # Compiled
 from numba import njit, prange
@@ -21,7 +22,7 @@ Conventions:
 
 """
 
-def build_mb_ham(H, V, sct, comm=None):
+def build_mb_ham(H, V, sct, comm=None, dtype=np.float64):
     """Build sparse Hamiltonian of the sector.
 
     Args:
@@ -35,6 +36,9 @@ def build_mb_ham(H, V, sct, comm=None):
         ndw : number of down spins
         comm : if MPI communicator is given the hilbert space
             is assumed to be diveded along spin-down dimension.
+        dtype : floating point precision of the operators (np.float64
+            or np.float32). Single precision halves the memory traffic
+            of the matrix vector products.
 
     """
     n = H.shape[-1]
@@ -63,19 +67,127 @@ def build_mb_ham(H, V, sct, comm=None):
     
     operators = list()
     
-    operators.append(build_ham_local(H, U, sct, hfmode=params['hfmode'], mu=params['mu'], z=params['z']))
+    operators.append(build_ham_local(H, U, sct, hfmode=params['hfmode'], mu=params['mu'], z=params['z'], dtype=dtype))
     if isinstance(sct.states, np.ndarray):
         warn("Hopping with N symmetry not implmented. Discarding off-diagonal elements.")
     elif len(U)>1:
-        operators.extend(build_ham_hopping(H, sct))
+        operators.extend(build_ham_hopping(H, sct, dtype=dtype))
     if (Jx is not None) or (Jp is not None):
-        operators.append(build_ham_non_local(Jx, Jp, sct, operators[0]))
+        operators.append(build_ham_non_local(Jx, Jp, sct, operators[0], dtype=dtype))
 
     H.flags.writeable = True
 
     return operators
 
 
+def _split_interactions(V):
+    """U, Jx, Jp of the interaction V (matrix or dict, see build_mb_ham)."""
+    if isinstance(V, dict):
+        return V.get('U',None), V.get('Jx', None), V.get('Jp', None)
+    return V, None, None
+
+
+class OperatorFamily:
+    """Sector Hamiltonians that differ only on the diagonal.
+
+    The hoppings (off-diagonal elements of H) and the non-local
+    interactions (Jx, Jp) are built once and shared by all members
+    of the family. A member is given by the on-site energies of H,
+    the interaction U and params['mu'] (and 'hfmode', 'z') and stores
+    only its Local diagonal.
+
+    Args:
+        H, V, sct, dtype : see build_mb_ham. The on-site energies of
+            H and U are not used.
+
+    Example:
+
+        family = OperatorFamily(H, V, sct)
+        family.add('U=0', H, V0)
+        family.add('U', H, V)
+        matvec = matvec_operator(*family['U'])
+    """
+    def __init__(self, H, V, sct, dtype=np.float64):
+        n = H.shape[-1]
+        H = np.broadcast_to(H, (2,n,n))
+        U, Jx, Jp = _split_interactions(V)
+        # Keep the states only (not the eigen-states of the sector).
+        self.sct = sct = replace(sct, eigvals=None, eigvecs=None)
+        self.dtype = dtype
+        self._offdiag = H * (1 - np.eye(n))
+        self._nonlocal = tuple(None if J is None else np.array(J) for J in (Jx, Jp))
+        self.hoppings = []
+        if isinstance(sct.states, np.ndarray):
+            warn("Hopping with N symmetry not implmented. Discarding off-diagonal elements.")
+        elif n>1:
+            self.hoppings.extend(build_ham_hopping(H, sct, dtype=dtype))
+        self.non_local = None
+        self._nl_diag = None
+        if (Jx is not None) or (Jp is not None):
+            # Diagonal contribution of the non-local terms, shared as well.
+            self._nl_diag = np.zeros(sct.d)
+            self.non_local = build_ham_non_local(Jx, Jp, sct, self._nl_diag, dtype=dtype)
+        self.members = dict()
+
+    @property
+    def shared(self):
+        """Shared (off-diagonal) operators."""
+        return self.hoppings + ([] if self.non_local is None else [self.non_local])
+
+    def matches(self, H, V):
+        """Whether the off-diagonal part of (H, V) is the one of the family."""
+        n = H.shape[-1]
+        H = np.broadcast_to(H, (2,n,n))
+        if not np.array_equal(H * (1 - np.eye(n)), self._offdiag):
+            return False
+        return all((J is None and K is None) or
+                   (J is not None and K is not None and np.array_equal(J, K))
+                   for J, K in zip(_split_interactions(V)[1:], self._nonlocal))
+
+    def local(self, H, V):
+        """Local operator of the member (H, V)."""
+        n = H.shape[-1]
+        H = np.broadcast_to(H, (2,n,n))
+        U = _split_interactions(V)[0]
+        vec_diag = build_ham_local(H, U, self.sct, hfmode=params['hfmode'],
+                                   mu=params['mu'], z=params['z'])
+        if self._nl_diag is not None:
+            vec_diag += self._nl_diag
+        return vec_diag.astype(self.dtype, copy=False)
+
+    def operators(self, H, V):
+        """Operators of the member (H, V) (see build_mb_ham)."""
+        return [self.local(H, V)] + self.shared
+
+    def add(self, key, H, V):
+        """Add (or replace) member `key`."""
+        self.members[key] = self.local(H, V)
+
+    def __getitem__(self, key):
+        """Operators of member `key`."""
+        return [self.members[key]] + self.shared
+
+    def todense(self, H, V, out=None):
+        """Dense Hamiltonian of the member (H, V).
+
+        The dense matrix is not cached (d x d for each family), the
+        shared operators are scattered into it (see
+        matvec_product.todense).
+
+        Args:
+            out : (optional) output array, overwritten.
+        """
+        from edpyt.matvec_product import todense
+        d = self.sct.d
+        if out is None:
+            out = np.zeros((d,d), self.dtype, order='F')
+        else:
+            out[:] = 0.
+        if self.shared:
+            todense(*self.shared, out=out)
+        out[np.diag_indices(d)] += self.local(H, V)
+        return out
+
 
 @njit(float64(Array(float64, 1, 'C', readonly=False),
       uint32))
@@ -0,0 +1,157 @@
+"""Chebyshev-filtered subspace iteration for the lowest eigenpairs.
+
+A block X of nblock >= nev vectors is iterated with
+
+    Y = p_m(H) X            Chebyshev polynomial of degree m
+    Q = orth(Y)
+    H_Q = Q^+ H Q = S diag(theta) S^+        (Rayleigh-Ritz)
+    X = Q S
+
+where p_m is large on [lower, a] and bounded by one on the unwanted
+interval [a, upper] (Zhou & Saad, SIAM J. Matrix Anal. Appl. 29, 1059
+(2007)). The bounds of the spectrum are estimated with a few Lanczos
+steps and a is the largest Ritz value of the block.
+
+The operator is only applied to blocks (matvec(V, out), V.shape=(n,k),
+see matvec_product.matvec_operator), s.t. the sparse operator is
+streamed once for all vectors. Converged Ritz vectors are locked (no
+longer filtered). There is no Krylov basis to restart, the workspace is
+a few blocks of nblock vectors, which suits many eigenpairs (e.g. tens
+of states per sector at finite temperature).
+
+"""
+from warnings import warn
+
+import numpy as np
+
+from edpyt.lanczos import as_inplace
+
+
+def spectral_bounds(n, matvec, dtype=np.float64, steps=10, rng=None):
+    """Estimate the bounds of the spectrum with a few Lanczos steps.
+
+    Returns:
+        lower : lowest Ritz value.
+        upper : upper bound (largest Ritz value + |last off-diagonal|).
+    """
+    if rng is None:
+        rng = np.random.default_rng(0)
+    steps = min(steps, n)
+    v = (rng.random(n) - 0.5).astype(dtype)
+    v /= np.sqrt(v.dot(v))
+    v_old = np.zeros_like(v)
+    w = np.empty_like(v)
+    a = np.zeros(steps)
+    b = np.zeros(steps)
+    for j in range(steps):
+        matvec(v, w)
+        a[j] = v.dot(w)
+        w -= a[j] * v + (b[j-1] * v_old if j else 0.)
+        b[j] = np.sqrt(w.dot(w))
+        if b[j] < 1e-12:
+            steps = j + 1
+            break
+        v_old, v = v, w / b[j]
+        w = np.empty_like(v)
+    theta = np.linalg.eigvalsh(
+        np.diag(a[:steps]) + np.diag(b[:steps-1], 1) + np.diag(b[:steps-1], -1))
+    return theta[0], theta[-1] + b[steps-1]
+
+
+def chebyshev_filter(matvec, X, degree, a, upper, lower):
+    """Apply the (scaled) Chebyshev filter of degree to the block X.
+
+    The polynomial is bounded by one on [a, upper] and scaled s.t. it
+    is one at lower (avoids overflow). X is used as a buffer.
+    """
+    e = (upper - a) / 2.
+    c = (upper + a) / 2.
+    sigma = e / (lower - c)
+    tau = 2. / sigma
+    Y = np.empty_like(X)
+    matvec(X, Y)
+    Y -= c * X
+    Y *= sigma / e
+    Ynew = np.empty_like(X)
+    for _ in range(1, degree):
+        sigma_new = 1. / (tau - sigma)
+        matvec(Y, Ynew)
+        Ynew -= c * Y
+        Ynew *= 2. * sigma_new / e
+        Ynew -= (sigma * sigma_new) * X
+        # Rotate buffers (X is not needed anymore).
+        X, Y, Ynew = Y, Ynew, X
+        sigma = sigma_new
+    return Y
+
+
+def eigsh(n, nev, matvec, v0=None, nblock=None, degree=16, tol=1e-10,
+          maxiter=None, seed=0):
+    """Lowest nev eigenpairs of a real symmetric operator.
+
+    Args:
+        n : dimension of the operator.
+        nev : # of eigenpairs.
+        matvec : operator applied to blocks (see lanczos.as_inplace).
+        v0 : (optional) starting vector, the block is completed with
+            random vectors.
+        nblock : size of the block (default: nev + max(10, nev//4)).
+        degree : degree of the Chebyshev polynomial.
+        tol : a Ritz pair is converged if |residual| <= tol * max(1, |theta|).
+            Clipped to 1e3 eps of the operator precision (smaller residuals
+            are not reachable, e.g. in single precision).
+        maxiter : max. # of filter iterations (default: 100 + n//10).
+
+    Returns:
+        d : eigenvalues (ascending).
+        z : eigenvectors (columns).
+    """
+    matvec = as_inplace(matvec)
+    dtype = np.dtype(getattr(matvec, 'dtype', np.float64))
+    if nblock is None:
+        nblock = nev + max(10, nev//4)
+    nblock = min(nblock, n)
+    if not (0 < nev <= nblock):
+        raise ValueError(f'nev={nev} must be in [1, nblock={nblock}].')
+    if maxiter is None:
+        maxiter = 100 + n//10
+    tol = max(tol, 1e3 * np.finfo(dtype).eps)
+    rng = np.random.default_rng(seed)
+    lower, upper = spectral_bounds(n, matvec, dtype, rng=rng)
+
+    # Columns of C ordered blocks (see matvec_product.matvec_operator).
+    X = (rng.random((n,nblock)) - 0.5).astype(dtype)
+    if v0 is not None:
+        X[:,0] = v0
+    theta = np.zeros(nblock)
+    a = (lower + upper) / 2.
+    nlock = 0 # Converged (locked) leading Ritz vectors, not filtered.
+    for it in range(maxiter):
+        Y = chebyshev_filter(matvec, np.ascontiguousarray(X[:,nlock:]), degree,
+                             a, upper, lower)
+        L = X[:,:nlock]
+        for _ in range(2 if nlock else 0):
+            Y -= L.dot(L.T.dot(Y))
+        # Rayleigh-Ritz.
+        Q = np.ascontiguousarray(np.linalg.qr(Y)[0], dtype=dtype)
+        HQ = np.empty_like(Q)
+        matvec(Q, HQ)
+        theta[nlock:], S = np.linalg.eigh(Q.T.dot(HQ))
+        S = S.astype(dtype)
+        X[:,nlock:] = Q.dot(S)
+        R = HQ.dot(S[:,:nev-nlock]) - X[:,nlock:nev] * theta[nlock:nev]
+        residual = np.sqrt(np.einsum('ij,ij->j', R, R))
+        converged = residual <= tol * np.maximum(1., abs(theta[nlock:nev]))
+        nlock += np.argmin(converged) if not converged.all() else converged.size
+        if (nlock == nev) or (nblock == n):
+            break
+        # Damp all but the block.
+        lower = min(lower, theta[0])
+        a = theta[-1]
+        upper = max(upper, a + 1e-8 * max(1., abs(a)))
+    else:
+        warn(f'Chebyshev subspace iteration did not converge in {maxiter} iterations, '
+             f'{nlock}/{nev} eigenpairs converged.')
+
+    order = np.argsort(theta[:nev], kind='stable')
+    return theta[order], X[:,order]
@@ -0,0 +1,192 @@
+"""Cost model of the sector eigensolvers.
+
+solve_sector diagonalizes a sector of dimension d for its lowest k
+eigenpairs with one of:
+
+    lapack : full dense diagonalization (all eigenpairs).
+    partial : dense diagonalization of the lowest k eigenpairs only.
+    sparse : iterative solver on the sparse operator (see
+        espace._solve_arpack).
+
+The run time of each method is modelled as a linear combination of
+features of (d, k, nnz), where nnz is the # of nonzeros of the sector
+Hamiltonian (see estimate_nnz):
+
+    lapack : d^3, d^2, 1
+    partial : d^3, k d^2, d^2, 1
+    sparse : nnz, k nnz, d, k d, k^2 d, 1
+
+i.e. the reduction to tridiagonal form (d^3), the eigenvectors (k d^2)
+and for the sparse solver the # of matrix vector products (~ a + b k)
+times their cost (nnz) and the reorthogonalization (~ k d). The
+coefficients are calibrated on the current machine (see
+CostModel.calibrate) and persisted as JSON. The defaults correspond to a
+single core of a recent x86 CPU.
+
+    set_cost_model(CostModel(path='costmodel.json'))
+    get_cost_model().calibrate()  # Optional, saved to path.
+
+"""
+import json
+import os
+from time import perf_counter
+
+import numpy as np
+from scipy.optimize import nnls
+
+METHODS = ('lapack', 'partial', 'sparse')
+
+DEFAULT_COEFFS = {
+    'lapack':[3.8e-10, 9.0e-8, 1e-4],
+    'partial':[1.6e-10, 3.5e-9, 0., 2e-4],
+    'sparse':[0., 2.4e-8, 7.6e-6, 1.2e-6, 0., 2.6e-3],
+}
+
+
+def features(method, d, k, nnz):
+    """Features of the run time of method (see module docstring)."""
+    d = float(d)
+    if method == 'lapack':
+        return np.array([d**3, d**2, 1.])
+    if method == 'partial':
+        return np.array([d**3, k*d**2, d**2, 1.])
+    if method == 'sparse':
+        return np.array([nnz, k*nnz, d, k*d, k**2*d, 1.])
+    raise ValueError(f'Unknown method {method}.')
+
+
+def _popcount(state):
+    return bin(int(state)).count('1')
+
+
+def estimate_nnz(H, sct, V=None):
+    """Expected # of nonzeros of the Hamiltonian of sector sct.
+
+    A hopping (i,j) connects a state to another if exactly one of the
+    two sites is occupied, i.e. with probability 2 p (n-p) / (n (n-1))
+    for p particles on n sites. The non-local terms of V (Jx, Jp, see
+    build_mb_ham) move one particle of each spin, an ordered pair (i,j)
+    connects a state with probability p (n-p) / (n (n-1)) per spin.
+    """
+    n = H.shape[-1]
+    if n < 2:
+        return sct.d
+    Hs = np.broadcast_to(H, (2,n,n))
+    nh = [np.count_nonzero(np.triu(h, 1)) for h in Hs]
+    if hasattr(sct.states, 'up'):
+        p = [_popcount(sct.states.up[0]), _popcount(sct.states.dw[0])]
+    else:
+        N = _popcount(sct.states[0])
+        p = [N/2, N/2]
+    connected = sum(nh[s] * 2*p[s]*(n-p[s])/(n*(n-1)) for s in range(2))
+    if V is not None:
+        from edpyt.build_mb_ham import _split_interactions
+        offdiag = 1 - np.eye(n)
+        nj = sum(np.count_nonzero(J * offdiag) for J in _split_interactions(V)[1:]
+                 if J is not None)
+        connected += nj * np.prod([p[s]*(n-p[s])/(n*(n-1)) for s in range(2)])
+    return int(sct.d * (1. + connected))
+
+
+class CostModel:
+    """Run time model of the sector eigensolvers.
+
+    Args:
+        path : (optional) JSON file of the calibrated coefficients.
+            Loaded if it exists and written by calibrate.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.coeffs = {method:np.array(c) for method, c in DEFAULT_COEFFS.items()}
+        if (path is not None) and os.path.exists(path):
+            self.load(path)
+
+    def cost(self, method, d, k, nnz):
+        """Predicted run time (seconds)."""
+        return float(self.coeffs[method].dot(features(method, d, k, nnz)))
+
+    def choose(self, d, k, nnz):
+        """Cheapest method for the lowest k eigenpairs of a sector of
+        dimension d with nnz nonzeros."""
+        if k >= d:
+            return 'lapack'
+        methods = ['lapack', 'partial']
+        if k < d - 1:
+            methods.append('sparse')
+        costs = [self.cost(method, d, k, nnz) for method in methods]
+        return methods[int(np.argmin(costs))]
+
+    def load(self, path):
+        with open(path) as fp:
+            coeffs = json.load(fp)
+        for method, c in coeffs.items():
+            self.coeffs[method] = np.array(c)
+
+    def save(self, path=None):
+        path = path or self.path
+        with open(path, 'w') as fp:
+            json.dump({method:c.tolist() for method, c in self.coeffs.items()}, fp, indent=1)
+
+    def calibrate(self, sectors=((4,2,2),(5,2,2),(6,2,3),(6,3,3),(7,2,3),(7,3,3),
+                                 (8,3,3),(8,4,4),(9,4,4)),
+                  neigs=(1,4,16), max_dense=2000, nrep=2):
+        """Fit the coefficients to the run times of the solvers.
+
+        For each sector (# of sites, # of up & down electrons) of a
+        random Hamiltonian and each # of eigenpairs, the methods are
+        timed with solve_sector (dense methods only up to max_dense).
+
+        Returns:
+            coeffs : {method:coefficients}. Saved to path if given.
+        """
+        from edpyt.espace import _solve_arpack, _solve_lapack, build_empty_sector
+        rng = np.random.default_rng(0)
+        samples = {method:([], []) for method in METHODS}
+        def measure(method, f, d, k, nnz):
+            times = []
+            for _ in range(nrep):
+                start = perf_counter()
+                f()
+                times.append(perf_counter() - start)
+            X, y = samples[method]
+            X.append(features(method, d, k, nnz))
+            y.append(min(times))
+        for n, nup, ndw in sectors:
+            H = rng.random((n,n))
+            H += H.T
+            V = np.diag(rng.random(n))
+            sct = build_empty_sector(n, nup, ndw)
+            nnz = estimate_nnz(H, sct, V)
+            if sct.d <= max_dense:
+                measure('lapack', lambda: _solve_lapack(H, V, sct), sct.d, sct.d, nnz)
+            for k in neigs:
+                if k >= sct.d - 1:
+                    continue
+                if sct.d <= max_dense:
+                    measure('partial', lambda: _solve_lapack(H, V, sct, k=k), sct.d, k, nnz)
+                measure('sparse', lambda: _solve_arpack(H, V, sct, k), sct.d, k, nnz)
+        for method, (X, y) in samples.items():
+            if len(y) >= len(self.coeffs[method]):
+                # Scale the features s.t. the fit is well conditioned.
+                X = np.array(X)
+                scale = X.max(0)
+                scale[scale==0.] = 1.
+                c, _ = nnls(X/scale, np.array(y))
+                self.coeffs[method] = c / scale
+        if self.path is not None:
+            self.save()
+        return self.coeffs
+
+
+_model = CostModel()
+
+
+def set_cost_model(model):
+    """Set (or reset to the default with None) the cost model."""
+    global _model
+    _model = CostModel() if model is None else model
+
+
+def get_cost_model():
+    """Active cost model."""
+    return _model
@@ -0,0 +1,202 @@
+"""Performance counters of the matrix vector products.
+
+Opt-in (params['counters'] = True). When enabled, the operators returned
+by matvec_operator apply the terms of build_mb_ham one after the other
+(instead of the fused kernel) and record for each of them, and for the
+composite operator ('matvec'):
+
+    calls : # of applications.
+    time : wall time (seconds).
+    nnz : # of nonzeros processed (2 flops each).
+    bytes : estimated memory traffic (see traffic).
+
+The counters are grouped by sector (see sector). build_espace and
+build_gf_lanczos collect the counters of their sectors (see session)
+and print a report at the end. Sessions nest, e.g.
+
+    with session('dmft') as records:
+        ...
+
+merges the counters of all calls in records and prints a single report.
+
+Example:
+
+    params['counters'] = True
+    espace, egs = build_espace(H, V)
+
+"""
+from contextlib import contextmanager
+from time import perf_counter
+
+import numpy as np
+
+from edpyt.shared import params
+from edpyt.ham_local import Local
+from edpyt.ham_hopping import UpHopping, DwHopping
+
+
+class Counter:
+    """Counters of an operator."""
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.
+        self.nnz = 0
+        self.bytes = 0
+
+    def add(self, elapsed, nnz, nbytes):
+        self.calls += 1
+        self.time += elapsed
+        self.nnz += nnz
+        self.bytes += nbytes
+
+    @property
+    def bandwidth(self):
+        """Achieved bandwidth (GB/s)."""
+        return self.bytes / self.time * 1e-9 if self.time else 0.
+
+    @property
+    def gflops(self):
+        """Achieved GFLOP/s."""
+        return 2. * self.nnz / self.time * 1e-9 if self.time else 0.
+
+
+def traffic(op):
+    """Nonzeros and memory traffic of a single application of op.
+
+    The traffic is the compulsory one: the operator arrays are read once
+    (the hopping matrices are reused for all blocks of the other spin),
+    the input vector is read and the output vector is read and written
+    (overwritten for Local).
+
+    Returns:
+        nnz : # of nonzeros per vector.
+        matrix_bytes : bytes of the operator.
+        vector_bytes : bytes of the vectors per vector.
+    """
+    itemsize = np.dtype(op.dtype).itemsize
+    if isinstance(op, Local):
+        return op.size, op.nbytes, 2 * op.size * itemsize
+    matrix_bytes = op.data.nbytes + op.indices.nbytes + op.indptr.nbytes
+    if isinstance(op, UpHopping):
+        d = op.shape[0] * op.dwn
+        nnz = op.nnz * op.dwn
+    elif isinstance(op, DwHopping):
+        d = op.shape[0] * op.dup
+        nnz = op.nnz * op.dup
+    else:
+        d = op.shape[0]
+        nnz = op.nnz
+    return nnz, matrix_bytes, 3 * d * itemsize
+
+
+_records = {}
+_sector = None
+
+
+def get_records():
+    """Counters of the current session {sector:{operator:Counter}}."""
+    return _records
+
+
+def get_counter(name):
+    """Counter of operator `name` in the current sector."""
+    return _records.setdefault(_sector, {}).setdefault(name, Counter())
+
+
+@contextmanager
+def sector(label):
+    """Record the counters of the block under sector `label`."""
+    global _sector
+    outer, _sector = _sector, label
+    try:
+        yield
+    finally:
+        _sector = outer
+
+
+_depth = 0
+
+
+@contextmanager
+def session(title):
+    """Collect the counters of the block and print their report at exit.
+
+    Yields the records (see get_records) or None if the counters are
+    disabled. The counters of nested sessions are merged in the
+    outermost one, which prints the report. Can be used as a decorator.
+    """
+    if not params['counters']:
+        yield None
+        return
+    global _records, _depth
+    if _depth == 0:
+        outer, _records = _records, {}
+    _depth += 1
+    try:
+        yield _records
+    finally:
+        _depth -= 1
+        if _depth == 0:
+            records, _records = _records, outer
+            print(report(records, title))
+
+
+def _count(name, apply, nnz, matrix_bytes, vector_bytes):
+    """Wrap apply(vec, out) s.t. it updates the counter `name`."""
+    def counted(vec, out):
+        k = 1 if vec.ndim == 1 else vec.shape[1]
+        start = perf_counter()
+        apply(vec, out)
+        get_counter(name).add(perf_counter()-start, nnz*k,
+                              matrix_bytes + vector_bytes*k)
+        return out
+    return counted
+
+
+def counted_operator(*operators, matvec=None):
+    """Matrix vector operator which updates the counters.
+
+    Args:
+        operators : see matvec_operator.
+        matvec : (optional) operator to count as a whole (e.g. with MPI).
+            If not given, the operators are applied (and counted) one
+            after the other.
+
+    Returns:
+        matvec : callable f(v, out=None).
+    """
+    nnz, matrix_bytes, vector_bytes = np.sum([traffic(op) for op in operators], axis=0)
+    if matvec is None:
+        # Only Local overwrites out (applied first), all other operators
+        # accumulate.
+        operators = sorted(operators, key=lambda op: not isinstance(op, Local))
+        terms = [_count(type(op).__name__, op.matvec, *traffic(op)) for op in operators]
+        overwrite = isinstance(operators[0], Local)
+        def apply(vec, out):
+            if not overwrite:
+                out.fill(0.)
+            for term in terms:
+                term(vec, out)
+    else:
+        apply = matvec
+    apply = _count('matvec', apply, nnz, matrix_bytes, vector_bytes)
+    def counted(vec, out=None):
+        if out is None:
+            out = np.empty_like(vec)
+        return apply(vec, out)
+    return counted
+
+
+def report(records=None, title='matvec counters'):
+    """Format the counters per sector."""
+    if records is None:
+        records = _records
+    lines = [title]
+    header = f"  {'operator':10s} {'calls':>8s} {'time [s]':>10s} {'nnz':>10s} {'GB':>10s} {'GB/s':>8s} {'GFLOP/s':>8s}"
+    for label, counters in records.items():
+        lines.append(f'sector {label}')
+        lines.append(header)
+        for name, c in counters.items():
+            lines.append(f'  {name:10s} {c.calls:8d} {c.time:10.3e} {c.nnz:10.3e} '
+                         f'{c.bytes*1e-9:10.3e} {c.bandwidth:8.2f} {c.gflops:8.2f}')
+    return '\n'.join(lines)
@@ -22,8 +22,57 @@ typedef struct cs_sparse    /* matrix in compressed-column or triplet form */
     csi nz ;        /* # of entries in triplet matrix, -1 for compressed-col */
 } cs ;
 
+typedef struct cs_sparse_s  /* single precision matrix in compressed-row form */
+{
+    csi nzmax ;
+    csi m ;
+    csi n ;
+    csi *p ;
+    csi *i ;
+    float *x ;      /* numerical values, size nzmax */
+    csi nz ;
+} css ;
+
 csi csr_gaxpy (const cs *A, const double *x, double *y) ;
 csi csr_saxpy (const cs *A, const double *x, double *y, csi i, csi n) ;
+csi csr_gaxpy_s (const css *A, const float *x, float *y) ;
+csi csr_saxpy_s (const css *A, const float *x, float *y, csi i, csi n) ;
+csi csr_saxpy_tile (const cs *A, const double *x, double *y, csi i, csi n, csi s0, csi s1) ;
+csi csr_saxpy_tile_s (const css *A, const float *x, float *y, csi i, csi n, csi s0, csi s1) ;
+
+/* --- sliced ELLPACK (SELL-C-sigma) ---------------------------------------- */
+#define SELL_MAX_C 64               /* max. chunk height */
+
+typedef struct sell_sparse  /* matrix in SELL-C-sigma form */
+{
+    csi m ;         /* number of rows */
+    csi n ;         /* number of columns */
+    csi C ;         /* chunk height */
+    csi *p ;        /* chunk pointers (size nchunks+1) */
+    csi *w ;        /* chunk widths (size nchunks) */
+    csi *perm ;     /* row stored at each position (size m) */
+    csi *i ;        /* column indices, size p[nchunks] */
+    double *x ;     /* numerical values, size p[nchunks] */
+} sell ;
+
+typedef struct sell_sparse_s    /* single precision matrix in SELL-C-sigma form */
+{
+    csi m ;
+    csi n ;
+    csi C ;
+    csi *p ;
+    csi *w ;
+    csi *perm ;
+    csi *i ;
+    float *x ;
+} sells ;
+
+csi sell_gaxpy_chunk (const sell *A, const double *x, double *y, csi c) ;
+csi sell_gaxpy (const sell *A, const double *x, double *y) ;
+csi sell_saxpy_tile (const sell *A, const double *x, double *y, csi c, csi n, csi s0, csi s1) ;
+csi sell_gaxpy_chunk_s (const sells *A, const float *x, float *y, csi c) ;
+csi sell_gaxpy_s (const sells *A, const float *x, float *y) ;
+csi sell_saxpy_tile_s (const sells *A, const float *x, float *y, csi c, csi n, csi s0, csi s1) ;
 
 #define CS_CSC(A) (A && (A->nz == -1))
 #define CS_CSR(A) (A && (A->nz == 1))
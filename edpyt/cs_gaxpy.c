@@ -32,3 +32,77 @@ csi csr_saxpy (const cs *A, const double *x, double *y, csi i, csi n)
     }
   return (1) ;
 }
+
+/* Single precision variants. */
+
+csi csr_gaxpy_s (const css *A, const float *x, float *y)
+{
+  csi p, i, m, *Ap, *Ai ;
+  float *Ax ;
+  m = A->m ; Ap = A->p ; Ai = A->i ; Ax = A->x ;
+  for (i = 0 ; i < m ; i++)
+    {
+      for (p = Ap [i] ; p < Ap [i+1] ; p++)
+        {
+    y [i] += Ax [p] * x [Ai [p]] ;
+        }
+    }
+  return (1) ;
+}
+
+csi csr_saxpy_s (const css *A, const float *x, float *y, csi i, csi n)
+{
+  csi p, s, *Ap, *Ai ;
+  float *Ax ;
+  Ap = A->p ; Ai = A->i ; Ax = A->x ;
+  for (p = Ap [i] ; p < Ap [i+1] ; p++)
+    {
+      for (s = 0 ; s < n; s++)
+        {
+          y[i*n+s] += Ax [p] * x [Ai [p]*n+s] ;
+        }
+    }
+  return (1) ;
+}
+
+/* y[i,s0:s1] += A[i,:]*x[:,s0:s1] (x and y have n columns) */
+
+csi csr_saxpy_tile (const cs *A, const double *x, double *y, csi i, csi n, csi s0, csi s1)
+{
+  csi p, s, *Ap, *Ai ;
+  double *Ax, *yi ;
+  const double *xj ;
+  double a ;
+  Ap = A->p ; Ai = A->i ; Ax = A->x ;
+  yi = y + (size_t) i * n ;
+  for (p = Ap [i] ; p < Ap [i+1] ; p++)
+    {
+      a = Ax [p] ;
+      xj = x + (size_t) Ai [p] * n ;
+      for (s = s0 ; s < s1; s++)
+        {
+          yi [s] += a * xj [s] ;
+        }
+    }
+  return (1) ;
+}
+
+csi csr_saxpy_tile_s (const css *A, const float *x, float *y, csi i, csi n, csi s0, csi s1)
+{
+  csi p, s, *Ap, *Ai ;
+  float *Ax, *yi ;
+  const float *xj ;
+  float a ;
+  Ap = A->p ; Ai = A->i ; Ax = A->x ;
+  yi = y + (size_t) i * n ;
+  for (p = Ap [i] ; p < Ap [i+1] ; p++)
+    {
+      a = Ax [p] ;
+      xj = x + (size_t) Ai [p] * n ;
+      for (s = s0 ; s < s1; s++)
+        {
+          yi [s] += a * xj [s] ;
+        }
+    }
+  return (1) ;
+}
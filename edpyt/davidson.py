@@ -0,0 +1,138 @@
+"""Davidson method for the lowest eigenpairs.
+
+The search space V is expanded with the preconditioned residuals of the
+unconverged Ritz pairs (theta, x) (Davidson, J. Comput. Phys. 17, 87
+(1975)):
+
+    t = (D - theta)^-1 (H x - theta x)
+
+where D is the diagonal of H. The diagonal of the sector Hamiltonians
+(Local, see ham_local) is dominant for large interactions, where the
+correction is close to the exact one and much fewer matrix vector
+products are required than with Lanczos.
+
+When V holds ncv vectors, it is contracted to the lowest Ritz vectors
+(thick restart). The operator is applied in-place (see
+lanczos.as_inplace).
+
+"""
+from warnings import warn
+
+import numpy as np
+
+from edpyt.lanczos import as_inplace
+
+
+def _expand(V, W, T, m, block, matvec):
+    """Orthonormalize the columns of block against V[:,:m] and append
+    them to V (H V to W and the projections to T).
+
+    Columns (nearly) contained in V are discarded. The projections on
+    V[:,:m] are done for the whole block (matrix-matrix products).
+
+    Returns:
+        m : new # of columns of V.
+    """
+    start = m
+    norms = np.sqrt(np.einsum('ij,ij->j', block, block))
+    # Classical Gram-Schmidt, repeated if the norm of a column drops by
+    # more than 1/sqrt(2) (DGKS).
+    block -= V[:,:m].dot(V[:,:m].T.dot(block))
+    if (np.sqrt(np.einsum('ij,ij->j', block, block)) < 0.7071 * norms).any():
+        block -= V[:,:m].dot(V[:,:m].T.dot(block))
+    for t, norm in zip(block.T, norms):
+        if m == V.shape[1]:
+            break
+        if norm == 0.:
+            continue
+        for _ in range(2):
+            t -= V[:,start:m].dot(V[:,start:m].T.dot(t))
+        beta = np.sqrt(t.dot(t))
+        if beta <= 1e-8 * norm:
+            continue
+        V[:,m] = t / beta
+        matvec(V[:,m], W[:,m])
+        m += 1
+    T[:m,start:m] = V[:,:m].T.dot(W[:,start:m])
+    T[start:m,:start] = T[:start,start:m].T
+    T[start:m,start:m] = (T[start:m,start:m] + T[start:m,start:m].T) / 2
+    return m
+
+
+def eigsh(n, nev, matvec, diag, v0=None, ncv=None, tol=1e-10, maxiter=None,
+          seed=0):
+    """Lowest nev eigenpairs of a real symmetric operator.
+
+    Args:
+        n : dimension of the operator.
+        nev : # of eigenpairs.
+        matvec : operator (see lanczos.as_inplace).
+        diag : diagonal of the operator (preconditioner).
+        v0 : (optional) starting vector. The initial search space is
+            completed with the unit vectors of the lowest diagonal
+            elements.
+        ncv : max. size of the search space (default: max(6*nev,40)).
+        tol : a Ritz pair is converged if |residual| <= tol * max(1, |theta|).
+            Clipped to 1e3 eps of the operator precision (smaller residuals
+            are not reachable, e.g. in single precision).
+        maxiter : max. # of iterations (default: min(10*n, 1000)).
+
+    Returns:
+        d : eigenvalues (ascending).
+        z : eigenvectors (columns).
+    """
+    matvec = as_inplace(matvec)
+    dtype = np.dtype(getattr(matvec, 'dtype', np.float64))
+    diag = np.asarray(diag, dtype=np.float64)
+    if ncv is None:
+        ncv = max(6*nev, 40)
+    ncv = min(ncv, n)
+    if not (0 < nev <= ncv):
+        raise ValueError(f'nev={nev} must be in [1, ncv={ncv}].')
+    if maxiter is None:
+        maxiter = min(10*n, 1000)
+    tol = max(tol, 1e3 * np.finfo(dtype).eps)
+    rng = np.random.default_rng(seed)
+    V = np.zeros((n,ncv), dtype, order='F')
+    W = np.zeros((n,ncv), dtype, order='F')
+    T = np.zeros((ncv,ncv), np.float64)
+
+    block = np.zeros((n,nev), dtype, order='F')
+    block[np.argsort(diag, kind='stable')[:nev],np.arange(nev)] = 1.
+    if v0 is not None:
+        block = np.column_stack([v0, block[:,:-1]]).astype(dtype)
+    m = 0
+    for it in range(maxiter):
+        mold = m
+        m = _expand(V, W, T, m, block, matvec)
+        if m == mold:
+            # No new direction, continue with a random one.
+            m = _expand(V, W, T, m, np.asfortranarray(rng.random((n,1)) - 0.5), matvec)
+        theta, s = np.linalg.eigh(T[:m,:m])
+        s = s.astype(dtype, copy=False)
+        k = min(nev, m)
+        X = V[:,:m].dot(s[:,:k])
+        R = W[:,:m].dot(s[:,:k]) - X * theta[:k]
+        residual = np.sqrt(np.einsum('ij,ij->j', R, R))
+        converged = residual <= tol * np.maximum(1., abs(theta[:k]))
+        if (k == nev and converged.all()) or (m == n):
+            break
+        # Preconditioned residuals of the unconverged Ritz pairs.
+        active = np.flatnonzero(~converged)
+        denom = diag[:,None] - theta[active]
+        small = abs(denom) < 1e-8
+        denom[small] = np.where(denom[small] < 0., -1e-8, 1e-8)
+        block = np.asfortranarray(R[:,active] / denom)
+        if m + active.size > ncv:
+            # Thick restart with the lowest Ritz vectors.
+            keep = max(k, min(ncv // 2, ncv - active.size))
+            V[:,:keep] = V[:,:m].dot(s[:,:keep])
+            W[:,:keep] = W[:,:m].dot(s[:,:keep])
+            T[:] = 0.
+            T[np.arange(keep),np.arange(keep)] = theta[:keep]
+            m = keep
+    else:
+        warn(f'Davidson did not converge in {maxiter} iterations, '
+             f'{np.count_nonzero(converged)}/{nev} eigenpairs converged.')
+
+    return theta[:nev], X
@@ -14,8 +14,8 @@ from edpyt.gf_lanczos import build_gf_lanczos
 
 kB = physical_constants['Boltzmann constant in eV/K'][0]
 
-from edpyt.espace import (build_espace, screen_espace, adjust_neigsector, 
-    build_non_interacting_espace)
+from edpyt.espace import (build_espace, build_espace_batch, screen_espace,
+    adjust_neigsector, build_non_interacting_espace)
 from edpyt.gf_exact import build_gf_exact
 from edpyt.operators import check_full
 
@@ -202,7 +202,7 @@ def build_siam(H, V, U, gfimp):
 
 
 def siam_solve(dos, z, sigma=None, sigma0=None, n=4, 
-              N=int(1e3), U=3., beta=1e6, rng=_random):
+              N=int(1e3), U=3., beta=1e6, rng=_random, nbatch=1):
     """Solve SIAM with DED.
 
     Args:
@@ -214,6 +214,8 @@ def siam_solve(dos, z, sigma=None, sigma0=None, n=4,
         N : # of steps that fulfill DED condition **
         rng : (np.random.Generator) use to improve indipendent
             samplings of the poles for parallel tasks.
+        nbatch : # of samples drawn at once. The sectors of all samples
+            are diagonalized together (see build_espace_batch).
 
     Returns:
         sigma/None : if sigma input is None or not, respectively.
@@ -234,38 +236,55 @@ def siam_solve(dos, z, sigma=None, sigma0=None, n=4,
     imp_entropy = 0.                 # impurity entropy
     H = np.zeros((n,n))
     V = np.zeros((n,n))
+    V1 = np.zeros((n,n))
+    V1[0,0] = U
     rs = RandomSampler(dos, [z.real[0],z.real[-1]], n, rng)
     gf0 = Gf0(rs)
     gfimp = Gfimp(n)
-    neig1 = None #np.ones((n+1)*(n+1),int) * 3
     neig0 = None #np.ones((n+1)*(n+1),int) * 3
-    for _ in range(N):
-        found = False
-        while not found:
+    found = 0
+    while found < N:
+        samples = []
+        Hs = []
+        for _ in range(nbatch):
             gf0.sample()
             gfimp.fit(gf0)
             build_siam(H, V, 0., gfimp)
-            espace, egs = build_espace(H, V, neig0)
+            samples.append((gf0.poles.copy(), gfimp.ek.copy(), gfimp.vk2.copy(), gfimp.e0))
+            Hs.append(H.copy())
+        # U=0 for all samples followed by U!=0.
+        Hs += [H0.copy() for H0 in Hs]
+        for H1 in Hs[nbatch:]:
+            H1[0,0] -= sigma0
+        # U=0 and U!=0 of each sample share the off-diagonal operators.
+        families = [dict() for _ in range(nbatch)]
+        results = build_espace_batch(Hs, [V]*nbatch+[V1]*nbatch, neig0,
+                                     families=families+families)
+        for i, (poles, ek, vk2, e0) in enumerate(samples):
+            if found == N:
+                break
+            espace, egs = results[i]
             # screen_espace(espace, egs, beta)
             # adjust_neigsector(espace, neig0, n)
             N0, sct = next((k,v) for k,v in espace.items() if abs(v.eigvals[0]-egs)<1e-7)
             evec = sct.eigvecs[:,0]
             occp0 = get_occupation(evec,sct.states.up,sct.states.dw,0)
-            V[0,0] = U
-            H[0,0] -= sigma0
-            espace, egs = build_espace(H, V, neig1)
+            espace, egs = results[nbatch+i]
             # screen_espace(espace, egs, beta)
             # adjust_neigsector(espace, neig1, n)
             N1, sct = next((k,v) for k,v in espace.items() if abs(v.eigvals[0]-egs)<1e-7)
             if np.allclose(N1,N0):
-                gf = build_gf_exact(H,V,espace,beta,egs)
+                # Restore the sample.
+                gf0.poles[:] = poles
+                gfimp.ek[:], gfimp.vk2[:], gfimp.e0 = ek, vk2, e0
+                gf = build_gf_exact(Hs[nbatch+i],V1,espace,beta,egs)
                 sigma += np.reciprocal(gf0(z))-np.reciprocal(gf(z.real,z.imag))
                 evec = sct.eigvecs[:,0]
                 occp1 = get_occupation(evec,sct.states.up,sct.states.dw,0)
                 imp_occp0 += occp0
                 imp_occp1 += occp1
                 imp_entropy += get_entropy(gfimp,espace,egs,beta)
-                found = True
+                found += 1
     sigma /= N
     imp_occp0 /= N
     imp_occp1 /= N
@@ -354,6 +373,8 @@ def moam_solve(dos, z, sigma=None, sigma0=None, n=4,
         gfimp.append(Gfimp(nbath+1))
     neig1 = None #np.ones((n+1)*(n+1),int) * 3
     neig0 = None #np.ones((n+1)*(n+1),int) * 3
+    # V0 and V1 share the off-diagonal operators unless V1 has non-local terms.
+    families = dict() if isinstance(U, np.ndarray) else None
     for _ in range(N):
         found = False
         while not found:
@@ -361,7 +382,7 @@ def moam_solve(dos, z, sigma=None, sigma0=None, n=4,
                 gf0[i].sample()
                 gfimp[i].fit(gf0[i])
             build_moam(H, gfimp)
-            espace, egs = build_espace(H, V0, neig0)
+            espace, egs = build_espace(H, V0, neig0, families=families)
             # screen_espace(espace, egs, beta)
             # adjust_neigsector(espace, neig0, n)
             _, sct = next((k,v) for k,v in espace.items() if abs(v.eigvals[0]-egs)<1e-7)
@@ -371,7 +392,7 @@ def moam_solve(dos, z, sigma=None, sigma0=None, n=4,
             N0 = [sum(subsystem_occps) for subsystem_occps in occps]
             occp0 = [subsystem_occps[0] for subsystem_occps in occps]
             H.flat[:nimp*(n+1):n+1] -= sigma0
-            espace, egs = build_espace(H, V1, neig1)
+            espace, egs = build_espace(H, V1, neig1, families=families)
             # adjust_neigsector(espace, neig1, n)
             _, sct = next((k,v) for k,v in espace.items() if abs(v.eigvals[0]-egs)<1e-7)
             evec = sct.eigvecs[:,0]
@@ -4,7 +4,7 @@ import numpy as np
 from scipy.optimize import broyden1, linearmixing, root_scalar
 
 # from edpyt_backend.fit_wrap import fit_hybrid
-from edpyt.espace import adjust_neigsector, build_espace, screen_espace
+from edpyt.espace import adjust_neigsector, build_espace, build_gs_espace, screen_espace
 # from edpyt.fit import Delta, set_initial_bath
 from edpyt.fit_cg import _delta, fit_hybrid, get_initial_bath
 from edpyt.gf_lanczos import build_gf_lanczos
@@ -67,6 +67,8 @@ class Gfimp:
         U : impurity local interaction.
         beta : 1/kBT
         neig : # of eigenvaleus to solve per sector. Defaults to None (solve all)
+        zero_temperature : solve the ground state sectors only (see
+            build_gs_espace). Defaults to beta >= 1e3.
         tol_fit : max. error above which the fit is repeated.
         max_fit : max. fit repetions.
         alpha : weigth matzubara frequencies.
@@ -80,7 +82,8 @@ class Gfimp:
     #   |   .        .   |
     #   |   .          . |
     def __init__(
-        self, n, nmats=3000, U=3.0, beta=1e6, neig=None, adjust_neig=False, spin=0
+        self, n, nmats=3000, U=3.0, beta=1e6, neig=None, adjust_neig=False, spin=0,
+        zero_temperature=None,
     ):
         self.n = n
         self.Delta = Delta(n - 1, nmats, beta)
@@ -92,6 +95,10 @@ class Gfimp:
         self.adjust_neig = (
             adjust_neig  # adjust # of eigenvalues to solve after each solution.
         )
+        self.espace = None  # previous solution, warm starts the next one.
+        if zero_temperature is None:
+            zero_temperature = beta >= 1e3
+        self.zero_temperature = zero_temperature
 
     def __getattr__(self, name):
         """Search in Delta for attribute."""
@@ -151,8 +158,11 @@ class Gfimp:
     def solve(self):
         """Solve impurity model and set interacting green's function."""
         H, V = self.H, self.V
-        espace, egs = build_espace(H, V, self.neig)
-        screen_espace(espace, egs)  # , beta=self.beta)
+        if self.zero_temperature:
+            espace, egs = build_gs_espace(H, V, self.neig, previous=self.espace)
+        else:
+            espace, egs = build_espace(H, V, self.neig, previous=self.espace)
+            screen_espace(espace, egs)  # , beta=self.beta)
         if self.adjust_neig:
             adjust_neigsector(espace, self.neig, self.n)
         self.gf = build_gf_lanczos(
@@ -184,7 +194,8 @@ class SpinGfimp:
     NOTE: Arrays of this class have the general shape = (2, z.size)
     """
 
-    def __init__(self, n, nmats=3000, U=3.0, beta=1e6, neig=None, adjust_neig=False):
+    def __init__(self, n, nmats=3000, U=3.0, beta=1e6, neig=None, adjust_neig=False,
+                 zero_temperature=None):
         self.H = np.zeros((2, n, n))
         self.gfimp = [None, None]
         # Build gfimp's for each spin and make them point to self.H[spin].
@@ -192,7 +203,8 @@ class SpinGfimp:
         # must point to the same (spin dependent) Hamiltonian and onsite
         # interaction.
         for s in range(2):
-            gfimp = Gfimp(n, nmats, U, beta, neig, adjust_neig, spin=s)
+            gfimp = Gfimp(n, nmats, U, beta, neig, adjust_neig, spin=s,
+                          zero_temperature=zero_temperature)
             gfimp.H = self.H[s]
             self.gfimp[s] = gfimp
 
@@ -237,8 +249,11 @@ class SpinGfimp:
     def solve(self):
         """Solve impurity model and set interacting green's function."""
         H, V = self.H, self.V
-        espace, egs = build_espace(H, V, self.neig)
-        screen_espace(espace, egs)
+        if self.zero_temperature:
+            espace, egs = build_gs_espace(H, V, self.neig, previous=self.espace)
+        else:
+            espace, egs = build_espace(H, V, self.neig, previous=self.espace)
+            screen_espace(espace, egs)
         if self.adjust_neig:
             adjust_neigsector(espace, self.neig, self.n)
         for gf in self:
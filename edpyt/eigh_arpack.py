@@ -8,6 +8,8 @@ from scipy.sparse.linalg.eigen.arpack.arpack import (
 )
 from scipy._lib._util import _aligned_zeros
 
+from edpyt.lanczos import as_inplace
+
 arpack_int = np.dtype('int32')
 
 tp = 'd'
@@ -73,6 +75,7 @@ def eigsh(n, nev, matvec, v0=None, arpack_param=None):
     #    | The following sets dimensions for this problem. |
     #    %-------------------------------------------------%
 
+    matvec = as_inplace(matvec)
     ncv   = min(max(2*nev+1, 20), n)
     bmat  = 'I'
     which = 'SA'
@@ -175,7 +178,7 @@ def eigsh(n, nev, matvec, v0=None, arpack_param=None):
         yslice = slice(ipntr[1] - 1, ipntr[1] - 1 + n)
 
         if (ido == 1) or (ido == -1):
-            workd[yslice] = matvec(workd[xslice])
+            matvec(workd[xslice], workd[yslice])
 
         else:
             break
@@ -1,6 +1,6 @@
 from warnings import warn
 import numpy as np
-from edpyt import eigh_arpack as sla
+import scipy.linalg
 from collections import namedtuple
 from dataclasses import make_dataclass, field
 from itertools import product
@@ -12,7 +12,8 @@ from edpyt.sector import (
 )
 
 from edpyt.build_mb_ham import (
-    build_mb_ham
+    build_mb_ham,
+    OperatorFamily
 )
 
 
@@ -25,6 +26,12 @@ from edpyt.lookup import (
     get_sector_index
 )
 
+from edpyt.lanczos import build_sl_tridiag
+from edpyt.tridiag import egs_tridiag
+
+from edpyt import chebyshev, counters, costmodel, davidson, threads, trlanczos
+from edpyt.shared import params
+
 
 SzStates = namedtuple('States',['up','dw'])
 Sector = make_dataclass('Sector', ['states', ('d', int),
@@ -53,37 +60,104 @@ def build_empty_sector(n, *p):
     return Sector(states, d)
 
 
-def solve_sector(H, V, sct, k=None):
+def solve_sector(H, V, sct, k=None, family=None, v0=None, workspaces=None):
     """Diagonalize sector.
 
+    Args:
+        family : (optional) OperatorFamily of the sector. The shared
+            off-diagonal operators are reused.
+        v0 : (optional) starting vector of the iterative solver
+            (see warm_start).
+        workspaces : (optional) dict of the workspaces of the iterative
+            solver. They are stored in it and reused by the next sectors
+            (e.g. within build_espace), otherwise released on return.
+
+    The # of threads is set by the thread controller (see edpyt.threads)
+    and the solver by the cost model (see edpyt.costmodel).
     """
     if k is None: k = sct.d
-    if (k == sct.d) or (sct.d <= 512):
-        eigvals, eigvecs = _solve_lapack(H, V, sct)
-        if k<sct.d: eigvals, eigvecs = eigvals[:k], eigvecs[:,:k]
-    else:
-        eigvals, eigvecs = _solve_arpack(H, V, sct, k)
+    with threads.limit(sct.d):
+        method = costmodel.get_cost_model().choose(sct.d, k, costmodel.estimate_nnz(H, sct, V))
+        if method == 'lapack':
+            eigvals, eigvecs = _solve_lapack(H, V, sct, family)
+            if k<sct.d:
+                # Copy s.t. the full eigenvector matrix is released.
+                eigvals, eigvecs = eigvals[:k].copy(), eigvecs[:,:k].copy()
+        elif method == 'partial':
+            eigvals, eigvecs = _solve_lapack(H, V, sct, family, k)
+        else:
+            eigvals, eigvecs = _solve_arpack(H, V, sct, k, family, v0, workspaces)
     return eigvals, eigvecs
 
 
-def _solve_lapack(H, V, sct):
+def _solve_lapack(H, V, sct, family=None, k=None):
     """Diagonalize sector with LAPACK.
 
+    Args:
+        k : (optional) # of lowest eigenpairs. All if not given.
     """
-    ham = todense(
-        *build_mb_ham(H, V, sct)
+    return _eigh(_dense(H, V, sct, family), k)
+
+
+def _dense(H, V, sct, family=None, out=None):
+    """Dense Hamiltonian of the sector (written to out if given)."""
+    if family is not None:
+        return family.todense(H, V, out=out)
+    return todense(
+        *build_mb_ham(H, V, sct), out=out
     )
-    return np.linalg.eigh(ham)
 
 
-def _solve_arpack(H, V, sct, k=6):
-    """Diagonalize sector with ARPACK.
+def _eigh(ham, k=None):
+    """Lowest k eigenpairs of the dense Hamiltonian (all if k is None).
 
+    Only the k requested eigenvectors are formed (subset by index, MRRR).
+    ham is overwritten (no copy if Fortran ordered, see todense).
     """
-    matvec = matvec_operator(
-        *build_mb_ham(H, V, sct)
-    )
-    return sla.eigsh(sct.d, k, matvec)
+    if (k is None) or (k >= ham.shape[0]):
+        # Divide & conquer (dsyevd fails for workspace query with n=1).
+        driver = 'evd' if ham.shape[0] > 1 else None
+        return scipy.linalg.eigh(ham, driver=driver, overwrite_a=True,
+                                 check_finite=False)
+    return scipy.linalg.eigh(ham, subset_by_index=[0,k-1], driver='evr',
+                             overwrite_a=True, check_finite=False)
+
+
+def _solve_arpack(H, V, sct, k=6, family=None, v0=None, workspaces=None):
+    """Diagonalize sector with an iterative solver.
+
+    The solver is set by params['eigsh']: 'trlanczos' (thick-restart
+    Lanczos, see edpyt.trlanczos), 'davidson' (preconditioned with the
+    diagonal, see edpyt.davidson), 'chebyshev' (filtered subspace
+    iteration, see edpyt.chebyshev) or 'arpack' (see edpyt.eigh_arpack).
+    """
+    if family is not None:
+        operators = family.operators(H, V)
+    else:
+        operators = build_mb_ham(H, V, sct)
+    matvec = matvec_operator(*operators)
+    if params['eigsh'] == 'arpack':
+        # Relies on private SciPy modules, imported only if requested.
+        from edpyt import eigh_arpack
+        return eigh_arpack.eigsh(sct.d, k, matvec, v0=v0)
+    if params['eigsh'] == 'davidson':
+        # The local operator is the diagonal.
+        return davidson.eigsh(sct.d, k, matvec, operators[0], v0=v0)
+    if params['eigsh'] == 'chebyshev':
+        return chebyshev.eigsh(sct.d, k, matvec, v0=v0)
+    return trlanczos.eigsh(sct.d, k, matvec, v0=v0,
+                           workspace=_workspace(sct.d, k, matvec.dtype, workspaces))
+
+
+def _workspace(n, k, dtype, workspaces=None):
+    """Thick-restart Lanczos workspace, shared through workspaces."""
+    ncv = min(max(2*k+1, 20), n)
+    workspace = None if workspaces is None else workspaces.get('trlanczos')
+    if (workspace is None) or not workspace.fits(n, ncv, dtype):
+        workspace = trlanczos.TRLanczosWorkspace(n, ncv, dtype)
+        if workspaces is not None:
+            workspaces['trlanczos'] = workspace
+    return workspace
 
 
 def get_espace_dim(n, neig_max=None, symmetry='sz'):
@@ -132,43 +206,250 @@ def _N_iter_sectors(n):
         yield (ndu,), Sector(states, states.size)
 
 
-def build_espace(H, V, neig_sector=None, symmetry='sz'):
-    """Generate and solve all sectors in hilbert space."""
-    n = H.shape[-1]
-    
+def _sector_iterator(n, symmetry='sz'):
+    """Iterator over the sectors and index of their quantum numbers
+    in neig_sector (see get_espace_dim)."""
     if symmetry.lower() == 'sz':
-        iter_sectors = _sz_iter_sectors
-        get_sector_index = lambda qns: qns[0]*(n+1) + qns[1]
-    
-    elif symmetry.upper() == 'N':
-        iter_sectors = _N_iter_sectors
-        get_sector_index = lambda qns: qns[0]
-    
-    else:
-        raise NotImplementedError(f"Symmetry - {symmetry} - non implemented.")
+        return _sz_iter_sectors, lambda qns: qns[0]*(n+1) + qns[1]
+    if symmetry.upper() == 'N':
+        return _N_iter_sectors, lambda qns: qns[0]
+    raise NotImplementedError(f"Symmetry - {symmetry} - non implemented.")
+
+
+# Weight of the random component of the warm start vectors.
+WARM_START_NOISE = 0.1
+
+
+def warm_start(previous, qns, sct):
+    """Starting vector of sector qns from a previous espace.
+
+    The (normalized) sum of the previous eigenvectors of the sector,
+    which has components on all of them, plus a seeded random vector of
+    weight WARM_START_NOISE. None if the sector was not solved (or
+    was screened) or has a different dimension.
+    """
+    if previous is None:
+        return None
+    prev = previous.get(qns)
+    if (prev is None) or (prev.eigvecs is None) or (prev.eigvecs.ndim<2) or (prev.d!=sct.d):
+        return None
+    v0 = prev.eigvecs.sum(1)
+    v0 /= np.linalg.norm(v0)
+    # Random component s.t. the Krylov space is not confined to the
+    # symmetry subspace of the previous states (e.g. level crossings).
+    r = np.random.default_rng(0).random(sct.d) - 0.5
+    v0 += WARM_START_NOISE * r / np.linalg.norm(r)
+    return v0
+
+
+def build_espace(H, V, neig_sector=None, symmetry='sz', families=None, previous=None):
+    """Generate and solve all sectors in hilbert space.
+
+    Args:
+        families : (optional) dict {quantum numbers : OperatorFamily}.
+            The off-diagonal operators of each sector are taken from
+            (and stored in) families, s.t. calls that differ only on
+            the diagonal (on-site energies, U, mu) build them once.
+            Families that do not match (H, V) are rebuilt.
+        previous : (optional) espace of a previous call (e.g. the last
+            DMFT iteration). The iterative solves of the sectors start
+            from their previous eigenvectors (see warm_start).
+
+    The small sectors are diagonalized in batches (see build_espace_batch).
+    """
+    return build_espace_batch([H], [V], neig_sector, symmetry,
+                              [families], [previous])[0]
+
+
+# Max. dimension of the sectors diagonalized in batches and max. size
+# (bytes) of a batch.
+BATCH_DIM = 512
+BATCH_BYTES = 1 << 27
+
+
+@counters.session('build_espace')
+def build_espace_batch(Hs, Vs, neig_sector=None, symmetry='sz', families=None, previous=None):
+    """Generate and solve all sectors of several Hamiltonians.
+
+    The sectors up to BATCH_DIM which are solved densely are grouped by
+    dimension (across sectors and Hamiltonians, e.g. DED samples) and
+    each group is diagonalized with a single stacked eigh call. The
+    other sectors are solved one by one (see solve_sector).
+
+    Args:
+        Hs, Vs : sequences of Hamiltonians (see build_espace).
+        families, previous : (optional) sequences of families and
+            previous espaces of each Hamiltonian (see build_espace).
+
+    Returns:
+        [(espace, egs)] for each Hamiltonian.
+    """
+    n = Hs[0].shape[-1]
+    iter_sectors, get_sector_index = _sector_iterator(n, symmetry)
     
-    espace = dict()
     if neig_sector is None:
         neig_sector = get_espace_dim(n, symmetry=symmetry)
+    if families is None:
+        families = [None] * len(Hs)
+    if previous is None:
+        previous = [None] * len(Hs)
+
+    model = costmodel.get_cost_model()
+    # Solver workspaces shared by the sectors of this call only.
+    workspaces = dict()
+    solved = []
+    batches = dict() # {d:[(H, V, sct, neig, family)]}
+    for H, V, fams, prev in zip(Hs, Vs, families, previous):
+        sectors = []
+        for qns, sct in iter_sectors(n):
+            neig = neig_sector[get_sector_index(qns)]
+            if neig == 0:
+                continue
+            family = None
+            if fams is not None:
+                family = fams.get(qns)
+                if (family is None) or not family.matches(H, V):
+                    family = fams[qns] = OperatorFamily(H, V, sct)
+            sectors.append((qns, sct))
+            if (sct.d <= BATCH_DIM) and (model.choose(sct.d, neig, costmodel.estimate_nnz(H, sct, V)) != 'sparse'):
+                batches.setdefault(sct.d, []).append((H, V, sct, neig, family))
+                continue
+            # Diagonalize!
+            with counters.sector(qns):
+                sct.eigvals, sct.eigvecs = solve_sector(H, V, sct, neig, family,
+                                                        warm_start(prev, qns, sct), workspaces)
+        solved.append(sectors)
+
+    for d, batch in batches.items():
+        _solve_batch(d, batch)
+
+    results = []
+    for sectors in solved:
+        espace = dict()
+        egs = np.inf
+        for qns, sct in sectors:
+            if sct.eigvals.size==0:
+                warn(f'Zero-size eigenvalues for sector with quantum numbers {qns}.')
+                continue
+            
+            espace[qns] = sct
+
+            # Update GS energy
+            egs = min(sct.eigvals.min(), egs)
+        results.append((espace, egs))
+
+    return results
+
+
+def _solve_batch(d, batch):
+    """Diagonalize sectors of dimension d with stacked eigh calls."""
+    size = max(1, BATCH_BYTES // (8*d*d))
+    with threads.limit(d):
+        for start in range(0, len(batch), size):
+            chunk = batch[start:start+size]
+            stack = np.empty((len(chunk),d,d))
+            for i, (H, V, sct, neig, family) in enumerate(chunk):
+                _dense(H, V, sct, family, out=stack[i])
+            eigvals, eigvecs = np.linalg.eigh(stack)
+            for i, (H, V, sct, neig, family) in enumerate(chunk):
+                # Copy s.t. the stack is released.
+                sct.eigvals = eigvals[i,:neig].copy()
+                sct.eigvecs = eigvecs[i,:,:neig].copy()
+
+
+def build_gs_espace(H, V, neig_sector=None, symmetry='sz', families=None,
+                    previous=None, beta=1e6, cutoff=1e-9, margin=1e-3):
+    """Generate and solve the ground state sectors (zero temperature).
+
+    Same as build_espace followed by screen_espace(espace, egs, beta,
+    cutoff), but only the sectors which can contain the ground state are
+    diagonalized:
+
+        1) the lowest energy of each sector is estimated with the
+           lowest eigenvalue (dense, sectors up to BATCH_DIM) or with a
+           Lanczos run (see lanczos.build_sl_tridiag), which is an upper
+           bound.
+        2) the sectors with estimates within max(margin, window) of the
+           lowest one are solved (see solve_sector), where window is the
+           energy range kept by screen_espace. Sectors whose Lanczos run
+           did not converge in energy are always solved (the Lanczos
+           run starts from a random vector, or from the warm start,
+           which has a random component, see warm_start).
+        3) the # of eigenpairs starts from neig_sector (default 4) and
+           is doubled as long as all of them survive the screening
+           (degenerate states).
 
-    egs = np.inf
-        
+    Args:
+        families, previous : see build_espace.
+        beta, cutoff : see screen_espace.
+        margin : max. error of the (converged) estimates.
+
+    Returns:
+        espace, egs : screened espace (see screen_espace).
+    """
+    n = H.shape[-1]
+    iter_sectors, get_sector_index = _sector_iterator(n, symmetry)
+    if families is None:
+        families = dict()
+    # Energy window of the states kept by screen_espace.
+    window = -np.log(cutoff) / beta
+    margin = max(margin, window)
+
+    estimates = []
     for qns, sct in iter_sectors(n):
-        neig = neig_sector[get_sector_index(qns)]
+        neig = sct.d if neig_sector is None else neig_sector[get_sector_index(qns)]
         if neig == 0:
             continue
-        # Diagonalize!
-        sct.eigvals, sct.eigvecs = solve_sector(H, V, sct, neig)
-        if sct.eigvals.size==0:
-            warn(f'Zero-size eigenvalues for sector with quantum numbers {qns}.')
+        family = families.get(qns)
+        if (family is None) or not family.matches(H, V):
+            family = families[qns] = OperatorFamily(H, V, sct)
+        with counters.sector(qns), threads.limit(sct.d):
+            e0, converged = _estimate_egs(H, V, sct, family, warm_start(previous, qns, sct))
+        estimates.append((e0, converged, qns, sct, neig, family))
+
+    emin = min(e0 for e0, *_ in estimates)
+    # Solver workspaces shared by the sectors of this call only.
+    workspaces = dict()
+    espace = dict()
+    egs = np.inf
+    for e0, converged, qns, sct, neig, family in estimates:
+        if converged and (e0 > emin + margin):
             continue
-        
+        k = min(neig, 4, sct.d) if neig_sector is None else min(neig, sct.d)
+        v0 = warm_start(previous, qns, sct)
+        with counters.sector(qns):
+            while True:
+                sct.eigvals, sct.eigvecs = solve_sector(H, V, sct, k, family, v0, workspaces)
+                # Degenerate states may be missing.
+                if (k == sct.d) or (sct.eigvals[-1] - sct.eigvals[0] > window):
+                    break
+                k = min(2*k, sct.d)
         espace[qns] = sct
+        egs = min(egs, sct.eigvals[0])
+    screen_espace(espace, egs, beta, cutoff)
+    return espace, egs
 
-        # Update GS energy
-        egs = min(sct.eigvals.min(), egs)
 
-    return espace, egs
+def _estimate_egs(H, V, sct, family, v0=None, maxn=200, tol=1e-8, ND=10):
+    """Estimate of the lowest energy of the sector (upper bound).
+
+    Returns:
+        e0 : estimate.
+        converged : True if the change of the estimate over the last ND
+            Lanczos steps is below tol. A run that stopped at maxn or on
+            a small off-diagonal element (e.g. an invariant subspace of
+            the starting vector) is not converged.
+    """
+    if sct.d <= BATCH_DIM:
+        return _eigh(_dense(H, V, sct, family), 1)[0][0], True
+    if v0 is None:
+        v0 = np.random.default_rng(0).random(sct.d) - 0.5
+    matvec = matvec_operator(*family.operators(H, V))
+    a, b = build_sl_tridiag(matvec, v0 / np.linalg.norm(v0), maxn=maxn, tol=tol, ND=ND)
+    e0 = egs_tridiag(a, b[1:])
+    if a.size <= ND:
+        return e0, False
+    return e0, abs(e0 - egs_tridiag(a[:-ND], b[1:-ND])) < tol
 
 
 def build_non_interacting_espace(ek):
@@ -2,20 +2,22 @@ import numpy as np
 
 from edpyt.build_mb_ham import build_mb_ham
 from edpyt.espace import build_empty_sector, solve_sector
-from edpyt.lanczos import ZeroNormInitialVector, build_sl_tridiag
+from edpyt.lanczos import ZeroNormInitialVector, build_sl_tridiag, build_sl_tridiag_mv
 from edpyt.lookup import binsearch
 from edpyt.matvec_product import matvec_operator
 from edpyt.operators import c, cdg, check_empty, check_full
 from edpyt.operators import check_empty as not_empty
 from edpyt.operators import check_full as not_full
 from edpyt.tridiag import eigh_tridiagonal
-from edpyt._continued_fraction import continued_fraction as _cfpyx
+from edpyt.backend import get_backend
+from edpyt import counters, threads
 from edpyt.sector import OutOfHilbertError, get_cdg_sector, get_c_sector
 from edpyt.gf_exact import project_exact_up, project_exact_dw
 
 
 def continued_fraction(a, b):
     sz = a.size
+    _cfpyx = get_backend().continued_fraction
     def inner(e, eta, n=sz):
         z = np.atleast_1d(e + 1.j*eta)
         return _cfpyx(z, a, b)
@@ -28,6 +30,26 @@ def continued_fraction(a, b):
     return inner
 
 
+def block_continued_fraction(a, b):
+    """Matrix continued fraction of the block Lanczos coefficients.
+
+    G(z) = b[0]^T [z - T]^-1_00 b[0] (see lanczos.build_bl_tridiag), i.e.
+    the (p, p) matrix <phi0_i|(z - H)^-1|phi0_j> of the starting vectors.
+    """
+    def inner(e, eta):
+        z = np.atleast_1d(e + 1.j*eta)[:,None,None]
+        S = None
+        for n in reversed(range(len(a))):
+            M = z * np.eye(a[n].shape[0]) - a[n]
+            if S is not None:
+                M -= b[n+1].T.dot(S).transpose(1,0,2).dot(b[n+1])
+            S = np.linalg.inv(M)
+        return b[0].T.dot(S).transpose(1,0,2).dot(b[0])
+    inner.a = a
+    inner.b = b
+    return inner
+
+
 def spectral(l, q):
     def inner(e, eta):
         z = np.atleast_1d(e + 1.j*eta)
@@ -129,9 +151,48 @@ def build_gf_coeff_cf(a, b, Ei=0., exponent=1., sign=1):
     return a, b
 
 
-def build_gf_lanczos(H, V, espace, beta, egs=0., pos=0, repr='cf', ispin=0, separate=False):
+def _iter_chains(matvec, v0, nchains=1):
+    """Iterate over the Lanczos chains of the initial states.
+
+    Args:
+        v0 : (np.ndarray, shape=(# of states, d)) initial states.
+        nchains : # of chains that share each matrix vector product.
+
+    Yields:
+        iL, a, b : state index and tridiagonal coefficients.
+    """
+    nL = v0.shape[0]
+    if nchains < 2:
+        for iL in range(nL):
+            try:
+                aJ, bJ = build_sl_tridiag(matvec, v0[iL])
+            except ZeroNormInitialVector:
+                continue
+            yield iL, aJ, bJ
+        return
+    for start in range(0, nL, nchains):
+        stop = min(start+nchains, nL)
+        coeffs = build_sl_tridiag_mv(matvec, v0[start:stop].T)
+        for iL, coeff in zip(range(start, stop), coeffs):
+            if coeff is None:
+                continue
+            yield (iL,) + coeff
+
+
+@counters.session('build_gf_lanczos')
+def build_gf_lanczos(H, V, espace, beta, egs=0., pos=0, repr='cf', ispin=0, separate=False, dtype=np.float64, nchains=1):
     """Build Green's function with exact diagonalization.
 
+    Args:
+        dtype : precision of the Lanczos chains (np.float64 or np.float32).
+            The tridiagonal coefficients are always accumulated in double
+            precision.
+        nchains : # of Lanczos chains (initial states) that share the
+            applications of the arrival sector Hamiltonian.
+
+    The # of threads of each arrival sector is set by the thread
+    controller (see edpyt.threads).
+
     TODO : make it compatible with gf[spin] since spins may share
            same hilbert space but have two different onsites and hoppings (AFM).
     """
@@ -195,18 +256,15 @@ def build_gf_lanczos(H, V, espace, beta, egs=0., pos=0, repr='cf', ispin=0, sepa
             else:
                 # <I|J>
                 v0 = project(pos, n, cdg, sctI, sctJ)
-                matvec = matvec_operator(
-                    *build_mb_ham(H, V, sctJ)
-                )
-                for iL in range(sctI.eigvals.size):
-                    try:
-                        aJ, bJ = build_sl_tridiag(matvec, v0[iL])
-                    except ZeroNormInitialVector:
-                        continue
-                    gfe.add(
-                        gf_kernel,
-                        *build_gf_coeff(aJ, bJ, sctI.eigvals[iL], exponents[iL])
+                with counters.sector((nupJ, ndwJ)), threads.limit(sctJ.d):
+                    matvec = matvec_operator(
+                        *build_mb_ham(H, V, sctJ, dtype=dtype)
                     )
+                    for iL, aJ, bJ in _iter_chains(matvec, v0, nchains):
+                        gfe.add(
+                            gf_kernel,
+                            *build_gf_coeff(aJ, bJ, sctI.eigvals[iL], exponents[iL])
+                        )
         try: # Remove spin (N-1 sector)
             nupJ, ndwJ = get_c_sector(nupI, ndwI, ispin)
         except OutOfHilbertError: # Negative spin
@@ -230,18 +288,15 @@ def build_gf_lanczos(H, V, espace, beta, egs=0., pos=0, repr='cf', ispin=0, sepa
             else:
                 # <I|J>
                 v0 = project(pos, n, c, sctI, sctJ)
-                matvec = matvec_operator(
-                    *build_mb_ham(H, V, sctJ)
-                )
-                for iL in range(sctI.eigvals.size):
-                    try:
-                        aJ, bJ = build_sl_tridiag(matvec, v0[iL])
-                    except ZeroNormInitialVector:
-                        continue
-                    gfh.add(
-                        gf_kernel,
-                        *build_gf_coeff(aJ, bJ, sctI.eigvals[iL], exponents[iL], sign=-1)
+                with counters.sector((nupJ, ndwJ)), threads.limit(sctJ.d):
+                    matvec = matvec_operator(
+                        *build_mb_ham(H, V, sctJ, dtype=dtype)
                     )
+                    for iL, aJ, bJ in _iter_chains(matvec, v0, nchains):
+                        gfh.add(
+                            gf_kernel,
+                            *build_gf_coeff(aJ, bJ, sctI.eigvals[iL], exponents[iL], sign=-1)
+                        )
 
     # Partition function (Z)
     Z = sum(np.exp(-beta*(sct.eigvals-egs)).sum() for
@@ -9,7 +9,7 @@ from edpyt.lookup import binsearch, count_bits
 from edpyt.operators import (cdgc, check_empty, check_full)
 from edpyt.sector import binom
 from scipy.sparse import csr_matrix
-from edpyt import _psparse
+from edpyt.backend import get_backend
 
 # from numba.types import UniTuple, float64, int32, int64, uint32, Array
 
@@ -79,7 +79,7 @@ def nnz_offdiag_csrmat(A, nnz):
     return sp_A
 
 
-# @njit#(int64(int64,uint32[:],cs_type,int64,cs_type))
+@njit(cache=True)
 def add_hoppings(ix_s, states, T, count, sp_mat):
     """Add hoppings to many-body Hamiltonian.
 
@@ -110,7 +110,18 @@ def add_hoppings(ix_s, states, T, count, sp_mat):
     return count
 
 
-def build_ham_hopping(H, sct):
+@njit(cache=True)
+def fill_hoppings(states, T, sp_mat):
+    """Add hoppings of all `states` to many-body Hamiltonian.
+
+    """
+    count = 0
+    for ix_s in range(states.size):
+        count = add_hoppings(ix_s, states, T, count, sp_mat)
+    return count
+
+
+def build_ham_hopping(H, sct, dtype=np.float64):
     
     if not hasattr(sct.states, 'up'):
         raise NotImplementedError
@@ -132,15 +143,7 @@ def build_ham_hopping(H, sct):
     nnz_up_count = nnz_offdiag * int(binom(n-2, nup-1))
     sp_mat_up = empty_csrmat(nnz_up_count, (dup, dup))
 
-    count = 0
-    for iup in range(dup):
-        count = add_hoppings(iup, states_up,
-            # Hoppings
-            T,
-            # Sequential index in many-body nnz.
-            count,
-            # Many-Body Hamiltonian
-            sp_mat_up)
+    fill_hoppings(states_up, T, sp_mat_up)
 
     # Hoppings DW
     nnz_offdiag = count_nnz_offdiag(H[1])
@@ -149,31 +152,63 @@ def build_ham_hopping(H, sct):
     nnz_dw_count = nnz_offdiag * int(binom(n-2, ndw-1))
     sp_mat_dw = empty_csrmat(nnz_dw_count, (dwn, dwn))
 
-    count = 0
-    for idw in range(dwn):
-        count = add_hoppings(idw, states_dw,
-            # Hoppings
-            T,
-            # Sequential index in many-body nnz.
-            count,
-            # Many-Body Hamiltonian
-            sp_mat_dw)
+    fill_hoppings(states_dw, T, sp_mat_dw)
     
-    sp_mat_up = UpHopping((sp_mat_up.data, sp_mat_up.indices, sp_mat_up.indptr),dwn,shape=sp_mat_up.shape)
-    sp_mat_dw = DwHopping((sp_mat_dw.data, sp_mat_dw.indices, sp_mat_dw.indptr),dup,shape=sp_mat_dw.shape)
+    sp_mat_up = UpHopping((sp_mat_up.data.astype(dtype, copy=False), sp_mat_up.indices, sp_mat_up.indptr),dwn,shape=sp_mat_up.shape)
+    sp_mat_dw = DwHopping((sp_mat_dw.data.astype(dtype, copy=False), sp_mat_dw.indices, sp_mat_dw.indptr),dup,shape=sp_mat_dw.shape)
     return sp_mat_up, sp_mat_dw
 
+
+@njit(parallel=True, cache=True)
+def _add_csr_dense(data, indices, indptr, out):
+    """out += A, A in csr format."""
+    for i in prange(indptr.size-1):
+        for p in range(indptr[i], indptr[i+1]):
+            out[i, indices[p]] += data[p]
+
+
+@njit(parallel=True, cache=True)
+def _add_up_dense(data, indices, indptr, dwn, out):
+    """out += kron(I_dw, H_up), H_up in csr format."""
+    dup = indptr.size - 1
+    for idw in prange(dwn):
+        offset = idw * dup
+        for i in range(dup):
+            for p in range(indptr[i], indptr[i+1]):
+                out[offset+i, offset+indices[p]] += data[p]
+
+
+@njit(parallel=True, cache=True)
+def _add_dw_dense(data, indices, indptr, dup, out):
+    """out += kron(H_dw, I_up), H_dw in csr format."""
+    dwn = indptr.size - 1
+    for i in prange(dwn):
+        for p in range(indptr[i], indptr[i+1]):
+            j = indices[p]
+            for iup in range(dup):
+                out[iup+i*dup, iup+j*dup] += data[p]
+
+
 class UpHopping(csr_matrix):
     """Up hopping operator."""  
     def __init__(self, arg1, dwn, shape=None, dtype=None, copy=False):
         self.dwn = dwn
         super().__init__(arg1, shape=shape, dtype=dtype, copy=copy)  
         
-    def todense(self):
-        return np.kron(np.eye(self.dwn), np.asarray(super().todense()))
+    def todense(self, out=None):
+        """Dense kron(I_dw, H_up). If out is given, the operator is added to it."""
+        if out is None:
+            d = self.shape[0] * self.dwn
+            out = np.zeros((d,d), self.dtype, order='F')
+        _add_up_dense(self.data, self.indices, self.indptr, self.dwn, out)
+        return out
     
     def matvec(self, other, out):
-        _psparse.UPmultiply(self, other, out)
+        psparse = get_backend().psparse
+        if other.ndim > 1:
+            psparse.UPmultiply_mv(self, other, out)
+        else:
+            psparse.UPmultiply(self, other, out)
         
 
 class DwHopping(csr_matrix):
@@ -182,8 +217,17 @@ class DwHopping(csr_matrix):
         self.dup = dup
         super().__init__(arg1, shape=shape, dtype=dtype, copy=copy)  
     
-    def todense(self):
-        return np.kron(np.asarray(super().todense()), np.eye(self.dup))
+    def todense(self, out=None):
+        """Dense kron(H_dw, I_up). If out is given, the operator is added to it."""
+        if out is None:
+            d = self.shape[0] * self.dup
+            out = np.zeros((d,d), self.dtype, order='F')
+        _add_dw_dense(self.data, self.indices, self.indptr, self.dup, out)
+        return out
     
     def matvec(self, other, out):
-        _psparse.DWmultiply(self, other, out)
\ No newline at end of file
+        psparse = get_backend().psparse
+        if other.ndim > 1:
+            psparse.DWmultiply_mv(self, other, out)
+        else:
+            psparse.DWmultiply(self, other, out)
\ No newline at end of file
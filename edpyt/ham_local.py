@@ -126,7 +126,7 @@ def _N_build_ham_local(H, V, states, vec_diag, z, hfmode=False, mu=0.):
         vec_diag[idu] = res
 
 
-def build_ham_local(H, V, sct, hfmode=False, mu=0., z=None):
+def build_ham_local(H, V, sct, hfmode=False, mu=0., z=None, dtype=np.float64):
     if z is None:
         if hfmode:
             z = np.ones(H.shape[-1])
@@ -138,14 +138,21 @@ def build_ham_local(H, V, sct, hfmode=False, mu=0., z=None):
         _build_ham_local(H, V, sct.states.up, sct.states.dw, vec_diag, z, hfmode, mu)
     else:
         _N_build_ham_local(H, V, sct.states, vec_diag, z, hfmode, mu)
-    return vec_diag.view(Local)
+    return vec_diag.astype(dtype, copy=False).view(Local)
 
 
 class Local(np.ndarray):
     """Local Hamiltonian operator."""
     def matvec(self, other, out=None):
+        if other.ndim > 1:
+            # Multiple vectors (columns of other).
+            return np.multiply(self.view(np.ndarray)[:,None], other, out=out)
         return np.multiply(self, other, out=out)
     
-    def todense(self):
-        return np.diag(self)
+    def todense(self, out=None):
+        """Dense diag(H_dd). If out is given, the operator is added to it."""
+        if out is None:
+            return np.diag(self)
+        out[np.diag_indices(self.size)] += self
+        return out
         
\ No newline at end of file
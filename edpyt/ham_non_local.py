@@ -14,8 +14,8 @@ from edpyt.lookup import binsearch, count_bits
 from edpyt.sector import binom
 from edpyt.ham_hopping import (
     empty_csrmat, count_nnz_offdiag, 
-    nnz_offdiag_csrmat)
-from edpyt import _psparse
+    nnz_offdiag_csrmat, _add_csr_dense)
+from edpyt.backend import get_backend
 
 
 warn_offdiag = "Neglecting off-diagonal {interaction} couplings."
@@ -243,20 +243,29 @@ def _N_build_ham_non_local(Jx, Jp, states, vec_diag):
     return cs_type(data, indptr, indices, (d,d))
 
 
-def build_ham_non_local(Jx, Jp, sct, vec_diag):
+def build_ham_non_local(Jx, Jp, sct, vec_diag, dtype=np.float64):
     """Build non-local Hamiltonian."""
     if hasattr(sct.states, 'up'):
         sp_mat = _build_ham_non_local(Jx, Jp, sct.states.up, sct.states.dw, vec_diag)
     else:
         sp_mat = _N_build_ham_non_local(Jx, Jp, sct.states, vec_diag)
-    sp_mat = NonLocal((sp_mat.data, sp_mat.indices, sp_mat.indptr),shape=sp_mat.shape)
+    data = np.asarray(sp_mat.data, dtype=dtype)
+    sp_mat = NonLocal((data, sp_mat.indices, sp_mat.indptr),shape=sp_mat.shape)
     return sp_mat
 
 
 class NonLocal(csr_matrix):
     """Non local Hamiltonian operator."""    
     def matvec(self, other, out):
-        _psparse.Multiply(self, other, out)
+        psparse = get_backend().psparse
+        if other.ndim > 1:
+            psparse.Multiply_mv(self, other, out)
+        else:
+            psparse.Multiply(self, other, out)
         
     def todense(self, order=None, out=None):
-        return np.asarray(super().todense(order=order, out=out))
\ No newline at end of file
+        """Dense operator. If out is given, the operator is added to it."""
+        if out is None:
+            return np.asarray(super().todense(order=order))
+        _add_csr_dense(self.data, self.indices, self.indptr, out)
+        return out
\ No newline at end of file
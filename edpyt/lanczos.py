@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 import numpy as np
 from functools import partial
 from numba import njit, prange
@@ -9,11 +12,148 @@ axpy = get_blas_funcs('axpy', dtype=np.float64)
 scal = get_blas_funcs('scal', dtype=np.float64)
 swap = get_blas_funcs('swap', dtype=np.float64)
 
+# Single precision Lanczos vectors.
+_blas = {
+    np.dtype(np.float64):(axpy, scal),
+    np.dtype(np.float32):(get_blas_funcs('axpy', dtype=np.float32),
+                          get_blas_funcs('scal', dtype=np.float32))
+}
+
 
 class ZeroNormInitialVector(Exception):
     pass
 
 
+@njit(['float64(float32[:],float32[:])',
+       'float64(float64[:],float64[:])'],parallel=True)
+def _ddot(x, y):
+    """Dot product accumulated in double precision."""
+    res = 0.
+    for i in prange(x.size):
+        res += np.float64(x[i]) * np.float64(y[i])
+    return res
+
+
+def dot(x, y):
+    """Dot product of Lanczos vectors.
+
+    Single precision vectors are accumulated in double precision, s.t.
+    the tridiagonal coefficients retain float64 accuracy.
+    """
+    if x.dtype == np.float64:
+        return x.dot(y)
+    return _ddot(x, y)
+
+
+def as_inplace(matvec):
+    """Adapt matvec to the in-place protocol matvec(x, out).
+
+    Operators built with matvec_product.matvec_operator write directly
+    into `out` (matvec.inplace = True) and are returned as they are. Any
+    other callable y = matvec(x) (e.g. H.dot) is wrapped s.t. the result
+    is copied into `out`.
+    """
+    if getattr(matvec, 'inplace', False):
+        return matvec
+    def inplace(x, out):
+        out[...] = matvec(x)
+        return out
+    inplace.inplace = True
+    if hasattr(matvec, 'dtype'):
+        inplace.dtype = matvec.dtype
+    return inplace
+
+
+def available_memory():
+    """Available physical memory (bytes) or None if unknown."""
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+class KrylovBasis:
+    """Storage of the Lanczos vectors.
+
+    The vectors are stored as the rows of a (maxn, d) array, either in
+    RAM or in a numpy.memmap file (see krylov_basis).
+
+    Args:
+        path : (optional) file of the memmap. If not given, the vectors
+            are stored in RAM.
+    """
+    def __init__(self, d, maxn, dtype=np.float64, path=None):
+        self.path = path
+        if path is None:
+            self.V = np.empty((maxn,d), dtype)
+        else:
+            self.V = np.memmap(path, dtype, 'w+', shape=(maxn,d))
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def maxn(self):
+        return self.V.shape[0]
+
+    def append(self, v):
+        """Store v (ignored if the storage is full)."""
+        if self.n < self.maxn:
+            self.V[self.n] = v
+            self.n += 1
+
+    def clear(self):
+        self.n = 0
+
+    def combine(self, U, chunk=1<<16):
+        """X = V[:m].T U, m = U.shape[0].
+
+        Chunks of chunk components are multiplied at once, s.t. a
+        memmap is read sequentially in blocks.
+        """
+        m, k = U.shape
+        d = self.V.shape[1]
+        assert m <= self.n, 'Not enough Lanczos vectors stored.'
+        X = np.empty((d,k), np.result_type(self.V.dtype, U.dtype))
+        for start in range(0, d, chunk):
+            stop = min(start+chunk, d)
+            np.dot(self.V[:m,start:stop].T, U, out=X[start:stop])
+        return X
+
+    def close(self):
+        """Release the storage (and delete the memmap file)."""
+        self.V = None
+        if (self.path is not None) and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __del__(self):
+        if getattr(self, 'V', None) is not None:
+            self.close()
+
+
+def krylov_basis(d, maxn=500, dtype=np.float64, memory=None, dir=None):
+    """Storage of maxn Lanczos vectors of dimension d.
+
+    Args:
+        memory : memory budget (bytes), default: half of the available
+            memory.
+        dir : directory of the memmap file (default: tempfile.gettempdir()).
+
+    Returns:
+        KrylovBasis in RAM if it fits in the budget, otherwise in a
+        numpy.memmap file.
+    """
+    if memory is None:
+        memory = available_memory()
+        memory = np.inf if memory is None else memory // 2
+    if maxn * d * np.dtype(dtype).itemsize <= memory:
+        return KrylovBasis(d, maxn, dtype)
+    fd, path = tempfile.mkstemp(suffix='.krylov', dir=dir)
+    os.close(fd)
+    return KrylovBasis(d, maxn, dtype, path)
+
+
 def sl_step(matvec, comm=None):
     """Simple Lanczos step.    
     
@@ -21,36 +161,46 @@ def sl_step(matvec, comm=None):
         comm : if MPI communicator is given the hilbert space
             is assumed to be diveded along spin-down dimension.
     """
+    matvec = as_inplace(matvec)
     if comm is None:
         return partial(_sl_step, matvec)
     else:
         return partial(_sl_step_mpi, matvec, comm=comm)
 
 
-def _sl_step(matvec, v, l):
+def _sl_step(matvec, v, l, w=None):
     """Simple Lanczos step.
     
     Given the current (\tilde(v)) and previous (l) Lanc. vectors,
     compute a single Lanczos step.
 
+    Args:
+        w : (optional) output buffer for v+1. Must not alias v or l.
+
     Return:
         a : <v+1|v>
         b : <v|v>
         v : |v> / b
         v+1 : Av - av - bl
 
+    NOTE:
+        v is normalized in-place. Given the buffer w, the step does
+        not allocate, s.t. the drivers rotate three buffers (l <- v <- w <- l).
     """
-    b = np.linalg.norm(v)
+    axpy, scal = _blas[v.dtype]
+    if w is None:
+        w = np.empty_like(v)
+    b = np.sqrt(dot(v, v))
     scal(1/b,v)
-    w = matvec(v)
-    a = v.dot(w)
+    matvec(v, w)
+    a = dot(v, w)
     # w -= (a[n] * v + b[n] * l)
     axpy(v,w,v.size,-a)
     axpy(l,w,l.size,-b)
     return a, b, v, w
 
 
-def _sl_step_mpi(matvec, v, l, comm):
+def _sl_step_mpi(matvec, v, l, w=None, comm=None):
     """Same as sl_step, but with MPI support.
 
     Args:
@@ -58,11 +208,14 @@ def _sl_step_mpi(matvec, v, l, comm):
         comm : MPI communicator
     """
     from mpi4py.MPI import SUM
-    b2_local = v.dot(v)
+    axpy, scal = _blas[v.dtype]
+    if w is None:
+        w = np.empty_like(v)
+    b2_local = dot(v, v)
     b = np.sqrt(comm.allreduce(b2_local, op=SUM))
     scal(1/b,v)
-    w = matvec(v)
-    a_local = v.dot(w)
+    matvec(v, w)
+    a_local = dot(v, w)
     a = comm.allreduce(a_local, op=SUM)
     # w -= (a[n] * v + b[n] * l)
     axpy(v,w,v.size,-a)
@@ -70,7 +223,7 @@ def _sl_step_mpi(matvec, v, l, comm):
     return a, b, v, w
 
 
-def build_sl_tridiag(matvec, phi0, maxn=500, delta=1e-15, tol=1e-10, ND=10, comm=None):
+def build_sl_tridiag(matvec, phi0, maxn=500, delta=1e-15, tol=1e-10, ND=10, comm=None, basis=None):
     '''Build tridiagonal coeffs. with simple Lanczos method.
 
     Args:
@@ -79,12 +232,18 @@ def build_sl_tridiag(matvec, phi0, maxn=500, delta=1e-15, tol=1e-10, ND=10, comm
         tol : set threshold for min change in groud state energy.
         ND : # of iterations to check change in groud state energy.
         comm : MPI communicator
+        basis : (optional) KrylovBasis (see krylov_basis). The Lanczos
+            vectors are stored in it, s.t. sl_solve skips the second pass.
 
     Returns:
         a : diagonal elements
         b : off-diagonal elements
 
     NOTE:
+        0) the Lanczos vectors are stored in the precision of the
+        operator (`matvec.dtype`) while a and b are always accumulated
+        in double precision. matvec is applied in-place (see as_inplace)
+        on three preallocated buffers.
         1) T := diag(a,k=0) + diag(b[1:],k=1) + diag(b[1:],k=-1)
         2) with MPI support, the stopping condition is the same
         since both
@@ -98,13 +257,19 @@ def build_sl_tridiag(matvec, phi0, maxn=500, delta=1e-15, tol=1e-10, ND=10, comm
     # Loops vars.
     converged = False
     egs_prev = np.inf
-    l = np.zeros_like(phi0)
-    v = phi0
+    v = np.array(phi0, dtype=getattr(matvec, 'dtype', phi0.dtype))
+    l = np.zeros_like(v)
+    w = np.empty_like(v)
     #
+    if basis is not None:
+        basis.clear()
     n = 0
     while not converged:
         for _ in range(ND):
-            a[n], b[n], l, v = lanc_step(v, l)
+            a[n], b[n], _, _ = lanc_step(v, l, w)
+            if basis is not None:
+                basis.append(v)
+            l, v, w = v, w, l
             if (abs(b[n])<delta) or (n>=(maxn-1)):
                 if n==0:
                     raise ZeroNormInitialVector("Initial vector has zero norm.")
@@ -123,7 +288,74 @@ def build_sl_tridiag(matvec, phi0, maxn=500, delta=1e-15, tol=1e-10, ND=10, comm
     return a[:n], b[:n]
 
 
-@njit('(float64[:],float64[:],float64[:,:])',parallel=True,fastmath=True)
+def build_sl_tridiag_mv(matvec, phi0, maxn=500, delta=1e-15, tol=1e-10, ND=10):
+    '''Build tridiagonal coeffs. of independent Lanczos chains simultaneously.
+
+    The chains share each application of the operator (matvec(V), V.shape=(d,k)),
+    s.t. the operator is streamed once per step for all chains.
+
+    Args:
+        phi0 : (np.ndarray, shape=(d,k)) starting vectors (columns).
+        see build_sl_tridiag.
+
+    Returns:
+        coeffs : list of (a, b) for each chain or None if the starting
+            vector has zero norm.
+
+    NOTE:
+        The stopping conditions of each chain are the same as in
+        build_sl_tridiag. Converged chains are removed from the block.
+    '''
+    d, k = phi0.shape
+    a = np.empty((k, maxn), dtype=np.float64)
+    b = np.empty((k, maxn), dtype=np.float64)
+    coeffs = [None] * k
+    matvec = as_inplace(matvec)
+    # Loops vars.
+    active = np.arange(k)
+    egs_prev = np.full(k, np.inf)
+    v = np.array(phi0, dtype=getattr(matvec, 'dtype', phi0.dtype), order='C')
+    l = np.zeros_like(v)
+    w = np.empty_like(v)
+    #
+    n = 0
+    while active.size > 0:
+        # Lanczos step (see _sl_step).
+        bn = np.sqrt(np.einsum('ij,ij->j', v, v, dtype=np.float64))
+        stop = (abs(bn)<delta) | (n>=(maxn-1))
+        v /= np.where(stop, 1., bn).astype(v.dtype)
+        matvec(v, w)
+        an = np.einsum('ij,ij->j', v, w, dtype=np.float64)
+        w -= an.astype(v.dtype) * v
+        w -= bn.astype(v.dtype) * l
+        a[active, n] = an
+        b[active, n] = bn
+        l, v, w = v, w, l
+        n += 1
+        if (n%ND)==0:
+            for i in np.where(~stop)[0]:
+                egs = egs_tridiag(a[active[i],:n], b[active[i],1:n])
+                if abs(egs - egs_prev[active[i]])<tol:
+                    stop[i] = True
+                else:
+                    egs_prev[active[i]] = egs
+        if stop.any():
+            for i in np.where(stop)[0]:
+                # Chain length (see build_sl_tridiag).
+                m = n-1 if (abs(bn[i])<delta) or (n>=maxn) else n
+                if m > 0:
+                    coeffs[active[i]] = (a[active[i],:m].copy(), b[active[i],:m].copy())
+            keep = ~stop
+            active = active[keep]
+            v = np.ascontiguousarray(v[:,keep])
+            l = np.ascontiguousarray(l[:,keep])
+            w = np.empty_like(v)
+
+    return coeffs
+
+
+@njit(['(float64[:],float64[:],float64[:,:])',
+       '(float64[:],float32[:],float64[:,:])'],parallel=True,fastmath=True)
 def _kron(u_row, l, r):
     """Helper function used in sl_solve."""
     for i in range(u_row.size):
@@ -132,9 +364,13 @@ def _kron(u_row, l, r):
             r[i,k] += coeff * l[k]
 
 
-def sl_solve(matvec, a, b, v0=None, select=0, select_range=(0,0), eigvals_only=False, comm=None):
+def sl_solve(matvec, a, b, v0=None, select=0, select_range=(0,0), eigvals_only=False, comm=None, basis=None):
     """Lanczos second pass.
 
+    If the Lanczos vectors were stored (basis, see build_sl_tridiag),
+    the eigenvectors are X = V U (single GEMM) and the second pass is
+    skipped.
+
     The Lanczos projection is defined
         
         T = V^+ H V # tridiagonal matrix
@@ -170,14 +406,18 @@ def sl_solve(matvec, a, b, v0=None, select=0, select_range=(0,0), eigvals_only=F
     w, U = eigh_tridiagonal(a, b[1:], select, select_range, eigvals_only)
     if eigvals_only:
         return w
+    if (basis is not None) and (len(basis) >= a.size):
+        return w, basis.combine(U)
     else:
         assert v0 is not None, f"Starting lanczos vector must be provided for eigenvectors."
     lanc_step = sl_step(matvec, comm)
-    v = v0
+    v = np.array(v0, dtype=getattr(matvec, 'dtype', v0.dtype))
     l = np.zeros_like(v)
-    r = np.zeros((U.shape[1],v0.size),v0.dtype)
+    u = np.empty_like(v)
+    r = np.zeros((U.shape[1],v0.size),np.float64)
     for n in range(a.size):
-        _, _, l, v = lanc_step(v, l)
+        lanc_step(v, l, u)
+        l, v, u = v, u, l
         _kron(U[n],l,r)
     return w, r.T # use convention v[:,0] is a vector (here, in 'F' order)
 
@@ -222,6 +462,8 @@ def build_bd_tridiag(matvec, phi0, maxn=300, delta=1e-15, tol=1e-10, ND=10):
 
     Note:
         T := diag(a,k=0) + diag(b[1:],k=1) + diag(b[1:],k=-1)
+        See build_bl_tridiag for the block version with contiguous
+        blocks and matrix-matrix products.
 
     '''
     T = np.zeros((maxn,maxn), dtype=np.float64)
@@ -281,3 +523,177 @@ def build_bd_tridiag(matvec, phi0, maxn=300, delta=1e-15, tol=1e-10, ND=10):
                 egs_prev = egs
 
     return T[:n,:n]
+
+
+def _bl_orthonormalize(W, out, delta):
+    """Orthonormalize the block W with deflation.
+
+    W = Q R (Householder QR), R = U S Vt (SVD). The directions with
+    singular values S <= delta are deflated, s.t.
+
+        W ~ Q' B, Q' = Q U[:,keep], B = S[keep] Vt[keep].
+
+    Args:
+        out : flat buffer for Q'.
+
+    Returns:
+        Q' : (d, p') orthonormal block (view of out).
+        B : (p', p) coefficients.
+    """
+    Q, R = np.linalg.qr(W)
+    U, S, Vt = np.linalg.svd(R)
+    keep = S > delta
+    p = np.count_nonzero(keep)
+    Qn = out[:W.shape[0]*p].reshape(-1,p)
+    np.dot(Q, U[:,keep].astype(W.dtype), out=Qn)
+    return Qn, S[keep,None] * Vt[keep]
+
+
+class _BlockLanczos:
+    """Block Lanczos recurrence on four preallocated buffers.
+
+    The blocks are contiguous (d, p) C arrays, s.t. the operator is
+    applied to all vectors of a block at once (matvec(V), V.shape=(d,p))
+    and the projections are matrix-matrix products.
+    """
+    def __init__(self, matvec, phi0, delta):
+        d, p = phi0.shape
+        self.matvec = as_inplace(matvec)
+        self.dtype = np.dtype(getattr(self.matvec, 'dtype', phi0.dtype))
+        self.delta = delta
+        self.d = d
+        self.buffers = [np.empty(d*p, self.dtype) for _ in range(4)]
+        phi0 = np.array(phi0, dtype=self.dtype, order='C')
+        self.v, self.b0 = _bl_orthonormalize(phi0, self.buffers[0], delta)
+        self.l = self.buffers[1][:0].reshape(d,0)
+
+    def step(self, b):
+        """Advance by one block.
+
+        Args:
+            b : coefficients of the previous block (l = v b^T + ...).
+
+        Returns:
+            a : (p, p) projection of the operator on the current block.
+            b : (p', p) coefficients of the next block.
+        """
+        v, l = self.v, self.l
+        d, k = v.shape
+        dtype = self.dtype
+        w = self.buffers[2][:d*k].reshape(d,k)
+        tmp = self.buffers[3][:d*k].reshape(d,k)
+        self.matvec(v, w)
+        a = np.dot(v.T, w)
+        a = 0.5 * (a + a.T)
+        # w -= v a + l b^T
+        w -= np.dot(v, a.astype(dtype), out=tmp)
+        if l.shape[1]:
+            w -= np.dot(l, b.T.astype(dtype), out=tmp)
+            # Local reorthogonalization against the previous
+            w -= np.dot(l, np.dot(l.T, w), out=tmp)
+        # and the current block.
+        c = np.dot(v.T, w)
+        w -= np.dot(v, c, out=tmp)
+        a += 0.5 * (c + c.T)
+        # Next block in the buffer of the previous one.
+        self.l, (self.v, b) = v, _bl_orthonormalize(w, self.buffers[1], self.delta)
+        self.buffers[:2] = self.buffers[1::-1]
+        return a.astype(np.float64), b.astype(np.float64)
+
+
+def build_bl_tridiag(matvec, phi0, maxn=300, delta=1e-10, tol=1e-10, ND=10):
+    '''Build block tridiagonal coeffs. with block Lanczos method.
+
+    Args:
+        phi0 : (np.ndarray, shape=(d,p)) starting vectors (columns).
+        maxn : max. dimension of the block tridiagonal matrix.
+        delta : threshold of the singular values of the residual
+            blocks. Smaller directions are deflated (e.g. linearly
+            dependent starting vectors or exhausted Krylov space).
+        tol : set threshold for min change in the lowest p eigenvalues.
+        ND : # of iterations to check change in the lowest eigenvalues.
+
+    Returns:
+        a : list of diagonal blocks a[n] (p_n, p_n).
+        b : list of off-diagonal blocks b[n] (p_n, p_n-1). b[0] (p_0, p)
+            are the coefficients of the starting vectors, i.e.
+            phi0 = V[0] b[0].
+
+    NOTE:
+        T := block tridiagonal with diagonal a[n], lower b[n] and
+        upper b[n].T (see bl_tridiag_todense). The block size p_n shrinks
+        when directions are deflated. Each block is orthogonalized
+        against the current and previous blocks (local reorthogonalization).
+    '''
+    p = phi0.shape[1]
+    lanc = _BlockLanczos(matvec, phi0, delta)
+    if lanc.v.shape[1] == 0:
+        raise ZeroNormInitialVector("Initial vectors have zero norm.")
+    a = []
+    b = [lanc.b0]
+    # Loops vars.
+    egs_prev = np.full(p, np.inf)
+    n = 0
+    while True:
+        n += lanc.v.shape[1]
+        an, bn = lanc.step(b[-1])
+        a.append(an)
+        if (lanc.v.shape[1] == 0) or (n+lanc.v.shape[1] > maxn):
+            break
+        b.append(bn)
+        if (len(a)%ND)==0:
+            egs = np.linalg.eigvalsh(bl_tridiag_todense(a, b[1:]))[:p]
+            if np.abs(egs - egs_prev[:egs.size]).max()<tol:
+                break
+            egs_prev[:egs.size] = egs
+
+    return a, b
+
+
+def bl_tridiag_todense(a, b):
+    """Block tridiagonal matrix.
+
+    Args:
+        a : diagonal blocks (see build_bl_tridiag).
+        b : lower off-diagonal blocks b[n] (p_n+1, p_n).
+    """
+    sizes = [an.shape[0] for an in a]
+    offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(int)
+    T = np.zeros((offsets[-1],offsets[-1]))
+    for n, an in enumerate(a):
+        T[offsets[n]:offsets[n+1],offsets[n]:offsets[n+1]] = an
+    for n, bn in enumerate(b[:len(a)-1]):
+        lower = (slice(offsets[n+1],offsets[n+2]), slice(offsets[n],offsets[n+1]))
+        T[lower] = bn
+        T[lower[::-1]] = bn.T
+    return T
+
+
+def bl_solve(matvec, a, b, phi0, k=1, delta=1e-10):
+    """Block Lanczos second pass.
+
+    Eigenvectors of the lowest k eigenvalues of the block tridiagonal
+    matrix (see sl_solve):
+
+        X = sum_n V[n] U[n]
+
+    where V[n] are the blocks regenerated from phi0 and U[n] the rows
+    of the eigenvectors of T belonging to block n (matrix-matrix
+    products). delta must be the one of build_bl_tridiag.
+
+    Returns:
+        w : (k,) eigenvalues.
+        X : (d, k) eigenvectors.
+    """
+    w, U = np.linalg.eigh(bl_tridiag_todense(a, b[1:]))
+    w, U = w[:k], U[:,:k]
+    lanc = _BlockLanczos(matvec, phi0, delta)
+    X = np.zeros((lanc.d,k), np.float64)
+    offset = 0
+    for n in range(len(a)):
+        m = lanc.v.shape[1]
+        X += np.dot(lanc.v, U[offset:offset+m])
+        offset += m
+        if n+1 < len(a):
+            lanc.step(b[n])
+    return w, X
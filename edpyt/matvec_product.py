@@ -1,95 +1,308 @@
 import numpy as np
+from time import perf_counter
 from scipy.sparse.linalg.interface import LinearOperator
-from edpyt import _psparse
+from edpyt.backend import get_backend
+from edpyt.shared import params
+from edpyt import counters
+from edpyt.ham_local import Local
+from edpyt.ham_hopping import UpHopping, DwHopping
+from edpyt.ham_non_local import NonLocal
 
 from scipy.sparse import (
     # kronsum(A_mm, B_nn) = kron(I_n,A) + kron(B,I_m)
     kronsum,
     # Sparse diagonal matrix
-    diags
+    diags,
+    csr_matrix
 )
 
 """H = kron(I_dw,H_up) + kron(H_dw,I_up) + diag(H_dd).
 
 """
 
-def matvec_operator(*operators, comm=None):
+def matvec_operator(*operators, comm=None, nchunks=4, fmt='csr'):
     """Sparse matrix vector operator.
     
     Args:
         comm : if MPI communicator is given the hilbert space
             is assumed to be diveded along spin-down dimension.
+        nchunks : (MPI only) # of pipelined chunks of the transposes.
+        fmt : storage of the hoppings, 'csr' or 'sell' (SELL-C-sigma,
+            see edpyt.sell).
+
+    NOTE:
+        The returned operator exposes the precision of the
+        operators (`matvec.dtype`). Input vectors must have
+        the same dtype.
+        The operator follows the in-place protocol matvec(v, out)
+        (`matvec.inplace`): if out is given, the result is written
+        into it and nothing is allocated.
+        If params['counters'] is set, the operator updates the counters
+        (see edpyt.counters).
     """
+    if fmt not in ('csr', 'sell'):
+        raise ValueError(f'Unknown format {fmt}.')
     if comm is None:
-        return _matvec_operator(*operators)
+        if fmt == 'sell':
+            matvec = _matvec_operator_sell(*operators)
+            if params['counters']:
+                # Count the SELL kernel as a whole.
+                matvec = counters.counted_operator(*operators, matvec=matvec)
+        elif params['counters']:
+            matvec = counters.counted_operator(*operators)
+        else:
+            matvec = _matvec_operator(*operators)
+    elif fmt == 'sell':
+        raise NotImplementedError('SELL format not supported with MPI.')
     else:
-        return _matvec_operator_mpi(*operators, comm=comm)
+        matvec = _matvec_operator_mpi(*operators, comm=comm, nchunks=nchunks)
+        if params['counters']:
+            matvec = counters.counted_operator(*operators, matvec=matvec)
+    matvec.dtype = np.result_type(*(op.dtype for op in operators))
+    matvec.inplace = True
+    return matvec
+
+
+def _fused_operators(*operators):
+    """Match operators to the arguments of the fused kernel.
+
+    Returns:
+        (vec_diag, sp_mat_up, sp_mat_dw, sp_mat_nl) or None if the
+        operators do not form a complete sector Hamiltonian.
+    """
+    match = {Local:[], UpHopping:[], DwHopping:[], NonLocal:[]}
+    for op in operators:
+        for kind in match:
+            if isinstance(op, kind):
+                match[kind].append(op)
+                break
+        else:
+            return None
+    if any(len(match[kind])!=1 for kind in (Local, UpHopping, DwHopping)):
+        return None
+    if len(match[NonLocal])>1:
+        return None
+    if len(set(op.dtype for op in operators))>1:
+        return None
+    vec_diag, = match[Local]
+    sp_mat_up, = match[UpHopping]
+    sp_mat_dw, = match[DwHopping]
+    sp_mat_nl = match[NonLocal][0] if match[NonLocal] else None
+    return vec_diag, sp_mat_up, sp_mat_dw, sp_mat_nl
 
 
 def _matvec_operator(*operators):
     """Sparse matrix vector operator.
 
+    If the operators form a complete sector Hamiltonian (local,
+    up & down hoppings and optionally non-local terms), all terms 
+    are applied with a single pass over memory.
+
     Returns:
-        matvec : callable f(v)
-            Returns returns H * v.
+        matvec : callable f(v, out=None)
+            Returns returns H * v. If v has shape (d,k), H is
+            applied to the k columns of v with a single pass over
+            the operators.
 
     """
-    def matvec(vec, res=None):
-        out = res or np.empty_like(vec)
+    fused = _fused_operators(*operators)
+    if fused is not None:
+        vec_diag, sp_mat_up, sp_mat_dw, sp_mat_nl = fused
+        def matvec(vec, out=None):
+            if out is None:
+                out = np.empty_like(vec)
+            psparse = get_backend().psparse
+            if vec.ndim > 1:
+                psparse.Hmultiply_mv(vec_diag, sp_mat_up, sp_mat_dw, vec, out, sp_mat_nl)
+            else:
+                psparse.Hmultiply(vec_diag, sp_mat_up, sp_mat_dw, vec, out, sp_mat_nl)
+            return out
+        return matvec
+
+    # Only Local overwrites out (applied first), all other operators
+    # accumulate.
+    operators = sorted(operators, key=lambda op: not isinstance(op, Local))
+    overwrite = isinstance(operators[0], Local)
+    def matvec(vec, out=None):
+        if out is None:
+            out = np.empty_like(vec)
+        if not overwrite:
+            out.fill(0.)
         for op in operators:
             op.matvec(vec, out=out)
         return out
     return matvec
 
 
-def _matvec_operator_mpi(vec_diag, sp_mat_up, sp_mat_dw, comm):
-    """Sparse matrix vector operator with MPI support.
+def _matvec_operator_sell(*operators):
+    """Sparse matrix vector operator with SELL-C-sigma hoppings.
+
+    The hoppings (and non-local terms) are converted to SELL-C-sigma
+    storage (see edpyt.sell) and applied one after the other.
 
     Returns:
-        matvec : callable f(v)
+        matvec : callable f(v, out=None)
             Returns returns H * v.
 
     """
-    from edpyt.vector_transpose import collect_up, collect_dw
-    size = comm.Get_size()
+    from edpyt.sell import to_sell
+    fused = _fused_operators(*operators)
+    if fused is None:
+        raise NotImplementedError(
+            'SELL matvec requires local, up & down hoppings and optionally non-local operators.')
+    vec_diag, sp_mat_up, sp_mat_dw, sp_mat_nl = fused
+    vec_diag = vec_diag.view(np.ndarray)
+    sell_up = to_sell(sp_mat_up)
+    sell_dw = to_sell(sp_mat_dw)
+    sell_nl = None if sp_mat_nl is None else to_sell(sp_mat_nl)
+    def matvec(vec, out=None):
+        if vec.ndim > 1:
+            raise NotImplementedError('Multiple vectors are not supported.')
+        if out is None:
+            out = np.empty_like(vec)
+        psparse = get_backend().psparse
+        np.multiply(vec_diag, vec, out=out)
+        psparse.UPmultiply_sell(sell_up, vec, out)
+        psparse.DWmultiply_sell(sell_dw, vec, out)
+        if sell_nl is not None:
+            psparse.Multiply_sell(sell_nl, vec, out)
+        return out
+    return matvec
+
+
+def _matvec_operator_mpi(*operators, comm, nchunks=4):
+    """Sparse matrix vector operator with MPI support.
+
+    The hilbert space is divided along the spin-down dimension in
+    contiguous blocks (see vector_transpose.get_block_distribution),
+    s.t. any sector and any # of processes are supported. The vector
+    is transposed to the up-partition for the down spin hoppings.
+    Non-local terms need the elements of the vector referenced by the
+    local rows, which are exchanged with the other processes (see
+    vector_transpose.VectorHalo).
+
+    The transposes are split in nchunks non-blocking exchanges and
+    pipelined: the exchanges start before the local (diagonal and up
+    spin) products and the down spin product of chunk k overlaps the
+    exchanges of the following chunks.
+
+    Args:
+        operators : local, up & down hoppings and optionally non-local
+            operators. The local operator can be either the full or
+            the local (dw-partition) diagonal.
+        nchunks : # of chunks of the transposes.
+
+    Returns:
+        matvec : callable f(v, out=None)
+            Returns returns H * v for the local part v of the vector.
+            matvec.transpose (VectorTranspose) describes the
+            distribution, matvec.halo (VectorHalo or None) the
+            exchange of the non-local terms and matvec.timings accumulates the time
+            (seconds) spent in each step.
+
+    """
+    from mpi4py import MPI
+    from edpyt.vector_transpose import VectorHalo, VectorTranspose
+    fused = _fused_operators(*operators)
+    if fused is None:
+        raise NotImplementedError(
+            'MPI matvec requires local, up & down hoppings and optionally non-local operators.')
+    vec_diag, sp_mat_up, sp_mat_dw, sp_mat_nl = fused
     dup = sp_mat_up.shape[0]
     dwn = sp_mat_dw.shape[0]
-    # TODO : Implement general
-    if dup!=dwn:
-        raise NotImplementedError('Works only for sector with equal up and down # of spins.')
-    if (dwn%comm.Get_size())!=0.:
-        raise ValueError('# of MPI processes must be a divisor of hilbert up(& down) space.')
-    dwn_local = dwn//size
-    def matvec(vec):
-        res = vec_diag * vec
-        _psparse.UPmultiply(sp_mat_up,vec,res)
-        vec = collect_dw(vec.reshape(dwn_local,dup),comm)
-        res = collect_dw(res.reshape(dwn_local,dup),comm)
-        _psparse.DWmultiply(sp_mat_dw,vec.reshape(-1,),res.reshape(-1,))
-        vec = collect_up(vec,comm).reshape(-1,)
-        res = collect_up(res,comm).reshape(-1,)
-        return res
+    transpose = VectorTranspose(dup, dwn, comm, vec_diag.dtype, nchunks)
+    rows = slice(transpose.dw_slice.start*dup, transpose.dw_slice.stop*dup)
+    if vec_diag.size == dup*dwn:
+        vec_diag = vec_diag[rows]
+    halo = None
+    if sp_mat_nl is not None:
+        sp_mat_nl = sp_mat_nl[rows]
+        halo = VectorHalo(sp_mat_nl.indices, transpose, vec_diag.dtype)
+        # Columns of the halo.
+        indices = np.searchsorted(halo.indices, sp_mat_nl.indices).astype(sp_mat_nl.indices.dtype)
+        sp_mat_nl = csr_matrix((sp_mat_nl.data, indices, sp_mat_nl.indptr),
+                               shape=(sp_mat_nl.shape[0], halo.size))
+        vec_halo = np.empty(halo.size, vec_diag.dtype)
+    # Buffers of the up-partition.
+    vec_t = np.empty(dwn*transpose.dup_local, vec_diag.dtype)
+    res_t = np.empty_like(vec_t)
+    chunks = list(zip(transpose.chunks(vec_t), transpose.chunks(res_t)))
+    res = np.empty(vec_diag.size, vec_diag.dtype)
+    timings = dict.fromkeys(['post','local','nonlocal','dw','wait','add'], 0.)
+    def matvec(vec, out=None):
+        if out is None:
+            out = np.empty_like(vec)
+        psparse = get_backend().psparse
+        t0 = perf_counter()
+        requests = [transpose.Icollect_dw(vec, vec_t, k) for k in range(nchunks)]
+        if sp_mat_nl is not None:
+            gather = halo.Iexchange(vec, vec_halo)
+        t1 = perf_counter()
+        np.multiply(vec_diag, vec, out=out)
+        if vec.size:
+            psparse.UPmultiply(sp_mat_up,vec,out)
+        t2 = perf_counter()
+        timings['post'] += t1 - t0
+        timings['local'] += t2 - t1
+        for k, (v, r) in enumerate(chunks):
+            t0 = perf_counter()
+            requests[k].Wait()
+            t1 = perf_counter()
+            r.fill(0.)
+            if r.size:
+                psparse.DWmultiply(sp_mat_dw,v.reshape(-1,),r.reshape(-1,))
+            requests[k] = transpose.Icollect_up(res_t, res, k)
+            timings['wait'] += t1 - t0
+            timings['dw'] += perf_counter() - t1
+        if sp_mat_nl is not None:
+            t0 = perf_counter()
+            gather.Wait()
+            t1 = perf_counter()
+            if vec.size:
+                psparse.Multiply(sp_mat_nl,vec_halo,out)
+            timings['wait'] += t1 - t0
+            timings['nonlocal'] += perf_counter() - t1
+        t0 = perf_counter()
+        MPI.Request.Waitall(requests)
+        t1 = perf_counter()
+        out += res
+        timings['wait'] += t1 - t0
+        timings['add'] += perf_counter() - t1
+        return out
+    matvec.transpose = transpose
+    matvec.halo = halo
+    matvec.timings = timings
     return matvec
 
 
-def todense(*operators):
+def todense(*operators, out=None):
     """Construct dense matrix Hamiltonian explicitely.
 
+    The operators are scattered into a single Fortran ordered array
+    (no dense intermediates of the kron products).
+
+    Args:
+        out : (optional) output array, overwritten.
+
     Returns:
         H
 
     """
-    diag_op = []
-    ops = []
+    if out is None:
+        d = max(_dense_dim(op) for op in operators)
+        dtype = np.result_type(*(op.dtype for op in operators))
+        out = np.zeros((d,d), dtype, order='F')
+    else:
+        out[:] = 0.
     for op in operators:
-        if op.ndim<2:
-            diag_op.append(op)
-        else:
-            ops.append(op)
-    out = ops.pop().todense()
-    n = out.shape[0]
-    for op in ops:
-        out += op.todense()
-    for dop in diag_op:
-        out.flat[::n+1] += dop
+        op.todense(out=out)
     return out
+
+
+def _dense_dim(op):
+    """Dimension of the (dense) many-body operator."""
+    if isinstance(op, UpHopping):
+        return op.shape[0] * op.dwn
+    if isinstance(op, DwHopping):
+        return op.shape[0] * op.dup
+    return op.shape[0]
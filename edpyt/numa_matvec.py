@@ -0,0 +1,219 @@
+"""Shared memory matrix vector operator on NUMA pinned processes.
+
+OpenMP threads of a single process do not scale beyond a socket. Here,
+the hilbert vector is divided along the spin-down dimension (the
+dw-partition of matvec_product._matvec_operator_mpi) over worker
+processes, each pinned to the CPUs of one NUMA node. The input and
+output vectors live in shared memory, s.t. the down spin hoppings read
+the full input vector directly and no transposes are needed. Each worker
+only writes its own rows, which are placed on its node (first touch).
+
+"""
+import os
+import re
+import weakref
+from glob import glob
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from threading import BrokenBarrierError
+
+import numpy as np
+
+from edpyt.backend import get_backend, set_backend
+from edpyt.ham_hopping import DwHopping
+
+
+def get_numa_nodes():
+    """CPUs of each NUMA node.
+
+    Falls back to a single node with the CPUs available to the
+    process if the topology can not be read.
+    """
+    available = os.sched_getaffinity(0) if hasattr(os, 'sched_getaffinity') else None
+    nodes = []
+    for path in sorted(glob('/sys/devices/system/node/node[0-9]*/cpulist'),
+                       key=lambda p: int(re.findall(r'node(\d+)', p)[0])):
+        with open(path) as fp:
+            cpus = parse_cpulist(fp.read())
+        if available is not None:
+            cpus &= available
+        if cpus:
+            nodes.append(cpus)
+    if not nodes:
+        nodes.append(available or set(range(os.cpu_count())))
+    return nodes
+
+
+def parse_cpulist(cpulist):
+    """Parse a cpulist (e.g. '0-3,8-11')."""
+    cpus = set()
+    for item in cpulist.strip().split(','):
+        if not item:
+            continue
+        start, _, stop = item.partition('-')
+        cpus.update(range(int(start), int(stop or start)+1))
+    return cpus
+
+
+def _mask_rows(sp_mat_dw, start, stop):
+    """Keep only the rows [start, stop) of the down spin hoppings."""
+    indptr = sp_mat_dw.indptr.copy()
+    indptr[:start+1] = sp_mat_dw.indptr[start]
+    indptr[stop+1:] = sp_mat_dw.indptr[stop]
+    nnz = slice(indptr[0], indptr[-1])
+    indptr -= indptr[0]
+    return DwHopping((sp_mat_dw.data[nnz], sp_mat_dw.indices[nnz], indptr),
+                     sp_mat_dw.dup, shape=sp_mat_dw.shape)
+
+
+def _worker(name, d, dtype, rows, operators, cpus, backend, barrier, stop):
+    """Worker loop (see NumaMatvec)."""
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    set_backend(backend)
+    shm = SharedMemory(name=name)
+    try:
+        _worker_loop(np.ndarray((2,d), dtype, buffer=shm.buf), rows,
+                     operators, barrier, stop)
+    except BaseException:
+        barrier.abort()
+        raise
+    finally:
+        shm.close()
+
+
+def _worker_loop(buffer, rows, operators, barrier, stop):
+    x, y = buffer
+    x_local, y_local = x[rows], y[rows]
+    # First touch.
+    x_local.fill(0.)
+    y_local.fill(0.)
+    vec_diag, sp_mat_up, sp_mat_dw, sp_mat_nl = operators
+    psparse = get_backend().psparse
+    barrier.wait()
+    while True:
+        barrier.wait()
+        if stop.value:
+            break
+        np.multiply(vec_diag, x_local, out=y_local)
+        if y_local.size:
+            psparse.UPmultiply(sp_mat_up,x_local,y_local)
+            if sp_mat_nl is not None:
+                psparse.Multiply(sp_mat_nl,x,y_local)
+        psparse.DWmultiply(sp_mat_dw,x,y)
+        barrier.wait()
+
+
+def _shutdown(processes, barrier, stop, shm):
+    stop.value = 1
+    try:
+        barrier.wait(timeout=10.)
+    except BrokenBarrierError:
+        pass
+    for p in processes:
+        p.join(timeout=10.)
+        if p.is_alive():
+            p.terminate()
+    shm.close()
+    shm.unlink()
+
+
+class NumaMatvec:
+    """Matrix vector operator on NUMA pinned worker processes.
+
+    Args:
+        operators : local, up & down hoppings and optionally non-local
+            operators (see build_mb_ham).
+        nworkers : # of worker processes (default: one per NUMA node).
+            Workers are assigned to the nodes round-robin.
+        nodes : (optional) list of CPU sets, one per NUMA node
+            (default: get_numa_nodes()).
+
+    The operator follows the in-place protocol matvec(v, out). The
+    shared input and output vectors are exposed (x, y); passing them
+    as v and out avoids the copies in and out of shared memory.
+    The worker processes are stopped with close().
+
+    Example:
+
+        with NumaMatvec(*build_mb_ham(H, V, sct)) as matvec:
+            a, b = build_sl_tridiag(matvec, v0)
+    """
+    inplace = True
+
+    def __init__(self, *operators, nworkers=None, nodes=None):
+        from edpyt.matvec_product import _fused_operators
+        fused = _fused_operators(*operators)
+        if fused is None:
+            raise NotImplementedError(
+                'NUMA matvec requires local, up & down hoppings and optionally non-local operators.')
+        vec_diag, sp_mat_up, sp_mat_dw, sp_mat_nl = fused
+        vec_diag = vec_diag.view(np.ndarray)
+        dup = sp_mat_up.shape[0]
+        dwn = sp_mat_dw.shape[0]
+        self.d = d = dup * dwn
+        self.dtype = vec_diag.dtype
+        nodes = get_numa_nodes() if nodes is None else nodes
+        nworkers = len(nodes) if nworkers is None else nworkers
+        self.nworkers = nworkers
+
+        self._shm = SharedMemory(create=True, size=max(1, 2*d*self.dtype.itemsize))
+        ctx = get_context('spawn')
+        self._barrier = ctx.Barrier(nworkers+1)
+        self._stop = ctx.Value('i', 0)
+        # Contiguous blocks of down spin states (the first dwn % nworkers
+        # workers get one more, as in vector_transpose).
+        counts = np.full(nworkers, dwn//nworkers)
+        counts[:dwn%nworkers] += 1
+        displs = np.concatenate([[0], np.cumsum(counts)])
+        self._processes = []
+        for w in range(nworkers):
+            start, stop = displs[w], displs[w+1]
+            rows = slice(start*dup, stop*dup)
+            local = (vec_diag[rows],
+                     sp_mat_up,
+                     _mask_rows(sp_mat_dw, start, stop),
+                     None if sp_mat_nl is None else sp_mat_nl[rows])
+            p = ctx.Process(target=_worker, daemon=True,
+                            args=(self._shm.name, d, self.dtype, rows, local,
+                                  nodes[w%len(nodes)], get_backend().name,
+                                  self._barrier, self._stop))
+            p.start()
+            self._processes.append(p)
+        self._finalizer = weakref.finalize(self, _shutdown, self._processes,
+                                           self._barrier, self._stop, self._shm)
+        # Wait for the first touch of the workers.
+        self._wait()
+        self.x, self.y = np.ndarray((2,d), self.dtype, buffer=self._shm.buf)
+
+    def _wait(self):
+        try:
+            self._barrier.wait()
+        except BrokenBarrierError:
+            self.close()
+            raise RuntimeError('NUMA matvec worker failed.')
+
+    def __call__(self, vec, out=None):
+        if vec.ndim > 1:
+            raise NotImplementedError('Multiple vectors are not supported.')
+        if out is None:
+            out = np.empty_like(vec)
+        if vec is not self.x:
+            self.x[:] = vec
+        # Start & wait.
+        self._wait()
+        self._wait()
+        if out is not self.y:
+            out[:] = self.y
+        return out
+
+    def close(self):
+        """Stop the worker processes and release the shared memory."""
+        self.x = self.y = None
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
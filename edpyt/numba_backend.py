@@ -0,0 +1,419 @@
+"""Pure numba implementation of the compiled kernels.
+
+Mirrors the API of the Cython extensions (_psparse, _continued_fraction),
+s.t. edpyt runs where the extensions can not be built.
+
+"""
+import numpy as np
+import numba
+from numba import njit, prange
+
+
+L2_CACHE_SIZE = 262144
+
+
+#-----------------------------------------------------------------------------
+# Kernels
+#-----------------------------------------------------------------------------
+# Indices are cast to unsigned and inner loops run over slices, s.t. numba
+# drops the wraparound checks and the loops vectorize.
+
+
+@njit(cache=True)
+def _axpy(x, w, y):
+    for s in range(y.size):
+        y[s] += x * w[s]
+
+
+@njit(parallel=True, cache=True)
+def _up_multiply(indptr, indices, data, W, result):
+    nup = indptr.size - 1
+    ndw = W.shape[0] // nup
+    for i in prange(ndw):
+        # Parallelize over rows.
+        w = W[i*nup:(i+1)*nup]
+        y = result[i*nup:(i+1)*nup]
+        for iup in range(nup):
+            tmp = 0.
+            for p in range(indptr[iup], indptr[iup+1]):
+                tmp += data[p] * w[np.uint32(indices[p])]
+            y[iup] += tmp
+
+
+@njit(parallel=True, cache=True)
+def _dw_multiply(indptr, indices, data, W, result, tile):
+    ndw = indptr.size - 1
+    nup = W.shape[0] // ndw
+    ntiles = (nup + tile - 1) // tile
+    for t in prange(ntiles*ndw):
+        # Parallelize over (tile, row) pairs
+        i = t % ndw
+        s0 = (t // ndw) * tile
+        s1 = min(s0 + tile, nup)
+        y = result[i*nup+s0:i*nup+s1]
+        for p in range(indptr[i], indptr[i+1]):
+            _axpy(data[p], W[indices[p]*nup+s0:indices[p]*nup+s1], y)
+
+
+@njit(parallel=True, cache=True)
+def _multiply(indptr, indices, data, W, result):
+    m = indptr.size - 1
+    for i in prange(m):
+        # Parallelize over rows
+        tmp = 0.
+        for p in range(indptr[i], indptr[i+1]):
+            tmp += data[p] * W[np.uint32(indices[p])]
+        result[i] += tmp
+
+
+@njit(parallel=True, cache=True)
+def _h_multiply(D, up_indptr, up_indices, up_data, dw_indptr, dw_indices,
+                dw_data, nl_indptr, nl_indices, nl_data, has_nl, W, result):
+    nup = up_indptr.size - 1
+    ndw = dw_indptr.size - 1
+    for idw in prange(ndw):
+        # Parallelize over blocks of down spin rows.
+        y = result[idw*nup:(idw+1)*nup]
+        w = W[idw*nup:(idw+1)*nup]
+        # Diagonal & up spin hoppings.
+        for iup in range(nup):
+            tmp = D[idw*nup+iup] * w[iup]
+            for p in range(up_indptr[iup], up_indptr[iup+1]):
+                tmp += up_data[p] * w[np.uint32(up_indices[p])]
+            y[iup] = tmp
+        # Non-local terms.
+        if has_nl:
+            for iup in range(nup):
+                tmp = 0.
+                for p in range(nl_indptr[idw*nup+iup], nl_indptr[idw*nup+iup+1]):
+                    tmp += nl_data[p] * W[np.uint32(nl_indices[p])]
+                y[iup] += tmp
+        # Down spin hoppings.
+        for p in range(dw_indptr[idw], dw_indptr[idw+1]):
+            j = dw_indices[p]*nup
+            _axpy(dw_data[p], W[j:j+nup], y)
+
+
+#-----------------------------------------------------------------------------
+# Multi-vector kernels
+#-----------------------------------------------------------------------------
+
+
+@njit(parallel=True, cache=True)
+def _up_multiply_mv(indptr, indices, data, W, result):
+    nup = indptr.size - 1
+    ndw = W.shape[0] // nup
+    k = W.shape[1]
+    for i in prange(ndw):
+        # Parallelize over rows.
+        for iup in range(nup):
+            y = result[i*nup+iup]
+            for p in range(indptr[iup], indptr[iup+1]):
+                x = data[p]
+                w = W[i*nup+np.uint32(indices[p])]
+                for c in range(k):
+                    y[c] += x * w[c]
+
+
+@njit(parallel=True, cache=True)
+def _dw_multiply_mv(indptr, indices, data, W, result):
+    ndw = indptr.size - 1
+    nup = W.shape[0] // ndw
+    k = W.shape[1]
+    for i in prange(ndw):
+        # Parallelize over rows
+        for p in range(indptr[i], indptr[i+1]):
+            x = data[p]
+            j = indices[p]*nup
+            for s in range(nup):
+                y = result[i*nup+s]
+                w = W[j+s]
+                for c in range(k):
+                    y[c] += x * w[c]
+
+
+@njit(parallel=True, cache=True)
+def _multiply_mv(indptr, indices, data, W, result):
+    m = indptr.size - 1
+    k = W.shape[1]
+    for i in prange(m):
+        # Parallelize over rows
+        y = result[i]
+        for p in range(indptr[i], indptr[i+1]):
+            x = data[p]
+            w = W[np.uint32(indices[p])]
+            for c in range(k):
+                y[c] += x * w[c]
+
+
+@njit(parallel=True, cache=True)
+def _h_multiply_mv(D, up_indptr, up_indices, up_data, dw_indptr, dw_indices,
+                   dw_data, nl_indptr, nl_indices, nl_data, has_nl, W, result):
+    nup = up_indptr.size - 1
+    ndw = dw_indptr.size - 1
+    k = W.shape[1]
+    for idw in prange(ndw):
+        # Parallelize over blocks of down spin rows.
+        for iup in range(nup):
+            i = idw*nup + iup
+            y = result[i]
+            # Diagonal.
+            x = D[i]
+            w = W[i]
+            for c in range(k):
+                y[c] = x * w[c]
+            # Up spin hoppings.
+            for p in range(up_indptr[iup], up_indptr[iup+1]):
+                x = up_data[p]
+                w = W[idw*nup+np.uint32(up_indices[p])]
+                for c in range(k):
+                    y[c] += x * w[c]
+            # Non-local terms.
+            if has_nl:
+                for p in range(nl_indptr[i], nl_indptr[i+1]):
+                    x = nl_data[p]
+                    w = W[np.uint32(nl_indices[p])]
+                    for c in range(k):
+                        y[c] += x * w[c]
+        # Down spin hoppings.
+        for p in range(dw_indptr[idw], dw_indptr[idw+1]):
+            x = dw_data[p]
+            j = dw_indices[p]*nup
+            for s in range(nup):
+                y = result[idw*nup+s]
+                w = W[j+s]
+                for c in range(k):
+                    y[c] += x * w[c]
+
+
+#-----------------------------------------------------------------------------
+# SELL-C-sigma kernels
+#-----------------------------------------------------------------------------
+# Element j of the r-th row of chunk c is at ptr[c] + j*C + r (see edpyt.sell).
+
+
+@njit(cache=True)
+def _sell_gaxpy_chunk(C, ptr, width, perm, indices, data, W, result, c, tmp):
+    m = perm.size
+    tmp[:] = 0.
+    for j in range(width[c]):
+        off = ptr[c] + j*C
+        for r in range(C):
+            tmp[r] += data[off+r] * W[np.uint32(indices[off+r])]
+    for r in range(min(C, m - c*C)):
+        result[perm[c*C+r]] += tmp[r]
+
+
+@njit(parallel=True, cache=True)
+def _up_multiply_sell(C, ptr, width, perm, indices, data, W, result):
+    nup = perm.size
+    ndw = W.shape[0] // nup
+    for i in prange(ndw):
+        # Parallelize over rows.
+        tmp = np.empty(C, result.dtype)
+        w = W[i*nup:(i+1)*nup]
+        y = result[i*nup:(i+1)*nup]
+        for c in range(width.size):
+            _sell_gaxpy_chunk(C, ptr, width, perm, indices, data, w, y, c, tmp)
+
+
+@njit(parallel=True, cache=True)
+def _dw_multiply_sell(C, ptr, width, perm, indices, data, W, result, tile):
+    ndw = perm.size
+    nup = W.shape[0] // ndw
+    nchunks = width.size
+    ntiles = (nup + tile - 1) // tile
+    for t in prange(ntiles*nchunks):
+        # Parallelize over (tile, chunk) pairs
+        c = t % nchunks
+        s0 = (t // nchunks) * tile
+        s1 = min(s0 + tile, nup)
+        for r in range(min(C, ndw - c*C)):
+            i = perm[c*C+r]
+            y = result[i*nup+s0:i*nup+s1]
+            for j in range(width[c]):
+                p = ptr[c] + j*C + r
+                if data[p] == 0.:
+                    # Padding.
+                    continue
+                _axpy(data[p], W[indices[p]*nup+s0:indices[p]*nup+s1], y)
+
+
+@njit(parallel=True, cache=True)
+def _multiply_sell(C, ptr, width, perm, indices, data, W, result):
+    for c in prange(width.size):
+        # Parallelize over chunks
+        tmp = np.empty(C, result.dtype)
+        _sell_gaxpy_chunk(C, ptr, width, perm, indices, data, W, result, c, tmp)
+
+
+@njit(parallel=True, cache=True)
+def _continued_fraction(z, a, b):
+    m = z.size
+    n = a.size
+    out = np.empty(m, np.complex128)
+    for i in prange(m):
+        r = 0.j
+        for j in range(n-1,-1,-1):
+            r = b[j] / (z[i]-a[j]-r)
+        out[i] = r
+    return out
+
+
+#-----------------------------------------------------------------------------
+# Functions
+#-----------------------------------------------------------------------------
+
+
+def set_num_threads(n):
+    """Set the # of numba threads of the kernels."""
+    numba.set_num_threads(max(1, min(n, numba.config.NUMBA_NUM_THREADS)))
+
+
+def get_num_threads():
+    """# of numba threads of the kernels."""
+    return numba.get_num_threads()
+
+
+def _csr(X):
+    if X.format == 'csc':
+        raise NotImplementedError('csc format not supported.')
+    return X.indptr, X.indices, X.data
+
+
+def _check_rows(W, result):
+    if (W.strides[1] != W.itemsize) or (result.strides[1] != result.itemsize):
+        raise ValueError('Rows of multi-vectors must be contiguous.')
+    if W.shape != result.shape:
+        raise ValueError('Multi-vectors shape mismatch.')
+
+
+def _nl_args(Xnl, W):
+    if Xnl is None:
+        return np.zeros(1, np.int32), np.zeros(1, np.int32), np.zeros(1, W.dtype), False
+    return _csr(Xnl) + (True,)
+
+
+def UPmultiply(X, W, result):
+    """Multiply a UP spin.
+
+    """
+    _up_multiply(*_csr(X), W, result)
+
+
+def get_dw_tile(X, nup, itemsize=8):
+    """Tile size (# of up spin states) for DWmultiply.
+
+    The tile is chosen s.t. the input strips of the densest row of X,
+    together with the output strip, fit in L2_CACHE_SIZE.
+    """
+    nnz_row = np.diff(X.indptr).max() if X.shape[0] else 1
+    return _dw_tile(nnz_row, nup, itemsize)
+
+
+def _dw_tile(nnz_row, nup, itemsize=8):
+    nnz_row = max(1, nnz_row)
+    tile = L2_CACHE_SIZE // (itemsize * (nnz_row + 1))
+    tile = max(64, tile - tile % 8)
+    return min(tile, nup)
+
+
+def DWmultiply(X, W, result, tile=0):
+    """Multiply DW spin component.
+
+    See also edpyt._psparse.DWmultiply.
+    """
+    nup = W.size // X.shape[0]
+    if tile <= 0:
+        tile = get_dw_tile(X, nup, W.itemsize)
+    tile = max(1, min(tile, nup))
+    _dw_multiply(*_csr(X), W, result, tile)
+
+
+def Multiply(X, W, result):
+    """Multiply full vector.
+
+    """
+    _multiply(*_csr(X), W, result)
+
+
+def Hmultiply(D, Xup, Xdw, W, result, Xnl=None):
+    """Multiply full Hamiltonian in a single pass.
+
+    result = D * W + kron(I_dw,Xup) W + kron(Xdw,I_up) W (+ Xnl W)
+    """
+    _h_multiply(D, *_csr(Xup), *_csr(Xdw), *_nl_args(Xnl, W), W, result)
+
+
+def _sell(X):
+    if X.format != 'sell':
+        raise NotImplementedError(f'{X.format} format not supported.')
+    return X.C, X.chunk_ptr, X.chunk_width, X.perm, X.indices, X.data
+
+
+def UPmultiply_sell(X, W, result):
+    """Multiply a UP spin (SELL-C-sigma).
+
+    """
+    _up_multiply_sell(*_sell(X), W, result)
+
+
+def DWmultiply_sell(X, W, result, tile=0):
+    """Multiply DW spin component (SELL-C-sigma).
+
+    See also edpyt._psparse.DWmultiply_sell.
+    """
+    nup = W.size // X.shape[0]
+    if tile <= 0:
+        tile = _dw_tile(X.width, nup, W.itemsize)
+    tile = max(1, min(tile, nup))
+    _dw_multiply_sell(*_sell(X), W, result, tile)
+
+
+def Multiply_sell(X, W, result):
+    """Multiply full vector (SELL-C-sigma).
+
+    """
+    _multiply_sell(*_sell(X), W, result)
+
+
+def UPmultiply_mv(X, W, result):
+    """Multiply a UP spin (multiple vectors).
+
+    """
+    _check_rows(W, result)
+    _up_multiply_mv(*_csr(X), W, result)
+
+
+def DWmultiply_mv(X, W, result):
+    """Multiply DW spin component (multiple vectors).
+
+    """
+    _check_rows(W, result)
+    _dw_multiply_mv(*_csr(X), W, result)
+
+
+def Multiply_mv(X, W, result):
+    """Multiply full vector (multiple vectors).
+
+    """
+    _check_rows(W, result)
+    _multiply_mv(*_csr(X), W, result)
+
+
+def Hmultiply_mv(D, Xup, Xdw, W, result, Xnl=None):
+    """Multiply full Hamiltonian in a single pass (multiple vectors).
+
+    See also Hmultiply.
+    """
+    _check_rows(W, result)
+    _h_multiply_mv(D, *_csr(Xup), *_csr(Xdw), *_nl_args(Xnl, W), W, result)
+
+
+def continued_fraction(z, a, b):
+    """Continued fraction b[0] / (z - a[0] - b[1] / (z - a[1] - ...)).
+
+    """
+    z = np.atleast_1d(z).astype(complex)
+    out = _continued_fraction(z, a.astype(complex), b.astype(complex))
+    return np.squeeze(out)
@@ -7,6 +7,7 @@ import numpy as np
 import scipy.sparse
 from libc.stddef cimport ptrdiff_t
 from cython.parallel import parallel, prange
+cimport openmp
 
 #-----------------------------------------------------------------------------
 # Headers
@@ -24,19 +25,79 @@ ctypedef struct cs:
     double *x       # numerical values, size nzmax
     csi nz          # # of entries in triplet matrix, -1 for compressed-col
 
+ctypedef struct css:
+    # single precision matrix in compressed-row form
+    csi nzmax
+    csi m
+    csi n
+    csi *p
+    csi *i
+    float *x
+    csi nz
+
+ctypedef struct sell:
+    # matrix in sliced ELLPACK (SELL-C-sigma) form (see edpyt.sell)
+    csi m           # number of rows
+    csi n           # number of columns
+    csi C           # chunk height
+    csi *p          # chunk pointers (size nchunks+1)
+    csi *w          # chunk widths (size nchunks)
+    csi *perm       # row stored at each position (size m)
+    csi *i          # column indices
+    double *x       # numerical values
+
+ctypedef struct sells:
+    # single precision matrix in SELL-C-sigma form
+    csi m
+    csi n
+    csi C
+    csi *p
+    csi *w
+    csi *perm
+    csi *i
+    float *x
+
+# Kernels are compiled for both single and double precision vectors.
+ctypedef fused floating:
+    float
+    double
+
 cdef extern csi csr_gaxpy (cs *A, double *x, double *y) nogil
 cdef extern csi csr_saxpy (cs *A, double *x, double *y, csi i, csi n) nogil
+cdef extern csi csr_gaxpy_s (css *A, float *x, float *y) nogil
+cdef extern csi csr_saxpy_s (css *A, float *x, float *y, csi i, csi n) nogil
+cdef extern csi csr_saxpy_tile (cs *A, double *x, double *y, csi i, csi n, csi s0, csi s1) nogil
+cdef extern csi csr_saxpy_tile_s (css *A, float *x, float *y, csi i, csi n, csi s0, csi s1) nogil
+cdef extern csi sell_gaxpy_chunk (sell *A, double *x, double *y, csi c) nogil
+cdef extern csi sell_gaxpy (sell *A, double *x, double *y) nogil
+cdef extern csi sell_saxpy_tile (sell *A, double *x, double *y, csi c, csi n, csi s0, csi s1) nogil
+cdef extern csi sell_gaxpy_chunk_s (sells *A, float *x, float *y, csi c) nogil
+cdef extern csi sell_gaxpy_s (sells *A, float *x, float *y) nogil
+cdef extern csi sell_saxpy_tile_s (sells *A, float *x, float *y, csi c, csi n, csi s0, csi s1) nogil
 
 assert sizeof(csi) == 4
 
+# Cache size (bytes) used to block the DW spin multiplication.
+L2_CACHE_SIZE = 262144
+
 #-----------------------------------------------------------------------------
 # Functions
 #-----------------------------------------------------------------------------
 
 
+def set_num_threads(int n):
+    """Set the # of OpenMP threads of the kernels."""
+    openmp.omp_set_num_threads(max(1, n))
+
+
+def get_num_threads():
+    """# of OpenMP threads of the kernels."""
+    return openmp.omp_get_max_threads()
+
+
 @cython.boundscheck(False)
-def UPmultiply(X not None, np.ndarray[ndim=1, mode='c', dtype=np.float64_t] W not None,
-              np.ndarray[ndim=1, mode='c', dtype=np.float64_t] result not None):
+def UPmultiply(X not None, np.ndarray[ndim=1, mode='c', dtype=floating] W not None,
+              np.ndarray[ndim=1, mode='c', dtype=floating] result not None):
     """Multiply a UP spin.
 
     """
@@ -45,83 +106,622 @@ def UPmultiply(X not None, np.ndarray[ndim=1, mode='c', dtype=np.float64_t] W no
 
     cdef int i, nup, ndw
     cdef cs csX
+    cdef css cssX
     cdef np.ndarray[csi, ndim=1, mode = 'c'] indptr  = X.indptr
     cdef np.ndarray[csi, ndim=1, mode = 'c'] indices = X.indices
-    cdef np.ndarray[double, ndim=1, mode = 'c'] data = X.data
-
-    csX.nzmax = X.data.shape[0]
-    csX.m = X.shape[0]
-    csX.n = X.shape[1]
-    csX.p = &indptr[0]
-    csX.i = &indices[0]
-    csX.x = &data[0]
-    csX.nz = 1
+    cdef np.ndarray[floating, ndim=1, mode = 'c'] data = X.data
 
     nup = X.shape[0]
     ndw = W.size // nup
-    for i in prange(ndw, nogil=True):
-        # Parallelize over rows.
-        csr_gaxpy(&csX, &W[i*nup], &result[i*nup])
+
+    if floating is double:
+        csX.nzmax = X.data.shape[0]
+        csX.m = X.shape[0]
+        csX.n = X.shape[1]
+        csX.p = &indptr[0]
+        csX.i = &indices[0]
+        csX.x = &data[0]
+        csX.nz = 1
+
+        for i in prange(ndw, nogil=True):
+            # Parallelize over rows.
+            csr_gaxpy(&csX, &W[i*nup], &result[i*nup])
+    else:
+        cssX.nzmax = X.data.shape[0]
+        cssX.m = X.shape[0]
+        cssX.n = X.shape[1]
+        cssX.p = &indptr[0]
+        cssX.i = &indices[0]
+        cssX.x = &data[0]
+        cssX.nz = 1
+
+        for i in prange(ndw, nogil=True):
+            # Parallelize over rows.
+            csr_gaxpy_s(&cssX, &W[i*nup], &result[i*nup])
+
+
+def get_dw_tile(X, nup, itemsize=8):
+    """Tile size (# of up spin states) for DWmultiply.
+
+    The tile is chosen s.t. the input strips of the densest row of X,
+    together with the output strip, fit in L2_CACHE_SIZE.
+    """
+    nnz_row = np.diff(X.indptr).max() if X.shape[0] else 1
+    return _dw_tile(nnz_row, nup, itemsize)
+
+
+def _dw_tile(nnz_row, nup, itemsize=8):
+    nnz_row = max(1, nnz_row)
+    tile = L2_CACHE_SIZE // (itemsize * (nnz_row + 1))
+    tile = max(64, tile - tile % 8)
+    return min(tile, nup)
 
 
 @cython.boundscheck(False)
-def DWmultiply(X not None, np.ndarray[ndim=1, mode='c', dtype=np.float64_t] W not None,
-           np.ndarray[ndim=1, mode='c', dtype=np.float64_t] result not None):
+def DWmultiply(X not None, np.ndarray[ndim=1, mode='c', dtype=floating] W not None,
+           np.ndarray[ndim=1, mode='c', dtype=floating] result not None,
+           int tile=0):
     """Multiply DW spin component.
 
+    The up spin index is blocked in tiles (see get_dw_tile) and the
+    (tile, row) pairs are distributed over the threads in tile-major
+    order, s.t. consecutive rows of a thread reuse the same tile of
+    input strips. tile >= nup recovers the unblocked multiplication.
     """
     if X.format == 'csc':
         raise NotImplementedError('csc format not supported.')
 
-    cdef int i, nup, ndw
+    cdef int i, t, s0, s1, nup, ndw, ntiles
     cdef cs csX
+    cdef css cssX
     cdef np.ndarray[csi, ndim=1, mode = 'c'] indptr  = X.indptr
     cdef np.ndarray[csi, ndim=1, mode = 'c'] indices = X.indices
-    cdef np.ndarray[double, ndim=1, mode = 'c'] data = X.data
+    cdef np.ndarray[floating, ndim=1, mode = 'c'] data = X.data
+
+    ndw = X.shape[0]
+    nup = W.size // ndw
+    if tile <= 0:
+        tile = get_dw_tile(X, nup, W.itemsize)
+    tile = min(tile, nup)
+    ntiles = (nup + tile - 1) // tile
 
     # Pack the scipy data into the CSparse struct. This is just copying some
     # pointers.
-    csX.nzmax = X.data.shape[0]
-    csX.m = X.shape[0]
-    csX.n = X.shape[1]
-    csX.p = &indptr[0]
-    csX.i = &indices[0]
-    csX.x = &data[0]
-    csX.nz = 1
+    if floating is double:
+        csX.nzmax = X.data.shape[0]
+        csX.m = X.shape[0]
+        csX.n = X.shape[1]
+        csX.p = &indptr[0]
+        csX.i = &indices[0]
+        csX.x = &data[0]
+        csX.nz = 1
+
+        for t in prange(ntiles*ndw, nogil=True, schedule='static'):
+            # Parallelize over (tile, row) pairs
+            i = t % ndw
+            s0 = (t // ndw) * tile
+            s1 = min(s0 + tile, nup)
+            csr_saxpy_tile(&csX, &W[0], &result[0], i, nup, s0, s1)
+    else:
+        cssX.nzmax = X.data.shape[0]
+        cssX.m = X.shape[0]
+        cssX.n = X.shape[1]
+        cssX.p = &indptr[0]
+        cssX.i = &indices[0]
+        cssX.x = &data[0]
+        cssX.nz = 1
+
+        for t in prange(ntiles*ndw, nogil=True, schedule='static'):
+            # Parallelize over (tile, row) pairs
+            i = t % ndw
+            s0 = (t // ndw) * tile
+            s1 = min(s0 + tile, nup)
+            csr_saxpy_tile_s(&cssX, &W[0], &result[0], i, nup, s0, s1)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def Multiply(X not None, np.ndarray[ndim=1, mode='c', dtype=floating] W not None,
+           np.ndarray[ndim=1, mode='c', dtype=floating] result not None):
+    """Multiply full vector.
+
+    """
+    if X.format == 'csc':
+        raise NotImplementedError('csc format not supported.')
+
+    cdef int i, m, p
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] indptr  = X.indptr
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] indices = X.indices
+    cdef np.ndarray[floating, ndim=1, mode = 'c'] data = X.data
+
+    m = X.shape[0]
+    for i in prange(m, nogil=True):
+        # Parallelize over rows
+        for p in range(indptr[i], indptr[i+1]):
+            result[i] += data[p] * W[ indices[p] ]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def Hmultiply(np.ndarray[ndim=1, mode='c', dtype=floating] D not None,
+              Xup not None, Xdw not None,
+              np.ndarray[ndim=1, mode='c', dtype=floating] W not None,
+              np.ndarray[ndim=1, mode='c', dtype=floating] result not None,
+              Xnl=None):
+    """Multiply full Hamiltonian in a single pass.
+
+    result = D * W + kron(I_dw,Xup) W + kron(Xdw,I_up) W (+ Xnl W)
+
+    Each thread owns a block of down spin rows and computes all
+    contributions to the block at once, s.t. result is overwritten
+    and streamed only once.
+    """
+    if (Xup.format == 'csc') or (Xdw.format == 'csc'):
+        raise NotImplementedError('csc format not supported.')
+
+    cdef int idw, iup, j, p, s, nup, ndw, has_nl
+    cdef floating tmp, x
+    cdef floating *y
+    cdef floating *w
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] up_indptr  = Xup.indptr
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] up_indices = Xup.indices
+    cdef np.ndarray[floating, ndim=1, mode = 'c'] up_data = Xup.data
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] dw_indptr  = Xdw.indptr
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] dw_indices = Xdw.indices
+    cdef np.ndarray[floating, ndim=1, mode = 'c'] dw_data = Xdw.data
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] nl_indptr
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] nl_indices
+    cdef np.ndarray[floating, ndim=1, mode = 'c'] nl_data
+
+    if Xnl is None:
+        has_nl = 0
+        nl_indptr = np.zeros(1, np.int32)
+        nl_indices = np.zeros(1, np.int32)
+        nl_data = np.zeros(1, W.dtype)
+    else:
+        has_nl = 1
+        nl_indptr = Xnl.indptr
+        nl_indices = Xnl.indices
+        nl_data = Xnl.data
+
+    cdef csi *upp = &up_indptr[0]
+    cdef csi *upi = &up_indices[0]
+    cdef floating *upx = &up_data[0]
+    cdef csi *dwp = &dw_indptr[0]
+    cdef csi *dwi = &dw_indices[0]
+    cdef floating *dwx = &dw_data[0]
+    cdef csi *nlp = &nl_indptr[0]
+    cdef csi *nli = &nl_indices[0]
+    cdef floating *nlx = &nl_data[0]
+    cdef floating *d = &D[0]
+    cdef floating *v = &W[0]
+    cdef floating *r = &result[0]
+
+    nup = Xup.shape[0]
+    ndw = Xdw.shape[0]
+
+    for idw in prange(ndw, nogil=True):
+        # Parallelize over blocks of down spin rows.
+        y = r + idw*nup
+        w = v + idw*nup
+        # Diagonal & up spin hoppings.
+        for iup in range(nup):
+            tmp = d[idw*nup + iup] * w[iup]
+            for p in range(upp[iup], upp[iup+1]):
+                tmp = tmp + upx[p] * w[upi[p]]
+            y[iup] = tmp
+        # Non-local terms.
+        if has_nl:
+            for iup in range(nup):
+                tmp = 0.
+                for p in range(nlp[idw*nup+iup], nlp[idw*nup+iup+1]):
+                    tmp = tmp + nlx[p] * v[nli[p]]
+                y[iup] = y[iup] + tmp
+        # Down spin hoppings.
+        for p in range(dwp[idw], dwp[idw+1]):
+            x = dwx[p]
+            w = v + dwi[p]*nup
+            for s in range(nup):
+                y[s] = y[s] + x * w[s]
+
+
+#-----------------------------------------------------------------------------
+# SELL-C-sigma functions
+#-----------------------------------------------------------------------------
+# The matrices are edpyt.sell.SellMatrix. Each chunk of C rows is computed
+# by a single thread, s.t. the rows of a chunk are processed together.
+
+
+cdef int _check_sell(X) except -1:
+    if X.format != 'sell':
+        raise NotImplementedError(f'{X.format} format not supported.')
+    return 0
+
+
+@cython.boundscheck(False)
+def UPmultiply_sell(X not None, np.ndarray[ndim=1, mode='c', dtype=floating] W not None,
+                    np.ndarray[ndim=1, mode='c', dtype=floating] result not None):
+    """Multiply a UP spin (SELL-C-sigma).
+
+    """
+    _check_sell(X)
+
+    cdef int i, nup, ndw
+    cdef sell sX
+    cdef sells ssX
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] chunk_ptr = X.chunk_ptr
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] chunk_width = X.chunk_width
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] perm = X.perm
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] indices = X.indices
+    cdef np.ndarray[floating, ndim=1, mode = 'c'] data = X.data
+
+    nup = X.shape[0]
+    ndw = W.size // nup
+
+    if floating is double:
+        sX.m = X.shape[0]
+        sX.n = X.shape[1]
+        sX.C = X.C
+        sX.p = &chunk_ptr[0]
+        sX.w = &chunk_width[0]
+        sX.perm = &perm[0]
+        sX.i = &indices[0]
+        sX.x = &data[0]
+
+        for i in prange(ndw, nogil=True):
+            # Parallelize over rows.
+            sell_gaxpy(&sX, &W[i*nup], &result[i*nup])
+    else:
+        ssX.m = X.shape[0]
+        ssX.n = X.shape[1]
+        ssX.C = X.C
+        ssX.p = &chunk_ptr[0]
+        ssX.w = &chunk_width[0]
+        ssX.perm = &perm[0]
+        ssX.i = &indices[0]
+        ssX.x = &data[0]
+
+        for i in prange(ndw, nogil=True):
+            # Parallelize over rows.
+            sell_gaxpy_s(&ssX, &W[i*nup], &result[i*nup])
+
+
+@cython.boundscheck(False)
+def DWmultiply_sell(X not None, np.ndarray[ndim=1, mode='c', dtype=floating] W not None,
+                    np.ndarray[ndim=1, mode='c', dtype=floating] result not None,
+                    int tile=0):
+    """Multiply DW spin component (SELL-C-sigma).
+
+    The up spin index is blocked in tiles as in DWmultiply and the
+    (tile, chunk) pairs are distributed over the threads.
+    """
+    _check_sell(X)
+
+    cdef int c, t, s0, s1, nup, ndw, nchunks, ntiles
+    cdef sell sX
+    cdef sells ssX
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] chunk_ptr = X.chunk_ptr
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] chunk_width = X.chunk_width
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] perm = X.perm
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] indices = X.indices
+    cdef np.ndarray[floating, ndim=1, mode = 'c'] data = X.data
 
     ndw = X.shape[0]
     nup = W.size // ndw
+    nchunks = X.nchunks
+    if tile <= 0:
+        tile = _dw_tile(X.width, nup, W.itemsize)
+    tile = min(tile, nup)
+    ntiles = (nup + tile - 1) // tile
+
+    if floating is double:
+        sX.m = X.shape[0]
+        sX.n = X.shape[1]
+        sX.C = X.C
+        sX.p = &chunk_ptr[0]
+        sX.w = &chunk_width[0]
+        sX.perm = &perm[0]
+        sX.i = &indices[0]
+        sX.x = &data[0]
+
+        for t in prange(ntiles*nchunks, nogil=True, schedule='static'):
+            # Parallelize over (tile, chunk) pairs
+            c = t % nchunks
+            s0 = (t // nchunks) * tile
+            s1 = min(s0 + tile, nup)
+            sell_saxpy_tile(&sX, &W[0], &result[0], c, nup, s0, s1)
+    else:
+        ssX.m = X.shape[0]
+        ssX.n = X.shape[1]
+        ssX.C = X.C
+        ssX.p = &chunk_ptr[0]
+        ssX.w = &chunk_width[0]
+        ssX.perm = &perm[0]
+        ssX.i = &indices[0]
+        ssX.x = &data[0]
+
+        for t in prange(ntiles*nchunks, nogil=True, schedule='static'):
+            # Parallelize over (tile, chunk) pairs
+            c = t % nchunks
+            s0 = (t // nchunks) * tile
+            s1 = min(s0 + tile, nup)
+            sell_saxpy_tile_s(&ssX, &W[0], &result[0], c, nup, s0, s1)
+
+
+@cython.boundscheck(False)
+def Multiply_sell(X not None, np.ndarray[ndim=1, mode='c', dtype=floating] W not None,
+                  np.ndarray[ndim=1, mode='c', dtype=floating] result not None):
+    """Multiply full vector (SELL-C-sigma).
+
+    """
+    _check_sell(X)
+
+    cdef int c, nchunks
+    cdef sell sX
+    cdef sells ssX
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] chunk_ptr = X.chunk_ptr
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] chunk_width = X.chunk_width
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] perm = X.perm
+    cdef np.ndarray[csi, ndim=1, mode = 'c'] indices = X.indices
+    cdef np.ndarray[floating, ndim=1, mode = 'c'] data = X.data
+
+    nchunks = X.nchunks
+
+    if floating is double:
+        sX.m = X.shape[0]
+        sX.n = X.shape[1]
+        sX.C = X.C
+        sX.p = &chunk_ptr[0]
+        sX.w = &chunk_width[0]
+        sX.perm = &perm[0]
+        sX.i = &indices[0]
+        sX.x = &data[0]
+
+        for c in prange(nchunks, nogil=True):
+            # Parallelize over chunks
+            sell_gaxpy_chunk(&sX, &W[0], &result[0], c)
+    else:
+        ssX.m = X.shape[0]
+        ssX.n = X.shape[1]
+        ssX.C = X.C
+        ssX.p = &chunk_ptr[0]
+        ssX.w = &chunk_width[0]
+        ssX.perm = &perm[0]
+        ssX.i = &indices[0]
+        ssX.x = &data[0]
+
+        for c in prange(nchunks, nogil=True):
+            # Parallelize over chunks
+            sell_gaxpy_chunk_s(&ssX, &W[0], &result[0], c)
+
+
+#-----------------------------------------------------------------------------
+# Multi-vector functions
+#-----------------------------------------------------------------------------
+# The vectors are stored in the columns of W and result (shape=(d,k)), s.t.
+# the k entries of each row are contiguous. Rows can be strided, e.g.
+# W = V[:, :k] for a larger C ordered block V.
+
+
+cdef int _check_rows(floating[:, :] W, floating[:, :] result) except -1:
+    if (W.strides[1] != sizeof(floating)) or (result.strides[1] != sizeof(floating)):
+        raise ValueError('Rows of multi-vectors must be contiguous.')
+    if (W.shape[0] != result.shape[0]) or (W.shape[1] != result.shape[1]):
+        raise ValueError('Multi-vectors shape mismatch.')
+    return 0
+
+
+cdef inline int _axpy(floating x, floating *w, floating *y, int k) nogil:
+    """y[:k] += x * w[:k]"""
+    cdef int c
+    for c in range(k):
+        y[c] += x * w[c]
+    return 0
+
+
+cdef inline int _gaxpy_row(csi start, csi stop, csi *Ai, floating *Ax,
+                           floating *w, int ldw, floating *y, int k) nogil:
+    """y[:k] += sum_p Ax[p] * w[Ai[p],:k] (row stride ldw)
+
+    The columns are accumulated in (unrolled) chunks of 4 held in
+    registers, s.t. y is loaded and stored once.
+    """
+    cdef floating x, a0, a1, a2, a3
+    cdef floating *v
+    cdef int c
+    cdef csi p
+    for c in range(0, k - k%4, 4):
+        a0 = y[c]; a1 = y[c+1]; a2 = y[c+2]; a3 = y[c+3]
+        for p in range(start, stop):
+            x = Ax[p]
+            v = w + Ai[p]*ldw + c
+            a0 += x * v[0]; a1 += x * v[1]; a2 += x * v[2]; a3 += x * v[3]
+        y[c] = a0; y[c+1] = a1; y[c+2] = a2; y[c+3] = a3
+    for c in range(k - k%4, k):
+        a0 = y[c]
+        for p in range(start, stop):
+            a0 += Ax[p] * w[Ai[p]*ldw + c]
+        y[c] = a0
+    return 0
+
+
+cdef inline int _axpy_strip(floating x, floating *w, int ldw,
+                            floating *y, int ldy, int n, int k) nogil:
+    """y[:n,:k] += x * w[:n,:k] (row strides ldw and ldy)"""
+    cdef int s
+    if (ldw == k) and (ldy == k):
+        _axpy(x, w, y, n*k)
+    else:
+        for s in range(n):
+            _axpy(x, w + s*ldw, y + s*ldy, k)
+    return 0
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def UPmultiply_mv(X not None, floating[:, :] W not None,
+                  floating[:, :] result not None):
+    """Multiply a UP spin (multiple vectors).
+
+    """
+    if X.format == 'csc':
+        raise NotImplementedError('csc format not supported.')
+    _check_rows(W, result)
+
+    cdef int i, iup, nup, ndw, k, ldw, ldy
+    cdef csi[::1] indptr  = X.indptr
+    cdef csi[::1] indices = X.indices
+    cdef floating[::1] data = X.data
+    cdef csi *Ap = &indptr[0]
+    cdef csi *Ai = &indices[0]
+    cdef floating *Ax = &data[0]
+    cdef floating *w = &W[0,0]
+    cdef floating *r = &result[0,0]
+
+    nup = X.shape[0]
+    ndw = W.shape[0] // nup
+    k = W.shape[1]
+    ldw = W.strides[0] // sizeof(floating)
+    ldy = result.strides[0] // sizeof(floating)
+
+    for i in prange(ndw, nogil=True):
+        # Parallelize over rows.
+        for iup in range(nup):
+            _gaxpy_row(Ap[iup], Ap[iup+1], Ai, Ax, w + i*nup*ldw, ldw,
+                       r + (i*nup+iup)*ldy, k)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def DWmultiply_mv(X not None, floating[:, :] W not None,
+                  floating[:, :] result not None):
+    """Multiply DW spin component (multiple vectors).
+
+    """
+    if X.format == 'csc':
+        raise NotImplementedError('csc format not supported.')
+    _check_rows(W, result)
+
+    cdef int i, p, nup, ndw, k, ldw, ldy
+    cdef csi[::1] indptr  = X.indptr
+    cdef csi[::1] indices = X.indices
+    cdef floating[::1] data = X.data
+    cdef floating *w = &W[0,0]
+    cdef floating *r = &result[0,0]
+
+    ndw = X.shape[0]
+    nup = W.shape[0] // ndw
+    k = W.shape[1]
+    ldw = W.strides[0] // sizeof(floating)
+    ldy = result.strides[0] // sizeof(floating)
+
     for i in prange(ndw, nogil=True):
         # Parallelize over rows
-        csr_saxpy(&csX, &W[0], &result[0], i, nup)
+        for p in range(indptr[i], indptr[i+1]):
+            _axpy_strip(data[p], w + indices[p]*nup*ldw, ldw,
+                        r + i*nup*ldy, ldy, nup, k)
 
 
 @cython.boundscheck(False)
-def Multiply(X not None, np.ndarray[ndim=1, mode='c', dtype=np.float64_t] W not None,
-           np.ndarray[ndim=1, mode='c', dtype=np.float64_t] result not None):
-    """Multiply full vector.
+@cython.wraparound(False)
+def Multiply_mv(X not None, floating[:, :] W not None,
+                floating[:, :] result not None):
+    """Multiply full vector (multiple vectors).
 
     """
     if X.format == 'csc':
         raise NotImplementedError('csc format not supported.')
+    _check_rows(W, result)
 
-    cdef int i, nup, ndw, p
-    cdef cs csX
-    cdef np.ndarray[csi, ndim=1, mode = 'c'] indptr  = X.indptr
-    cdef np.ndarray[csi, ndim=1, mode = 'c'] indices = X.indices
-    cdef np.ndarray[double, ndim=1, mode = 'c'] data = X.data
+    cdef int i, m, k, ldw, ldy
+    cdef csi[::1] indptr  = X.indptr
+    cdef csi[::1] indices = X.indices
+    cdef floating[::1] data = X.data
+    cdef csi *Ap = &indptr[0]
+    cdef csi *Ai = &indices[0]
+    cdef floating *Ax = &data[0]
+    cdef floating *w = &W[0,0]
+    cdef floating *r = &result[0,0]
 
-    # Pack the scipy data into the CSparse struct. This is just copying some
-    # pointers.
-    csX.nzmax = X.data.shape[0]
-    csX.m = X.shape[0]
-    csX.n = X.shape[1]
-    csX.p = &indptr[0]
-    csX.i = &indices[0]
-    csX.x = &data[0]
-    csX.nz = 1
-
-    for i in prange(csX.m, nogil=True):
+    m = X.shape[0]
+    k = W.shape[1]
+    ldw = W.strides[0] // sizeof(floating)
+    ldy = result.strides[0] // sizeof(floating)
+
+    for i in prange(m, nogil=True):
         # Parallelize over rows
-        for p in range(csX.p[i], csX.p[i+1]):
-            result[i] += csX.x[p] * W[ csX.i[p] ]
\ No newline at end of file
+        _gaxpy_row(Ap[i], Ap[i+1], Ai, Ax, w, ldw, r + i*ldy, k)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def Hmultiply_mv(floating[::1] D not None, Xup not None, Xdw not None,
+                 floating[:, :] W not None, floating[:, :] result not None,
+                 Xnl=None):
+    """Multiply full Hamiltonian in a single pass (multiple vectors).
+
+    See also Hmultiply.
+    """
+    if (Xup.format == 'csc') or (Xdw.format == 'csc'):
+        raise NotImplementedError('csc format not supported.')
+    _check_rows(W, result)
+
+    cdef int idw, iup, i, c, p, nup, ndw, k, ldw, ldy, has_nl
+    cdef floating x
+    cdef floating *y
+    cdef floating *v
+    cdef csi[::1] up_indptr  = Xup.indptr
+    cdef csi[::1] up_indices = Xup.indices
+    cdef floating[::1] up_data = Xup.data
+    cdef csi[::1] dw_indptr  = Xdw.indptr
+    cdef csi[::1] dw_indices = Xdw.indices
+    cdef floating[::1] dw_data = Xdw.data
+    cdef csi[::1] nl_indptr
+    cdef csi[::1] nl_indices
+    cdef floating[::1] nl_data
+    cdef floating *w = &W[0,0]
+    cdef floating *r = &result[0,0]
+
+    if Xnl is None:
+        has_nl = 0
+        nl_indptr = np.zeros(1, np.int32)
+        nl_indices = np.zeros(1, np.int32)
+        nl_data = np.zeros(1, np.asarray(W).dtype)
+    else:
+        has_nl = 1
+        nl_indptr = Xnl.indptr
+        nl_indices = Xnl.indices
+        nl_data = Xnl.data
+
+    cdef csi *upp = &up_indptr[0]
+    cdef csi *upi = &up_indices[0]
+    cdef floating *upx = &up_data[0]
+    cdef csi *nlp = &nl_indptr[0]
+    cdef csi *nli = &nl_indices[0]
+    cdef floating *nlx = &nl_data[0]
+
+    nup = Xup.shape[0]
+    ndw = Xdw.shape[0]
+    k = W.shape[1]
+    ldw = W.strides[0] // sizeof(floating)
+    ldy = result.strides[0] // sizeof(floating)
+
+    for idw in prange(ndw, nogil=True):
+        # Parallelize over blocks of down spin rows.
+        for iup in range(nup):
+            i = idw*nup + iup
+            y = r + i*ldy
+            # Diagonal.
+            x = D[i]
+            v = w + i*ldw
+            for c in range(k):
+                y[c] = x * v[c]
+            # Up spin hoppings.
+            _gaxpy_row(upp[iup], upp[iup+1], upi, upx, w + idw*nup*ldw, ldw, y, k)
+            # Non-local terms.
+            if has_nl:
+                _gaxpy_row(nlp[i], nlp[i+1], nli, nlx, w, ldw, y, k)
+        # Down spin hoppings.
+        for p in range(dw_indptr[idw], dw_indptr[idw+1]):
+            _axpy_strip(dw_data[p], w + dw_indices[p]*nup*ldw, ldw,
+                        r + idw*nup*ldy, ldy, nup, k)
@@ -0,0 +1,131 @@
+"""Sliced ELLPACK (SELL-C-sigma) storage.
+
+The rows are sorted by length within windows of sigma rows and grouped
+in chunks of C consecutive (sorted) rows. Each chunk is stored as a
+dense (width, C) column major block, where width is the length of the
+longest row of the chunk and shorter rows are padded with zeros. The C
+rows of a chunk are processed together by the kernels, s.t. the inner
+loops run over C independent rows and vectorize.
+
+The rows of the hopping operators have nearly the same length (set by
+the # of particles), hence the padding is small. See
+_psparse.UPmultiply_sell, DWmultiply_sell and Multiply_sell.
+
+"""
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# Default chunk height and sorting window.
+SELL_C = 8
+SELL_SIGMA = 256
+# Max. chunk height supported by the kernels.
+SELL_MAX_C = 64
+
+
+class SellMatrix:
+    """Sparse matrix in SELL-C-sigma format.
+
+    Attributes:
+        C : chunk height.
+        sigma : sorting window.
+        data, indices : (padded) values and column indices. Element
+            j of the r-th row of chunk c is at chunk_ptr[c] + j*C + r.
+        chunk_ptr : offset of each chunk (size nchunks+1).
+        chunk_width : width of each chunk (size nchunks).
+        perm : row stored at each position (size m).
+    """
+    format = 'sell'
+
+    def __init__(self, data, indices, chunk_ptr, chunk_width, perm, shape,
+                 C=SELL_C, sigma=1, nnz=None):
+        self.data = data
+        self.indices = indices
+        self.chunk_ptr = chunk_ptr
+        self.chunk_width = chunk_width
+        self.perm = perm
+        self.shape = shape
+        self.C = C
+        self.sigma = sigma
+        self.nnz = np.count_nonzero(data) if nnz is None else nnz
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    @property
+    def nchunks(self):
+        return self.chunk_width.size
+
+    @property
+    def width(self):
+        """Width of the widest chunk."""
+        return self.chunk_width.max() if self.nchunks else 0
+
+    @property
+    def fill(self):
+        """Ratio of stored (padded) to nonzero elements."""
+        return self.data.size / self.nnz if self.nnz else 1.
+
+    @classmethod
+    def from_csr(cls, X, C=SELL_C, sigma=SELL_SIGMA):
+        """Convert a CSR matrix.
+
+        Args:
+            C : chunk height (<= SELL_MAX_C).
+            sigma : sorting window (1 or a multiple of C). Larger windows
+                reduce the padding, sigma=1 keeps the original row order.
+        """
+        if X.format != 'csr':
+            raise NotImplementedError(f'{X.format} format not supported.')
+        if not (0 < C <= SELL_MAX_C):
+            raise ValueError(f'Chunk height must be in [1, {SELL_MAX_C}].')
+        if (sigma != 1) and (sigma % C):
+            raise ValueError('Sorting window must be 1 or a multiple of C.')
+        m = X.shape[0]
+        indptr = X.indptr
+        lengths = np.diff(indptr)
+        # Sort rows by length within the windows.
+        perm = np.arange(m, dtype=np.int32)
+        if sigma > 1:
+            for start in range(0, m, sigma):
+                window = perm[start:start+sigma]
+                perm[start:start+sigma] = window[np.argsort(-lengths[window], kind='stable')]
+        nchunks = (m + C - 1) // C
+        plengths = np.zeros(nchunks*C, dtype=np.int32)
+        plengths[:m] = lengths[perm]
+        chunk_width = plengths.reshape(nchunks, C).max(axis=1).astype(np.int32)
+        chunk_ptr = np.zeros(nchunks+1, dtype=np.int32)
+        np.cumsum(chunk_width*C, out=chunk_ptr[1:])
+        data = np.zeros(chunk_ptr[-1], dtype=X.data.dtype)
+        indices = np.zeros(chunk_ptr[-1], dtype=np.int32)
+        # Scatter the elements: position q holds row perm[q].
+        lens = plengths[:m]
+        q = np.repeat(np.arange(m), lens)
+        j = np.arange(lens.sum()) - np.repeat(np.cumsum(lens)-lens, lens)
+        src = np.repeat(indptr[perm], lens) + j
+        dst = chunk_ptr[q//C] + j*C + q%C
+        data[dst] = X.data[src]
+        indices[dst] = X.indices[src]
+        return cls(data, indices, chunk_ptr, chunk_width, perm, X.shape,
+                   C, sigma, X.nnz)
+
+    def tocsr(self):
+        """Convert to CSR."""
+        m = self.shape[0]
+        rows = np.empty(self.data.size, dtype=np.int32)
+        for c in range(self.nchunks):
+            block = slice(self.chunk_ptr[c], self.chunk_ptr[c+1])
+            pos = np.arange(c*self.C, (c+1)*self.C)
+            rows[block] = np.tile(np.where(pos<m, self.perm[np.minimum(pos, m-1)], -1),
+                                  self.chunk_width[c])
+        mask = (rows >= 0) & (self.data != 0)
+        X = csr_matrix((self.data[mask], (rows[mask], self.indices[mask])),
+                       shape=self.shape)
+        X.sum_duplicates()
+        return X
+
+
+def to_sell(X, C=SELL_C, sigma=SELL_SIGMA):
+    """Convert a CSR matrix (e.g. UpHopping, DwHopping, NonLocal) to
+    SELL-C-sigma storage (see SellMatrix.from_csr)."""
+    return SellMatrix.from_csr(X, C, sigma)
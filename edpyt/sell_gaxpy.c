@@ -0,0 +1,146 @@
+#include "cs.h"
+/* Kernels for matrices in sliced ELLPACK (SELL-C-sigma) form. Element j of
+   the r-th row of chunk c is at p[c] + j*C + r, s.t. the inner loops run
+   over the C rows of a chunk (unit stride) and vectorize. The chunk
+   kernels are cloned for AVX2 and AVX-512 (gathers) and the variant is
+   selected at runtime. */
+
+#if defined(__GNUC__) && !defined(__clang__) && defined(__x86_64__)
+#define SELL_CLONES __attribute__ ((target_clones ("avx512f", "avx2", "default")))
+#else
+#define SELL_CLONES
+#endif
+
+/* y[perm[c*C:(c+1)*C]] += A[c*C:(c+1)*C,:]*x (rows of chunk c) */
+
+SELL_CLONES
+csi sell_gaxpy_chunk (const sell *A, const double *x, double *y, csi c)
+{
+  csi j, r, nr, C, *Ai, *perm ;
+  const double *Ax ;
+  double tmp [SELL_MAX_C] ;
+  C = A->C ; perm = A->perm + (size_t) c * C ;
+  nr = MIN (C, A->m - c * C) ;
+  for (r = 0 ; r < C ; r++) tmp [r] = 0. ;
+  for (j = 0 ; j < A->w [c] ; j++)
+    {
+      Ax = A->x + A->p [c] + (size_t) j * C ;
+      Ai = A->i + A->p [c] + (size_t) j * C ;
+      #pragma omp simd
+      for (r = 0 ; r < C ; r++)
+        {
+          tmp [r] += Ax [r] * x [Ai [r]] ;
+        }
+    }
+  for (r = 0 ; r < nr ; r++)
+    {
+      y [perm [r]] += tmp [r] ;
+    }
+  return (1) ;
+}
+
+/* y = A*x+y */
+
+csi sell_gaxpy (const sell *A, const double *x, double *y)
+{
+  csi c, nchunks ;
+  nchunks = (A->m + A->C - 1) / A->C ;
+  for (c = 0 ; c < nchunks ; c++)
+    {
+      sell_gaxpy_chunk (A, x, y, c) ;
+    }
+  return (1) ;
+}
+
+/* y[i,s0:s1] += A[i,:]*x[:,s0:s1] for the rows i of chunk c (x and y have n columns) */
+
+csi sell_saxpy_tile (const sell *A, const double *x, double *y, csi c, csi n, csi s0, csi s1)
+{
+  csi j, r, s, nr, C, *Ai ;
+  const double *Ax, *xj ;
+  double a, *yi ;
+  C = A->C ;
+  nr = MIN (C, A->m - c * C) ;
+  Ax = A->x + A->p [c] ;
+  Ai = A->i + A->p [c] ;
+  for (r = 0 ; r < nr ; r++)
+    {
+      yi = y + (size_t) A->perm [c * C + r] * n ;
+      for (j = 0 ; j < A->w [c] ; j++)
+        {
+          a = Ax [j * C + r] ;
+          if (a == 0.) continue ;         /* padding */
+          xj = x + (size_t) Ai [j * C + r] * n ;
+          for (s = s0 ; s < s1 ; s++)
+            {
+              yi [s] += a * xj [s] ;
+            }
+        }
+    }
+  return (1) ;
+}
+
+/* Single precision variants. */
+
+SELL_CLONES
+csi sell_gaxpy_chunk_s (const sells *A, const float *x, float *y, csi c)
+{
+  csi j, r, nr, C, *Ai, *perm ;
+  const float *Ax ;
+  float tmp [SELL_MAX_C] ;
+  C = A->C ; perm = A->perm + (size_t) c * C ;
+  nr = MIN (C, A->m - c * C) ;
+  for (r = 0 ; r < C ; r++) tmp [r] = 0.f ;
+  for (j = 0 ; j < A->w [c] ; j++)
+    {
+      Ax = A->x + A->p [c] + (size_t) j * C ;
+      Ai = A->i + A->p [c] + (size_t) j * C ;
+      #pragma omp simd
+      for (r = 0 ; r < C ; r++)
+        {
+          tmp [r] += Ax [r] * x [Ai [r]] ;
+        }
+    }
+  for (r = 0 ; r < nr ; r++)
+    {
+      y [perm [r]] += tmp [r] ;
+    }
+  return (1) ;
+}
+
+csi sell_gaxpy_s (const sells *A, const float *x, float *y)
+{
+  csi c, nchunks ;
+  nchunks = (A->m + A->C - 1) / A->C ;
+  for (c = 0 ; c < nchunks ; c++)
+    {
+      sell_gaxpy_chunk_s (A, x, y, c) ;
+    }
+  return (1) ;
+}
+
+csi sell_saxpy_tile_s (const sells *A, const float *x, float *y, csi c, csi n, csi s0, csi s1)
+{
+  csi j, r, s, nr, C, *Ai ;
+  const float *Ax, *xj ;
+  float a, *yi ;
+  C = A->C ;
+  nr = MIN (C, A->m - c * C) ;
+  Ax = A->x + A->p [c] ;
+  Ai = A->i + A->p [c] ;
+  for (r = 0 ; r < nr ; r++)
+    {
+      yi = y + (size_t) A->perm [c * C + r] * n ;
+      for (j = 0 ; j < A->w [c] ; j++)
+        {
+          a = Ax [j * C + r] ;
+          if (a == 0.f) continue ;        /* padding */
+          xj = x + (size_t) Ai [j * C + r] * n ;
+          for (s = s0 ; s < s1 ; s++)
+            {
+              yi [s] += a * xj [s] ;
+            }
+        }
+    }
+  return (1) ;
+}
@@ -6,5 +6,10 @@ unsigned_one = unsiged_dt(1)
 params = {
     'hfmode':False,
     'mu':0.,
-    'z':None
+    'z':None,
+    # Matrix vector product counters (see edpyt.counters).
+    'counters':False,
+    # Iterative eigensolver of the sectors, 'trlanczos', 'davidson',
+    # 'chebyshev' or 'arpack' (see espace._solve_arpack).
+    'eigsh':'trlanczos'
 }
@@ -0,0 +1,237 @@
+"""Thread control of the compiled kernels.
+
+The sparse kernels (OpenMP or numba, see edpyt.backend), the numba
+parallel kernels (e.g. ham_local._build_ham_local, lanczos._kron) and
+BLAS spawn their threads independently (with the numba backend, the
+sparse kernels share the numba thread pool). With several MPI ranks per
+node they oversubscribe the cores. A ThreadController sets the # of
+threads of each kernel from the sector dimension s.t. the threads of
+all ranks on a node do not exceed its cores:
+
+    psparse : sparse matrix vector products.
+    numba : numba parallel kernels.
+    blas : BLAS (requires threadpoolctl, ignored otherwise).
+
+The # of threads is looked up in a table {kernel:{size class:threads}}
+(size class = log2 of the sector dimension), which is learned by
+autotune and persisted as JSON. Sizes that were not tuned get one
+thread per MIN_WORK[kernel] elements.
+
+The controller is opt-in:
+
+    set_controller(ThreadController(comm, path='threads.json'))
+    get_controller().autotune()  # Optional, saved to path.
+
+solve_sector and build_gf_lanczos then run each sector within limit(d).
+
+"""
+import json
+import os
+from contextlib import contextmanager
+from time import perf_counter
+
+import numba
+import numpy as np
+
+from edpyt.backend import get_backend
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+
+KERNELS = ('psparse', 'numba', 'blas')
+# Min. # of elements (sector dimension) per thread.
+MIN_WORK = {'psparse':16384, 'numba':16384, 'blas':65536}
+
+
+def available_cpus():
+    """# of CPUs available to the process."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def ranks_per_node(comm=None):
+    """# of MPI ranks sharing the node of this rank.
+
+    Without communicator, the launcher environment is inspected
+    (Open MPI, MPICH/Hydra, Slurm).
+    """
+    if comm is not None:
+        from mpi4py import MPI
+        local = comm.Split_type(MPI.COMM_TYPE_SHARED)
+        size = local.Get_size()
+        local.Free()
+        return size
+    for var in ['OMPI_COMM_WORLD_LOCAL_SIZE', 'MPI_LOCALNRANKS',
+                'SLURM_NTASKS_PER_NODE']:
+        value = os.environ.get(var, '').split('(')[0]
+        if value.isdigit():
+            return int(value)
+    return 1
+
+
+def size_class(d):
+    """Size class of a sector of dimension d."""
+    return int(d).bit_length()
+
+
+def _set_psparse(n):
+    psparse = get_backend().psparse
+    previous = psparse.get_num_threads()
+    psparse.set_num_threads(n)
+    return lambda: psparse.set_num_threads(previous)
+
+
+def _set_numba(n):
+    previous = numba.get_num_threads()
+    numba.set_num_threads(max(1, min(n, numba.config.NUMBA_NUM_THREADS)))
+    return lambda: numba.set_num_threads(previous)
+
+
+def _set_blas(n):
+    if threadpool_limits is None:
+        return lambda: None
+    limits = threadpool_limits(limits=n, user_api='blas')
+    return limits.restore_original_limits
+
+
+_setters = {'psparse':_set_psparse, 'numba':_set_numba, 'blas':_set_blas}
+
+
+class ThreadController:
+    """Per-kernel # of threads.
+
+    Args:
+        comm : (optional) MPI communicator, used to count the ranks
+            per node (see ranks_per_node).
+        max_threads : max. # of threads of each rank (default: the
+            available CPUs divided by the ranks per node).
+        path : (optional) JSON file of the tuned table. Loaded if it
+            exists and written by autotune.
+    """
+    def __init__(self, comm=None, max_threads=None, path=None):
+        if max_threads is None:
+            max_threads = max(1, available_cpus() // ranks_per_node(comm))
+        self.max_threads = max_threads
+        self.path = path
+        self.table = {kernel:{} for kernel in KERNELS}
+        if (path is not None) and os.path.exists(path):
+            self.load(path)
+
+    def get(self, kernel, d):
+        """# of threads of kernel for a sector of dimension d."""
+        n = self.table[kernel].get(size_class(d))
+        if n is None:
+            n = d // MIN_WORK[kernel]
+        return max(1, min(n, self.max_threads))
+
+    @contextmanager
+    def limit(self, d, kernels=KERNELS):
+        """Set the # of threads of the kernels for a sector of dimension d."""
+        nthreads = {kernel:self.get(kernel, d) for kernel in kernels}
+        if (get_backend().name == 'numba') and {'psparse','numba'} <= nthreads.keys():
+            # The sparse kernels run on the numba thread pool, set it once.
+            nthreads['numba'] = max(nthreads['numba'], nthreads.pop('psparse'))
+        restore = [_setters[kernel](n) for kernel, n in nthreads.items()]
+        try:
+            yield
+        finally:
+            for f in reversed(restore):
+                f()
+
+    def load(self, path):
+        with open(path) as fp:
+            table = json.load(fp)
+        for kernel, classes in table.items():
+            self.table[kernel] = {int(c):n for c, n in classes.items()}
+
+    def save(self, path=None):
+        path = path or self.path
+        with open(path, 'w') as fp:
+            json.dump(self.table, fp, indent=1)
+
+    def autotune(self, sectors=((8,4,4),(10,5,5),(12,6,6)), nrep=5, candidates=None):
+        """Learn the best # of threads of each kernel.
+
+        For each sector (# of sites, # of up & down electrons) of a
+        random Hamiltonian, the sparse matrix vector product (psparse),
+        the local Hamiltonian (numba) and a Krylov basis rotation (blas)
+        are timed with each candidate # of threads.
+
+        Args:
+            candidates : # of threads to try (default: powers of 2 up
+                to max_threads and max_threads).
+
+        Returns:
+            table : {kernel:{size class:threads}}. Saved to path if given.
+        """
+        from edpyt.build_mb_ham import build_mb_ham
+        from edpyt.espace import build_empty_sector
+        from edpyt.ham_local import build_ham_local
+        from edpyt.matvec_product import matvec_operator
+        if candidates is None:
+            candidates = sorted({2**i for i in range(self.max_threads.bit_length())}
+                                | {self.max_threads})
+        rng = np.random.default_rng(0)
+        for n, nup, ndw in sectors:
+            H = rng.random((n,n))
+            H += H.T
+            V = np.diag(rng.random(n))
+            sct = build_empty_sector(n, nup, ndw)
+            matvec = matvec_operator(*build_mb_ham(H, V, sct))
+            vec = rng.random(sct.d)
+            out = np.empty_like(vec)
+            basis = rng.random((sct.d, 32))
+            U = rng.random((32, 32))
+            H3 = np.broadcast_to(H, (2,n,n))
+            benchmarks = {
+                'psparse':lambda: matvec(vec, out),
+                'numba':lambda: build_ham_local(H3, V, sct),
+                'blas':lambda: basis.dot(U),
+            }
+            for kernel, f in benchmarks.items():
+                if (kernel == 'blas') and (threadpool_limits is None):
+                    continue
+                times = []
+                for nthreads in candidates:
+                    restore = _setters[kernel](nthreads)
+                    try:
+                        f()
+                        start = perf_counter()
+                        for _ in range(nrep):
+                            f()
+                        times.append(perf_counter() - start)
+                    finally:
+                        restore()
+                self.table[kernel][size_class(sct.d)] = candidates[int(np.argmin(times))]
+        if self.path is not None:
+            self.save()
+        return self.table
+
+
+_controller = None
+
+
+def set_controller(controller):
+    """Set (or remove with None) the thread controller."""
+    global _controller
+    _controller = controller
+
+
+def get_controller():
+    """Active thread controller or None."""
+    return _controller
+
+
+@contextmanager
+def limit(d):
+    """Limit the threads of the kernels for a sector of dimension d
+    (no-op without controller, see set_controller)."""
+    if _controller is None:
+        yield
+    else:
+        with _controller.limit(d):
+            yield
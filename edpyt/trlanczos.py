@@ -0,0 +1,192 @@
+"""Thick-restart Lanczos for the lowest eigenpairs.
+
+The Lanczos basis V (ncv vectors) is built with full reorthogonalization.
+When the basis is full, the projected matrix T = V^+ H V is diagonalized
+and the basis is contracted to the kept Ritz vectors (thick restart,
+Wu & Simon, SIAM J. Matrix Anal. Appl. 22, 602 (2000)):
+
+    V[:,:k] <- V U[:,:k]        T[:k,:k] <- diag(theta[:k])
+    V[:,k] <- residual vector   T[:k,k] = T[k,:k] <- beta U[-1,:k]
+
+and the Lanczos process continues from V[:,k]. The arrowhead T[:k+1,:k+1]
+is the only difference w.r.t. the simple Lanczos process.
+
+All arrays live in a workspace (see TRLanczosWorkspace), which can be
+reused for sectors of equal or smaller dimension. The operator is applied
+in-place (see lanczos.as_inplace).
+
+"""
+from warnings import warn
+
+import numpy as np
+from scipy.linalg.blas import get_blas_funcs
+
+from edpyt.lanczos import as_inplace
+
+
+class TRLanczosWorkspace:
+    """Workspace of eigsh.
+
+    Args:
+        maxn : max. dimension of the operator.
+        maxncv : max. # of Lanczos vectors.
+    """
+    def __init__(self, maxn, maxncv, dtype=np.float64):
+        self.dtype = np.dtype(dtype)
+        self.maxn = maxn
+        self.maxncv = maxncv
+        # Lanczos vectors & residual (see basis).
+        self.V = np.zeros(maxn*(maxncv+1), self.dtype)
+        # Rotated basis at restart.
+        self.work = np.zeros(maxn*maxncv, self.dtype)
+        self.T = np.zeros((maxncv,maxncv), np.float64)
+        self.h = np.zeros(maxncv+1, self.dtype)
+        self.gemv = get_blas_funcs('gemv', dtype=self.dtype)
+        self.axpy = get_blas_funcs('axpy', dtype=self.dtype)
+
+    def basis(self, n, ncv, out='V'):
+        """Fortran contiguous (n, ncv) view of buffer `out`."""
+        return getattr(self, out)[:n*ncv].reshape(ncv,n).T
+
+    def fits(self, n, ncv, dtype):
+        return (n <= self.maxn) and (ncv <= self.maxncv) and (np.dtype(dtype) == self.dtype)
+
+
+def _orthogonalize(gemv, V, w, h):
+    """Orthogonalize w against the (orthonormal) columns of V.
+
+    Classical Gram-Schmidt, repeated once if the norm of w drops by
+    more than 1/sqrt(2) (DGKS).
+
+    Returns:
+        h : projections of w on V.
+        beta : norm of w after orthogonalization.
+    """
+    j = V.shape[1]
+    norm = np.sqrt(w.dot(w))
+    h[:j] = gemv(1., V, w, trans=1)
+    w = gemv(-1., V, h[:j], 1., w, overwrite_y=1)
+    beta = np.sqrt(w.dot(w))
+    if beta < 0.7071 * norm:
+        c = gemv(1., V, w, trans=1)
+        w = gemv(-1., V, c, 1., w, overwrite_y=1)
+        h[:j] += c
+        beta = np.sqrt(w.dot(w))
+    return h[:j], beta
+
+
+def _restart_vector(gemv, V, w, rng):
+    """Random unit vector orthogonal to V (invariant subspace found)."""
+    h = np.empty(V.shape[1], w.dtype)
+    for _ in range(3):
+        w[:] = rng.random(w.size) - 0.5
+        w /= np.sqrt(w.dot(w))
+        _, beta = _orthogonalize(gemv, V, w, h)
+        if beta > 1e-8:
+            w /= beta
+            return True
+    return False
+
+
+def eigsh(n, nev, matvec, v0=None, workspace=None, ncv=None, tol=0.,
+          maxiter=None, seed=0):
+    """Lowest nev eigenpairs of a real symmetric operator.
+
+    Args:
+        n : dimension of the operator.
+        nev : # of eigenpairs.
+        matvec : operator (see lanczos.as_inplace).
+        v0 : (optional) starting vector (default: random).
+        workspace : (optional) TRLanczosWorkspace. Reused if large enough.
+        ncv : # of Lanczos vectors (default as ARPACK: max(2*nev+1,20)).
+        tol : relative accuracy of the eigenvalues (as ARPACK, a Ritz
+            pair is converged if |residual| <= tol * max(eps^2/3, |theta|),
+            tol=0 means machine precision).
+        maxiter : max. # of restarts (default: 10*n).
+
+    Returns:
+        d : eigenvalues (ascending).
+        z : eigenvectors (columns).
+    """
+    matvec = as_inplace(matvec)
+    dtype = np.dtype(getattr(matvec, 'dtype', np.float64))
+    if ncv is None:
+        ncv = max(2*nev+1, 20)
+    ncv = min(ncv, n)
+    if not (0 < nev <= ncv) or (nev == ncv < n):
+        raise ValueError(f'nev={nev} must be in [1, ncv={ncv}).')
+    if maxiter is None:
+        maxiter = 10*n
+    if workspace is None or not workspace.fits(n, ncv, dtype):
+        workspace = TRLanczosWorkspace(n, ncv, dtype)
+    eps = np.finfo(dtype).eps
+    tol = max(tol, eps)
+    gemv = workspace.gemv
+    axpy = workspace.axpy
+    V = workspace.basis(n, ncv+1)
+    T = workspace.T
+    h = workspace.h
+    rng = np.random.default_rng(seed)
+
+    if v0 is None:
+        V[:,0] = rng.random(n) - 0.5
+    else:
+        V[:,0] = v0
+    norm = np.sqrt(V[:,0].dot(V[:,0]))
+    if norm == 0.:
+        raise ValueError('Initial vector has zero norm.')
+    V[:,0] /= norm
+
+    k = 0 # Kept Ritz vectors.
+    T[:ncv,:ncv] = 0.
+    for it in range(maxiter):
+        # Lanczos process from V[:,k].
+        for j in range(k, ncv):
+            w = V[:,j+1]
+            v = V[:,j]
+            matvec(v, w)
+            alpha = v.dot(w)
+            # Three term recurrence (arrowhead for j==k, where T[:k,k] are
+            # the couplings to the kept Ritz vectors).
+            if j == k:
+                h[:j] = T[:j,j]
+                h[j] = alpha
+                w = gemv(-1., V[:,:j+1], h[:j+1], 1., w, overwrite_y=1)
+            else:
+                axpy(v, w, n, -alpha)
+                axpy(V[:,j-1], w, n, -T[j-1,j])
+            # Full reorthogonalization.
+            hj, beta = _orthogonalize(gemv, V[:,:j+1], w, h)
+            T[j,j] = alpha + hj[j]
+            if j+1 == ncv:
+                break
+            if beta <= eps * max(1., abs(T[j,j])):
+                # Invariant subspace.
+                beta = 0.
+                if not _restart_vector(gemv, V[:,:j+1], w, rng):
+                    ncv = j+1
+                    break
+            else:
+                w /= beta
+            T[j,j+1] = T[j+1,j] = beta
+        theta, U = np.linalg.eigh(T[:ncv,:ncv])
+        residual = abs(beta * U[-1])
+        converged = residual[:nev] <= tol * np.maximum(eps**(2/3), abs(theta[:nev]))
+        if converged.all() or (ncv == n):
+            break
+        # Thick restart: keep the wanted Ritz vectors plus half of the
+        # remaining ones (accelerates the convergence of the last ones).
+        k = min(nev + (ncv - nev) // 2, ncv-1)
+        work = workspace.basis(n, k, 'work')
+        np.dot(U[:,:k].T.astype(dtype), V[:,:ncv].T, out=work.T)
+        V[:,:k] = work
+        V[:,k] = V[:,ncv] / beta if beta else V[:,ncv]
+        T[:ncv,:ncv] = 0.
+        T[np.arange(k),np.arange(k)] = theta[:k]
+        T[:k,k] = T[k,:k] = beta * U[-1,:k]
+    else:
+        warn(f'Thick-restart Lanczos did not converge in {maxiter} restarts, '
+             f'{np.count_nonzero(converged)}/{nev} eigenpairs converged.')
+
+    z = np.dot(V[:,:ncv], U[:,:nev].astype(dtype))
+    return theta[:nev], z
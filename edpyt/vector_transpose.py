@@ -1,103 +1,262 @@
 import numpy as np
 from mpi4py import MPI
-  
+from mpi4py.util.dtlib import from_numpy_dtype
 
-def collect_dw(a, comm=None):
-    """Transpose a hilbert vector.
-    
-    NOTE : Works only for sector with equal up and down # of spins.
-
-P0:
-    [[ 0  1  2  3  4  5]
-     [ 6  7  8  9 10 11]
-     [12 13 14 15 16 17]]
-P1:
-    [[18 19 20 21 22 23]
-     [24 25 26 27 28 29]
-     [30 31 32 33 34 35]]
-P0:
-    [[ 0  1  2]
-     [ 6  7  8]
-     [12 13 14]
-     [18 19 20]
-     [24 25 26]
-     [30 31 32]]
-P1:
-    [[ 3  4  5]
-     [ 9 10 11]
-     [15 16 17]
-     [21 22 23]
-     [27 28 29]
-     [33 34 35]]
 
+def get_block_distribution(n, size):
+    """Distribute n items in contiguous blocks over size processes.
+
+    The first n % size processes get one more item.
+
+    Returns:
+        counts : # of items of each process.
+        displs : offset of the 1st item of each process.
     """
+    counts = np.full(size, n//size, dtype=int)
+    counts[:n%size] += 1
+    displs = np.zeros(size, dtype=int)
+    displs[1:] = np.cumsum(counts)[:-1]
+    return counts, displs
 
-    m, n = a.shape
-    
-    if comm is None:
-        comm = MPI.COMM_WORLD
-    size = comm.Get_size()
-    assert m*size==n, "Non-equal # of up and down spins,"
-    
-    batch = n//size
-    chunk = batch*m
 
-    b = np.empty(a.T.shape,a.dtype)
-    for p in range(size):
-        b[p*batch:(p+1)*batch,:] = a[:,p*batch:(p+1)*batch]
+class VectorTranspose:
+    """Transpose a distributed hilbert vector.
 
-    comm.Alltoall([b,chunk], [a,chunk])
+    A hilbert vector v[idw,iup] (index iup + idw*dup) is distributed
+    in two ways:
 
-    return a.reshape(n,m)
+        dw-partition : each process owns a block of down spin states
+            and all up spin states, i.e. a (dwn_local, dup) C array.
+        up-partition : each process owns a block of up spin states
+            and all down spin states, i.e. a (dwn, dup_local) C array.
 
+    In the dw-partition the up spin hoppings are local, in the
+    up-partition the down spin hoppings are local. The blocks are
+    given by get_block_distribution, s.t. any (dup, dwn) and any #
+    of processes are supported.
 
-def collect_up(a, comm=None):
-    """Transpose a hilbert vector.
-    
-    NOTE : Works only for sector with equal up and down # of spins.
-
-P0:
-    [[ 0  1  2]
-     [ 6  7  8]
-     [12 13 14]
-     [18 19 20]
-     [24 25 26]
-     [30 31 32]]
-P1:
-    [[ 3  4  5]
-     [ 9 10 11]
-     [15 16 17]
-     [21 22 23]
-     [27 28 29]
-     [33 34 35]]
-P0:
-    [[ 0  1  2  3  4  5]
-     [ 6  7  8  9 10 11]
-     [12 13 14 15 16 17]]
-P1:
-    [[18 19 20 21 22 23]
-     [24 25 26 27 28 29]
-     [30 31 32 33 34 35]]
-    
+    The up spin states of each process are further split in nchunks
+    blocks, which are exchanged independently (see Icollect_dw and
+    Icollect_up), s.t. computations on a chunk can overlap the
+    exchange of the others. The exchanges use derived datatypes and
+    operate directly on the input and output arrays. The up-partition is stored by chunks:
+    chunk k is a (dwn, dup_local_k) C array (see chunks). For a single
+    chunk this is the (dwn, dup_local) C array.
+
+    Example (dup=6, dwn=6, 2 processes, 1 chunk):
+
+P0:                                 P0:
+    [[ 0  1  2  3  4  5]                [[ 0  1  2]
+     [ 6  7  8  9 10 11]                 [ 6  7  8]
+     [12 13 14 15 16 17]]   collect_dw   [12 13 14]
+P1:                            -->       [18 19 20]
+    [[18 19 20 21 22 23]       <--       [24 25 26]
+     [24 25 26 27 28 29]    collect_up   [30 31 32]]
+     [30 31 32 33 34 35]]           P1:
+                                        [[ 3  4  5]
+                                         [ 9 10 11]
+                                         ...
+                                         [33 34 35]]
     """
+    def __init__(self, dup, dwn, comm=None, dtype=np.float64, nchunks=1):
+        if comm is None:
+            comm = MPI.COMM_WORLD
+        size = comm.Get_size()
+        rank = comm.Get_rank()
+        self.comm = comm
+        self.dup = dup
+        self.dwn = dwn
+        self.nchunks = nchunks
+        self.dw_counts, self.dw_displs = get_block_distribution(dwn, size)
+        self.up_counts, self.up_displs = get_block_distribution(dup, size)
+        self.dwn_local = dwn_local = self.dw_counts[rank]
+        self.dup_local = self.up_counts[rank]
+        # Up spin states of chunk k for each process (shape=(size,nchunks)).
+        counts = np.empty((size,nchunks), int)
+        displs = np.empty((size,nchunks), int)
+        for p in range(size):
+            counts[p], displs[p] = get_block_distribution(self.up_counts[p], nchunks)
+            displs[p] += self.up_displs[p]
+        # The columns of the dw-partition exchanged with each process are
+        # described by a strided datatype, s.t. the exchanges read and
+        # write the dw-partition in place (no packing).
+        itemsize = np.dtype(dtype).itemsize
+        basetype = from_numpy_dtype(dtype)
+        self._types = []
+        self.strided = []
+        for k in range(nchunks):
+            types = []
+            for p in range(size):
+                if dwn_local*counts[p,k] > 0:
+                    t = basetype.Create_vector(dwn_local, counts[p,k], dup).Commit()
+                    self._types.append(t)
+                else:
+                    t = basetype
+                types.append(t)
+            self.strided.append((((dwn_local*counts[:,k]>0).astype(int),
+                                  displs[:,k]*itemsize), types))
+        # Up-partition : chunk after chunk.
+        local = counts[rank]
+        start = np.zeros(nchunks, int)
+        start[1:] = np.cumsum(dwn*local)[:-1]
+        self.contiguous = [((self.dw_counts*local[k], (start[k]+self.dw_displs*local[k])*itemsize),
+                            [basetype]*size) for k in range(nchunks)]
+        self._chunks = [(slice(start[k],start[k]+dwn*local[k]), (dwn,local[k]))
+                        for k in range(nchunks)]
+        # Allgather.
+        self.full = (self.dw_counts*dup, self.dw_displs*dup)
 
-    m, n = a.shape
-    # assert m==n, "Non-equal # of up and down spins,"
-    
+    def __del__(self):
+        if not MPI.Is_finalized():
+            for t in self._types:
+                t.Free()
+
+    @property
+    def dw_slice(self):
+        """Down spin states of the dw-partition."""
+        rank = self.comm.Get_rank()
+        start = self.dw_displs[rank]
+        return slice(start, start+self.dwn_local)
+
+    @property
+    def up_slice(self):
+        """Up spin states of the up-partition."""
+        rank = self.comm.Get_rank()
+        start = self.up_displs[rank]
+        return slice(start, start+self.dup_local)
+
+    def chunks(self, a):
+        """Views of the chunks of the up-partition a."""
+        a = a.reshape(-1)
+        return [a[index].reshape(shape) for index, shape in self._chunks]
+
+    def Icollect_dw(self, a, out, k=0):
+        """Start the exchange of chunk k from the dw-partition a to the
+        up-partition out."""
+        return self.comm.Ialltoallw([a.reshape(-1), *self.strided[k]],
+                                    [out.reshape(-1), *self.contiguous[k]])
+
+    def Icollect_up(self, a, out, k=0):
+        """Start the exchange of chunk k from the up-partition a to the
+        dw-partition out."""
+        return self.comm.Ialltoallw([a.reshape(-1), *self.contiguous[k]],
+                                    [out.reshape(-1), *self.strided[k]])
+
+    def collect_dw(self, a, out=None):
+        """From dw-partition (dwn_local, dup) to up-partition (dwn, dup_local)."""
+        if out is None:
+            out = np.empty((self.dwn, self.dup_local), a.dtype)
+        MPI.Request.Waitall([self.Icollect_dw(a, out, k) for k in range(self.nchunks)])
+        return out
+
+    def collect_up(self, a, out=None):
+        """From up-partition (dwn, dup_local) to dw-partition (dwn_local, dup)."""
+        if out is None:
+            out = np.empty((self.dwn_local, self.dup), a.dtype)
+        MPI.Request.Waitall([self.Icollect_up(a, out, k) for k in range(self.nchunks)])
+        return out
+
+    def Iallgather(self, a, out):
+        """Start gathering the dw-partition of all processes in the full vector."""
+        return self.comm.Iallgatherv(a, [out, self.full])
+
+    def allgather(self, a, out=None):
+        """Gather the dw-partition of all processes in the full vector."""
+        if out is None:
+            out = np.empty(self.dwn*self.dup, a.dtype)
+        self.comm.Allgatherv(a, [out, self.full])
+        return out
+
+
+class VectorHalo:
+    """Exchange the elements of a distributed hilbert vector referenced
+    by the local rows of an operator (halo).
+
+    The vector is distributed as the dw-partition of transpose (see
+    VectorTranspose). The requested elements are sent once to their
+    owners, s.t. each exchange only moves the referenced elements
+    (not the full vector).
+
+    Args:
+        indices : (global) indices of the referenced elements.
+        transpose : VectorTranspose of the distribution.
+
+    Attributes:
+        indices : sorted unique indices, out[i] of the exchange holds
+            element indices[i] of the vector.
+    """
+    def __init__(self, indices, transpose, dtype=np.float64):
+        comm = transpose.comm
+        rank = comm.Get_rank()
+        dup = transpose.dup
+        self.comm = comm
+        self.indices = indices = np.unique(indices).astype(np.int64)
+        # The elements of process p are [dw_displs[p]*dup, (dw_displs[p]+dw_counts[p])*dup).
+        bounds = np.append(transpose.dw_displs, transpose.dwn) * dup
+        recv_counts = np.diff(np.searchsorted(indices, bounds))
+        send_counts = np.empty_like(recv_counts)
+        comm.Alltoall(recv_counts, send_counts)
+        recv_displs = np.zeros_like(recv_counts)
+        recv_displs[1:] = np.cumsum(recv_counts)[:-1]
+        send_displs = np.zeros_like(send_counts)
+        send_displs[1:] = np.cumsum(send_counts)[:-1]
+        send_index = np.empty(send_counts.sum(), np.int64)
+        comm.Alltoallv([indices, (recv_counts, recv_displs)],
+                       [send_index, (send_counts, send_displs)])
+        self.send_index = send_index - transpose.dw_displs[rank]*dup
+        self.send = (send_counts, send_displs)
+        self.recv = (recv_counts, recv_displs)
+        self.sendbuf = np.empty(send_index.size, dtype)
+
+    @property
+    def size(self):
+        """# of elements of the halo."""
+        return self.indices.size
+
+    def Iexchange(self, a, out):
+        """Start gathering the halo of the dw-partition a in out."""
+        np.take(a, self.send_index, out=self.sendbuf)
+        return self.comm.Ialltoallv([self.sendbuf, self.send], [out, self.recv])
+
+    def exchange(self, a, out=None):
+        """Gather the halo of the dw-partition a."""
+        if out is None:
+            out = np.empty(self.size, a.dtype)
+        self.Iexchange(a, out).Wait()
+        return out
+
+
+def collect_dw(a, comm=None):
+    """Transpose a hilbert vector.
+
+    Args:
+        a : (dwn_local, dup) dw-partition of the vector.
+
+    Returns:
+        (dwn, dup_local) up-partition of the vector.
+
+    See also VectorTranspose.
+    """
     if comm is None:
         comm = MPI.COMM_WORLD
-    size = comm.Get_size()
-    assert m==n*size, "Non-equal # of up and down spins,"
-    
-    batch = m//size
-    chunk = batch*n
+    m, n = a.shape
+    transpose = VectorTranspose(n, comm.allreduce(m), comm, a.dtype)
+    return transpose.collect_dw(a)
 
-    b = np.empty(a.shape,a.dtype)
 
-    comm.Alltoall([a,chunk], [b,chunk])
-    b.shape = (size,-1)
-    a.shape = (n,m)
-    for p in range(batch):
-        a[p,:] = b[:,p*n:(p+1)*n].flat
+def collect_up(a, comm=None):
+    """Transpose a hilbert vector.
+
+    Args:
+        a : (dwn, dup_local) up-partition of the vector.
 
-    return a
\ No newline at end of file
+    Returns:
+        (dwn_local, dup) dw-partition of the vector.
+
+    See also VectorTranspose.
+    """
+    if comm is None:
+        comm = MPI.COMM_WORLD
+    m, n = a.shape
+    transpose = VectorTranspose(comm.allreduce(n), m, comm, a.dtype)
+    return transpose.collect_up(a)
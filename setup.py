@@ -20,7 +20,7 @@ PACKAGES = [SRC_DIR]
 
 
 ext_1 = Extension(SRC_DIR + '._psparse',
-    [SRC_DIR + '/psparse.pyx', SRC_DIR + '/cs_gaxpy.c'],
+    [SRC_DIR + '/psparse.pyx', SRC_DIR + '/cs_gaxpy.c', SRC_DIR + '/sell_gaxpy.c'],
     extra_compile_args=['-fopenmp', '-O3', '-ffast-math'],
     include_dirs = [np.get_include(),'edpyt'],
     extra_link_args=['-fopenmp'])
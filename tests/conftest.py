@@ -0,0 +1,34 @@
+import numpy as np
+
+from edpyt.espace import build_empty_sector
+
+
+def random_hamiltonian(n, rng, U=1., Jx=False):
+    """Random symmetric hoppings H and on-site interaction V (with
+    spin exchange if Jx)."""
+    H = rng.random((n,n))
+    H += H.T
+    V = np.diag(U*rng.random(n))
+    if Jx:
+        J = rng.random((n,n))*(1-np.eye(n))
+        V = {'U':V, 'Jx':J+J.T}
+    return H, V
+
+
+def random_sector(n, nup, ndw, U=3., Jx=False, seed=0):
+    """Random Hamiltonian (see random_hamiltonian) and sector."""
+    H, V = random_hamiltonian(n, np.random.default_rng(seed), U, Jx)
+    return H, V, build_empty_sector(n, nup, ndw)
+
+
+def level_crossing_chain(t, n=8):
+    """Reflection symmetric chain whose single particle levels 2 and 3
+    (opposite parity) cross at t=0."""
+    i = np.arange(n-1)
+    H = np.zeros((n,n))
+    H[i,i+1] = H[i+1,i] = -1.
+    phi = np.linalg.eigh(H)[1]
+    levels = np.concatenate([[-2.,-1.,t,-t], np.arange(1., n-3)])
+    H = (phi * levels).dot(phi.T)
+    P = np.eye(n)[::-1]
+    return (H + P.dot(H).dot(P)) / 2
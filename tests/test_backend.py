@@ -0,0 +1,113 @@
+import numpy as np
+import scipy
+
+from edpyt import backend
+from edpyt.backend import available_backends, load_backend, set_backend, get_backend
+from edpyt.build_mb_ham import build_mb_ham
+from edpyt.matvec_product import matvec_operator, todense
+from edpyt.espace import build_empty_sector
+
+from conftest import random_hamiltonian
+
+rng = np.random.default_rng(0)
+
+
+def test_numba_backend_available():
+    assert 'numba' in available_backends()
+    assert get_backend().name in available_backends()
+
+
+def test_set_backend():
+    active = get_backend().name
+    try:
+        set_backend('numba')
+        assert backend.active_backend() == 'numba'
+    finally:
+        set_backend(active)
+
+
+def test_backend_multiply():
+    n = 7
+    m = 5
+
+    A = scipy.sparse.random(m, m, density=0.4, format='csr', random_state=rng)
+    B = scipy.sparse.random(n, n, density=0.4, format='csr', random_state=rng)
+    C = scipy.sparse.random(n*m, n*m, density=0.1, format='csr', random_state=rng)
+    D = rng.random(m*n)
+    w = rng.random((m*n,3))
+    W = w[:,0].reshape(n,m)
+    expected = D * w[:,0] + A.dot(W.T).T.flatten() + B.dot(W).flatten() + C.dot(w[:,0])
+
+    for name in available_backends():
+        psparse = load_backend(name).psparse
+        result = np.zeros(m*n)
+        psparse.UPmultiply(A,w[:,0].copy(),result)
+        psparse.DWmultiply(B,w[:,0].copy(),result,2)
+        psparse.Multiply(C,w[:,0].copy(),result)
+        np.testing.assert_allclose(result, expected - D * w[:,0])
+
+        psparse.Hmultiply(D,A,B,w[:,0].copy(),result,C)
+        np.testing.assert_allclose(result, expected)
+
+        result = np.zeros((m*n,2))
+        psparse.Hmultiply_mv(D,A,B,w[:,:2],result,C)
+        np.testing.assert_allclose(result[:,0], expected)
+
+
+def test_backend_continued_fraction():
+    n = 500
+    a = np.ones(n)*6
+    b = 2.*np.arange(1,n+1) - 1
+    b **= 2
+
+    z = np.zeros(3, complex)
+    for name in available_backends():
+        c = load_backend(name).continued_fraction(z, -a, -b)
+        np.testing.assert_allclose(3.-c, np.pi)
+
+
+def test_backend_build_mb_ham():
+    n = 6
+    H, V = random_hamiltonian(n, rng)
+    sct = build_empty_sector(n, 3, 2)
+
+    active = get_backend().name
+    try:
+        dense = []
+        for name in available_backends():
+            set_backend(name)
+            operators = build_mb_ham(H, V, sct)
+            vec = rng.random(sct.d)
+            np.testing.assert_allclose(
+                matvec_operator(*operators)(vec), todense(*operators).dot(vec))
+            dense.append(todense(*operators))
+    finally:
+        set_backend(active)
+    for other in dense[1:]:
+        np.testing.assert_allclose(other, dense[0])
+
+
+def time_backends():
+    from time import perf_counter
+    n = 14
+    H, V = random_hamiltonian(n, rng)
+    sct = build_empty_sector(n, n//2, n//2)
+
+    for name in available_backends():
+        set_backend(name)
+        start = perf_counter()
+        operators = build_mb_ham(H, V, sct)
+        build = perf_counter() - start
+        matvec = matvec_operator(*operators)
+        vec = rng.random(sct.d)
+        matvec(vec)
+        nrep = 20
+        start = perf_counter()
+        for _ in range(nrep):
+            matvec(vec)
+        elapsed = (perf_counter() - start) / nrep
+        print(f'{name:8s} build : {build:.3e} s matvec : {elapsed:.3e} s')
+
+
+if __name__ == '__main__':
+    time_backends()
@@ -152,3 +152,45 @@ def test_build_mb_ham():
     ])
 
     assert np.allclose(mb_ham, expected)
+
+
+def test_operator_family():
+    from edpyt.build_mb_ham import OperatorFamily
+    from edpyt.espace import build_espace
+    from edpyt.shared import params
+
+    rng = np.random.default_rng(0)
+    n = 4
+    H = rng.random((n,n))
+    H += H.T
+    J = rng.random((n,n))*(1-np.eye(n))
+    V0 = {'U':np.zeros((n,n)), 'Jx':J+J.T}
+    V1 = {'U':np.diag(rng.random(n)), 'Jx':J+J.T}
+    H1 = H.copy()
+    H1[0,0] -= 0.5
+
+    sct = build_empty_sector(n, 2, 1)
+    family = OperatorFamily(H, V0, sct)
+    family.add(0, H, V0)
+    family.add(1, H1, V1)
+    assert family.matches(H1, V1)
+    assert not family.matches(H1, V1['U'])
+    for key, (h, v) in enumerate([(H, V0), (H1, V1)]):
+        expected = todense(*build_mb_ham(h, v, sct))
+        np.testing.assert_allclose(todense(*family[key]), expected)
+        np.testing.assert_allclose(family.todense(h, v), expected)
+        # Shared off-diagonal operators.
+        assert all(a is b for a, b in zip(family[key][1:], family.shared))
+
+    params['mu'] = 0.1
+    try:
+        families = dict()
+        for h, v in [(H, V0), (H1, V1)]:
+            espace, egs = build_espace(h, v, families=families)
+            expected, egs_expected = build_espace(h, v)
+            assert np.isclose(egs, egs_expected)
+            for qns, sct in espace.items():
+                np.testing.assert_allclose(sct.eigvals, expected[qns].eigvals)
+        assert len(families) == (n+1)*(n+1)
+    finally:
+        params['mu'] = 0.
@@ -0,0 +1,86 @@
+from time import perf_counter
+
+import numpy as np
+
+from edpyt.build_mb_ham import build_mb_ham
+from edpyt.chebyshev import eigsh, spectral_bounds
+from edpyt.espace import solve_sector
+from edpyt.matvec_product import matvec_operator, todense
+from edpyt.shared import params
+
+from conftest import random_sector
+
+
+def test_spectral_bounds():
+    H, V, sct = random_sector(6, 3, 3)
+    operators = build_mb_ham(H, V, sct)
+    w = np.linalg.eigvalsh(todense(*operators))
+    lower, upper = spectral_bounds(sct.d, matvec_operator(*operators))
+    assert w[0] <= lower <= w[-1] <= upper
+
+
+def test_chebyshev():
+    H, V, sct = random_sector(7, 3, 3)
+    operators = build_mb_ham(H, V, sct)
+    w_expected = np.linalg.eigvalsh(todense(*operators))
+    for nev in [1, 12, 30]:
+        w, v = eigsh(sct.d, nev, matvec_operator(*operators))
+        np.testing.assert_allclose(w, w_expected[:nev])
+        np.testing.assert_allclose(v.T.dot(v), np.eye(nev), atol=1e-12)
+        residual = todense(*operators).dot(v) - w * v
+        np.testing.assert_allclose(residual, 0., atol=1e-8)
+
+
+def test_chebyshev_single_precision():
+    import warnings
+    H, V, sct = random_sector(7, 3, 3)
+    expected = np.linalg.eigvalsh(todense(*build_mb_ham(H, V, sct)))
+    operators = build_mb_ham(H, V, sct, dtype=np.float32)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        w, v = eigsh(sct.d, 8, matvec_operator(*operators))
+    assert v.dtype == np.float32
+    np.testing.assert_allclose(w, expected[:8], atol=1e-4)
+
+
+def test_solve_sector_chebyshev():
+    from edpyt import costmodel
+    H, V, sct = random_sector(7, 3, 3)
+    expected = np.linalg.eigvalsh(todense(*build_mb_ham(H, V, sct)))
+    model = costmodel.CostModel()
+    model.coeffs['sparse'][:] = 0.
+    params['eigsh'] = 'chebyshev'
+    try:
+        costmodel.set_cost_model(model)
+        eigvals, eigvecs = solve_sector(H, V, sct, k=12)
+    finally:
+        params['eigsh'] = 'trlanczos'
+        costmodel.set_cost_model(None)
+    np.testing.assert_allclose(eigvals, expected[:12])
+
+
+def time_chebyshev(n=9, k=20):
+    """Chebyshev subspace iteration vs. thick-restart Lanczos."""
+    from edpyt.trlanczos import eigsh as trlanczos_eigsh
+    H, V, sct = random_sector(n, n//2, n//2)
+    matvec = matvec_operator(*build_mb_ham(H, V, sct))
+    vectors = [0]
+    def counted(v, out):
+        vectors[0] += 1 if v.ndim == 1 else v.shape[1]
+        return matvec(v, out)
+    counted.inplace = True
+    counted.dtype = matvec.dtype
+    solvers = {
+        'chebyshev':lambda: eigsh(sct.d, k, counted),
+        'trlanczos':lambda: trlanczos_eigsh(sct.d, k, counted),
+    }
+    print(f'd = {sct.d}, k = {k}')
+    for name, solve in solvers.items():
+        vectors[0] = 0
+        start = perf_counter()
+        w, _ = solve()
+        print(f'{name:10s} {perf_counter()-start:8.3f} s {vectors[0]:6d} vectors egs = {w[0]:.12f}')
+
+
+if __name__ == '__main__':
+    time_chebyshev()
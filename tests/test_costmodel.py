@@ -0,0 +1,94 @@
+import numpy as np
+
+from edpyt import costmodel
+from edpyt.build_mb_ham import build_mb_ham
+from edpyt.costmodel import CostModel, estimate_nnz, set_cost_model
+from edpyt.espace import build_empty_sector, solve_sector
+from edpyt.matvec_product import todense
+
+from conftest import random_hamiltonian
+
+
+rng = np.random.default_rng(0)
+
+
+def test_estimate_nnz():
+    n = 7
+    H, V = random_hamiltonian(n, rng)
+    sct = build_empty_sector(n, 3, 3)
+    nnz = np.count_nonzero(todense(*build_mb_ham(H, V, sct)))
+    assert abs(estimate_nnz(H, sct) - nnz) < 0.05 * nnz
+    # Hund's coupling.
+    J = rng.random((n,n)) * (1 - np.eye(n))
+    V = {'U':V, 'Jx':J, 'Jp':J}
+    nnz = np.count_nonzero(todense(*build_mb_ham(H, V, sct)))
+    assert abs(estimate_nnz(H, sct, V) - nnz) < 0.05 * nnz
+
+
+def test_choose():
+    model = CostModel()
+    assert model.choose(100, 100, 1000) == 'lapack'
+    assert model.choose(10, 3, 100) in ['lapack', 'partial']
+    assert model.choose(100000, 1, 3000000) == 'sparse'
+
+
+def test_solve_sector_methods(tmp_path):
+    n = 6
+    H, V = random_hamiltonian(n, rng)
+    sct = build_empty_sector(n, 3, 3)
+    expected = np.linalg.eigvalsh(todense(*build_mb_ham(H, V, sct)))[:4]
+    model = CostModel(path=str(tmp_path / 'costmodel.json'))
+    try:
+        set_cost_model(model)
+        for method in costmodel.METHODS:
+            # Make method the cheapest.
+            for other in costmodel.METHODS:
+                model.coeffs[other] = np.full_like(model.coeffs[other], 0. if other == method else 1.)
+            assert model.choose(sct.d, 4, estimate_nnz(H, sct)) == method
+            eigvals, eigvecs = solve_sector(H, V, sct, 4)
+            np.testing.assert_allclose(eigvals, expected)
+            assert eigvecs.shape == (sct.d, 4)
+        model.save()
+        assert CostModel(path=model.path).choose(sct.d, 4, 0) == 'sparse'
+    finally:
+        set_cost_model(None)
+
+
+def test_solve_lapack_partial():
+    from edpyt.espace import _solve_lapack
+    n = 6
+    H, V = random_hamiltonian(n, rng)
+    sct = build_empty_sector(n, 3, 3)
+    w_expected, v_expected = _solve_lapack(H, V, sct)
+    w, v = _solve_lapack(H, V, sct, k=3)
+    assert v.shape == (sct.d, 3)
+    np.testing.assert_allclose(w, w_expected[:3])
+    np.testing.assert_allclose(abs(np.einsum('ij,ij->j', v, v_expected[:,:3])), 1.)
+    # Sliced eigenvectors do not keep the full matrix alive.
+    model = CostModel()
+    model.coeffs['partial'][:] = 1.
+    model.coeffs['sparse'][:] = 1.
+    model.coeffs['lapack'][:] = 0.
+    try:
+        set_cost_model(model)
+        eigvals, eigvecs = solve_sector(H, V, sct, 3)
+    finally:
+        set_cost_model(None)
+    assert eigvecs.base is None
+
+
+def time_solve_lapack(n=7, nup=3, ndw=3):
+    """Full vs. partial dense diagonalization."""
+    from time import perf_counter
+    from edpyt.espace import _solve_lapack
+    H, V = random_hamiltonian(n, rng)
+    sct = build_empty_sector(n, nup, ndw)
+    print(f'd = {sct.d}')
+    for k in [None, 1, 6, 50]:
+        start = perf_counter()
+        _solve_lapack(H, V, sct, k=k)
+        print(f'k = {k or sct.d:6d} {perf_counter()-start:8.3f} s')
+
+
+if __name__ == '__main__':
+    time_solve_lapack()
@@ -0,0 +1,73 @@
+import numpy as np
+
+from edpyt import counters
+from edpyt.build_mb_ham import build_mb_ham
+from edpyt.espace import build_empty_sector, build_espace
+from edpyt.matvec_product import matvec_operator
+from edpyt.shared import params
+
+from conftest import random_hamiltonian
+
+rng = np.random.default_rng(0)
+n = 4
+H, V = random_hamiltonian(n, rng, Jx=True)
+
+
+def test_counted_operator():
+    sct = build_empty_sector(n, 2, 2)
+    operators = build_mb_ham(H, V, sct)
+    vec = rng.random((sct.d,2))
+    expected = matvec_operator(*operators)(vec)
+
+    params['counters'] = True
+    try:
+        with counters.session('test') as records:
+            with counters.sector((2,2)):
+                matvec = matvec_operator(*operators)
+                np.testing.assert_allclose(matvec(vec), expected)
+                matvec(vec[:,0].copy())
+    finally:
+        params['counters'] = False
+
+    c = records[(2,2)]
+    assert list(c) == ['Local','UpHopping','DwHopping','NonLocal','matvec']
+    assert all(c[name].calls == 2 for name in c)
+    assert c['DwHopping'].nnz == 3 * operators[2].nnz * operators[2].dup
+    assert c['matvec'].nnz == sum(c[name].nnz for name in c if name != 'matvec')
+    assert c['matvec'].bytes == sum(c[name].bytes for name in c if name != 'matvec')
+
+
+def test_counted_operator_sell():
+    sct = build_empty_sector(n, 2, 2)
+    operators = build_mb_ham(H, V, sct)
+    vec = rng.random(sct.d)
+    expected = matvec_operator(*operators)(vec)
+
+    params['counters'] = True
+    try:
+        with counters.session('test') as records:
+            with counters.sector((2,2)):
+                matvec = matvec_operator(*operators, fmt='sell')
+                np.testing.assert_allclose(matvec(vec), expected)
+    finally:
+        params['counters'] = False
+
+    # The SELL kernel is counted as a whole.
+    assert list(records[(2,2)]) == ['matvec']
+    assert records[(2,2)]['matvec'].calls == 1
+
+
+def test_build_espace_counters():
+    # Large enough to be solved with ARPACK.
+    n = 7
+    H, V = random_hamiltonian(n, rng)
+    neig_sector = np.zeros((n+1)*(n+1), int)
+    neig_sector[3*(n+1)+3] = 1
+    params['counters'] = True
+    try:
+        with counters.session('test') as records:
+            espace, egs = build_espace(H, V, neig_sector)
+    finally:
+        params['counters'] = False
+    assert list(records) == [(3,3)]
+    assert records[(3,3)]['matvec'].calls > 0
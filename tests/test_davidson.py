@@ -0,0 +1,97 @@
+from time import perf_counter
+
+import numpy as np
+
+from edpyt.build_mb_ham import build_mb_ham
+from edpyt.davidson import eigsh
+from edpyt.espace import solve_sector
+from edpyt.matvec_product import matvec_operator, todense
+from edpyt.shared import params
+
+from conftest import random_sector
+
+
+def counted_operator(operators):
+    matvec = matvec_operator(*operators)
+    def counted(v, out):
+        counted.calls += 1
+        return matvec(v, out)
+    counted.calls = 0
+    counted.inplace = True
+    counted.dtype = matvec.dtype
+    return counted
+
+
+def test_davidson():
+    H, V, sct = random_sector(6, 3, 3)
+    operators = build_mb_ham(H, V, sct)
+    w_expected, v_expected = np.linalg.eigh(todense(*operators))
+
+    w, v = eigsh(sct.d, 4, matvec_operator(*operators), operators[0])
+    np.testing.assert_allclose(w, w_expected[:4])
+    overlap = abs(np.einsum('ij,ij->j', v, v_expected[:,:4]))
+    np.testing.assert_allclose(overlap[:2], 1.)
+    residual = todense(*operators).dot(v) - w * v
+    np.testing.assert_allclose(residual, 0., atol=1e-8)
+
+
+def test_davidson_single_precision():
+    import warnings
+    H, V, sct = random_sector(7, 3, 3)
+    expected = np.linalg.eigvalsh(todense(*build_mb_ham(H, V, sct)))
+    operators = build_mb_ham(H, V, sct, dtype=np.float32)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        w, v = eigsh(sct.d, 8, matvec_operator(*operators), operators[0])
+    assert v.dtype == np.float32
+    np.testing.assert_allclose(w, expected[:8], atol=1e-4)
+
+
+def test_davidson_strong_coupling():
+    from edpyt.trlanczos import eigsh as trlanczos_eigsh
+    H, V, sct = random_sector(8, 4, 4, U=20.)
+    operators = build_mb_ham(H, V, sct)
+    davidson = counted_operator(operators)
+    w, _ = eigsh(sct.d, 4, davidson, operators[0])
+    lanczos = counted_operator(operators)
+    w_expected, _ = trlanczos_eigsh(sct.d, 4, lanczos)
+    np.testing.assert_allclose(w, w_expected)
+    assert davidson.calls < lanczos.calls
+
+
+def test_solve_sector_davidson():
+    from edpyt import costmodel
+    H, V, sct = random_sector(7, 3, 3)
+    expected = np.linalg.eigvalsh(todense(*build_mb_ham(H, V, sct)))
+    model = costmodel.CostModel()
+    model.coeffs['sparse'][:] = 0.
+    params['eigsh'] = 'davidson'
+    try:
+        costmodel.set_cost_model(model)
+        eigvals, eigvecs = solve_sector(H, V, sct, k=6)
+    finally:
+        params['eigsh'] = 'trlanczos'
+        costmodel.set_cost_model(None)
+    np.testing.assert_allclose(eigvals, expected[:6])
+
+
+def time_davidson(n=10, k=6, U=40.):
+    """Davidson vs. thick-restart Lanczos."""
+    from edpyt.trlanczos import eigsh as trlanczos_eigsh
+    H, V, sct = random_sector(n, n//2, n//2, U)
+    operators = build_mb_ham(H, V, sct)
+    matvec = counted_operator(operators)
+    solvers = {
+        'davidson':lambda: eigsh(sct.d, k, matvec, operators[0]),
+        'trlanczos':lambda: trlanczos_eigsh(sct.d, k, matvec),
+    }
+    print(f'd = {sct.d}, k = {k}, U = {U}')
+    for name, solve in solvers.items():
+        matvec.calls = 0
+        start = perf_counter()
+        w, _ = solve()
+        print(f'{name:10s} {perf_counter()-start:8.3f} s {matvec.calls:6d} matvecs egs = {w[0]:.12f}')
+
+
+if __name__ == '__main__':
+    time_davidson()
@@ -0,0 +1,35 @@
+import numpy as np
+
+from edpyt.dedlib import siam_solve
+
+
+def test_siam_solve_nbatch():
+    z = np.linspace(-4,4,50)+0.05j
+    dos = lambda x: np.exp(-x**2)/np.sqrt(np.pi)
+    # Same samples are drawn and accepted in the same order.
+    expected = siam_solve(dos, z, n=4, N=6, rng=np.random.default_rng(1))
+    result = siam_solve(dos, z, n=4, N=6, rng=np.random.default_rng(1), nbatch=4)
+    for a, b in zip(result, expected):
+        np.testing.assert_allclose(a, b)
+
+
+def test_siam_solve_families(monkeypatch):
+    from edpyt import espace
+    z = np.linspace(-4,4,50)+0.05j
+    dos = lambda x: np.exp(-x**2)/np.sqrt(np.pi)
+    builds = [0]
+    samples = [0]
+    OperatorFamily = espace.OperatorFamily
+    build_espace_batch = espace.build_espace_batch
+    def counted_family(*args):
+        builds[0] += 1
+        return OperatorFamily(*args)
+    def counted_batch(Hs, *args, **kwargs):
+        samples[0] += len(Hs) // 2
+        return build_espace_batch(Hs, *args, **kwargs)
+    monkeypatch.setattr(espace, 'OperatorFamily', counted_family)
+    monkeypatch.setattr('edpyt.dedlib.build_espace_batch', counted_batch)
+    n = 4
+    siam_solve(dos, z, n=n, N=6, rng=np.random.default_rng(1), nbatch=4)
+    # One family per sector and sample, shared by U=0 and U!=0.
+    assert builds[0] == (n+1)**2 * samples[0]
@@ -2,6 +2,9 @@ import numpy as np
 
 from edpyt.espace import (
     build_espace,
+    build_espace_batch,
+    build_gs_espace,
+    screen_espace,
 )
 
 """Hubbard dimer.
@@ -52,3 +55,104 @@ def test_solve():
 
     # Ground state
     assert np.allclose(egs, EG0)
+
+
+def test_build_espace_batch():
+    rng = np.random.default_rng(0)
+    n = 5
+    Hs = []
+    for _ in range(3):
+        H = rng.random((n,n))
+        Hs.append(H + H.T)
+    Vs = [np.diag(rng.random(n)) for _ in Hs]
+    results = build_espace_batch(Hs, Vs, neig_sector=np.full((n+1)**2, 3))
+    for H, V, (espace, egs) in zip(Hs, Vs, results):
+        expected, expected_egs = build_espace(H, V, neig_sector=np.full((n+1)**2, 3))
+        assert np.allclose(egs, expected_egs)
+        assert espace.keys() == expected.keys()
+        for qns, sct in espace.items():
+            assert np.allclose(sct.eigvals, expected[qns].eigvals)
+            overlap = np.einsum('ij,ij->j', sct.eigvecs, expected[qns].eigvecs)
+            # Degenerate eigenvectors are defined up to a rotation.
+            assert np.allclose(np.linalg.norm(sct.eigvecs, axis=0), 1.)
+            assert (abs(overlap) <= 1.+1e-10).all()
+
+
+def test_build_gs_espace():
+    rng = np.random.default_rng(0)
+    n = 7
+    # Particle-hole symmetric impurity (spin degenerate ground state) and
+    # a random one.
+    H = np.zeros((n,n))
+    H[0,1:] = H[1:,0] = 0.5
+    H.flat[n+1::n+1] = np.linspace(-1,1,n-1)
+    V = np.zeros((n,n))
+    V[0,0] = 3.
+    H[0,0] = -1.5
+    Hr = rng.random((n,n))
+    for H, V in [(H, V), (Hr + Hr.T, np.diag(rng.random(n)))]:
+        expected, expected_egs = build_espace(H, V)
+        screen_espace(expected, expected_egs)
+        espace, egs = build_gs_espace(H, V)
+        assert np.allclose(egs, expected_egs)
+        assert espace.keys() == expected.keys()
+        for qns, sct in espace.items():
+            assert np.allclose(sct.eigvals, expected[qns].eigvals)
+
+
+def test_build_gs_espace_degenerate():
+    # Non-interacting degenerate levels: the ground state sector has more
+    # degenerate states than the initial # of eigenpairs.
+    n = 6
+    H = np.diag([-1.,0.,0.,0.,0.,1.])
+    V = np.zeros((n,n))
+    espace, egs = build_gs_espace(H, V)
+    expected, expected_egs = build_espace(H, V)
+    screen_espace(expected, expected_egs)
+    assert np.allclose(egs, expected_egs)
+    assert {qns:sct.eigvals.size for qns, sct in espace.items()} == \
+        {qns:sct.eigvals.size for qns, sct in expected.items()}
+
+
+def test_build_gs_espace_finite_beta():
+    # Zeeman split doublet, the split is larger than the margin but
+    # within the window of the screening (-log(cutoff)/beta): both spin
+    # sectors are kept.
+    n = 4
+    H = np.zeros((2,n,n))
+    H[:,0,1:] = H[:,1:,0] = 0.1
+    H[:,np.arange(n),np.arange(n)] = [-1.,1.,2.,3.]
+    H[0,0,0] -= 0.0025
+    H[1,0,0] += 0.0025
+    V = np.zeros((n,n))
+    V[0,0] = 10.
+    beta = 1e3
+    expected, expected_egs = build_espace(H, V)
+    screen_espace(expected, expected_egs, beta)
+    espace, egs = build_gs_espace(H, V, beta=beta)
+    assert sorted(espace.keys()) == sorted(expected.keys()) == [(0,1),(1,0)]
+    assert np.allclose(egs, expected_egs)
+    for qns, sct in espace.items():
+        assert np.allclose(sct.eigvals, expected[qns].eigvals)
+
+
+def test_estimate_egs():
+    from edpyt.build_mb_ham import OperatorFamily
+    from edpyt.espace import _estimate_egs, build_empty_sector, warm_start
+    from conftest import level_crossing_chain
+    n = 8
+    v = np.eye(n)
+    neig_sector = np.zeros((n+1)**2, int)
+    neig_sector[3*(n+1)+2] = 1
+    previous = None
+    for x in [-0.01, 0.01]:
+        h = level_crossing_chain(x, n)
+        expected, egs = build_espace(h, v, neig_sector)
+        sct = build_empty_sector(n, 3, 2)
+        family = OperatorFamily(h, v, sct)
+        e0, converged = _estimate_egs(h, v, sct, family, warm_start(previous, (3,2), sct))
+        assert converged
+        np.testing.assert_allclose(e0, egs)
+        previous = expected
+    # Not converged in energy.
+    assert not _estimate_egs(h, v, sct, family, maxn=15)[1]
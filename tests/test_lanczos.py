@@ -52,3 +52,114 @@ def test_build_sl_tridiag_egs():
         np.abs(computed[:,0]),
         atol=1e-6
     )
+
+
+def test_build_sl_tridiag_single_precision():
+    H32 = H.astype(np.float32)
+    def matvec(v):
+        return H32.dot(v)
+    matvec.dtype = np.float32
+    v0 = np.random.random(H.shape[0])
+    a, b = build_sl_tridiag(matvec, v0)
+
+    assert a.dtype == np.float64
+    np.testing.assert_allclose(
+        egs_tridiag(a, b[1:]),
+        np.linalg.eigvalsh(H)[0],
+        atol=1e-5
+    )
+
+
+def test_build_sl_tridiag_mv():
+    from edpyt.lanczos import build_sl_tridiag_mv
+    phi0 = np.random.random((H.shape[0],3))
+    phi0[:,1] = 0.
+    coeffs = build_sl_tridiag_mv(H.dot, phi0)
+
+    assert coeffs[1] is None
+    for i in [0,2]:
+        a, b = build_sl_tridiag(H.dot, phi0[:,i].copy())
+        np.testing.assert_allclose(coeffs[i][0], a)
+        np.testing.assert_allclose(coeffs[i][1], b)
+
+
+def test_build_sl_tridiag_inplace():
+    buffers = set()
+    def matvec(v, out):
+        buffers.add(id(out))
+        return H.dot(v, out)
+    matvec.inplace = True
+    v0 = np.random.random(H.shape[0])
+    a, b = build_sl_tridiag(matvec, v0)
+
+    # Lanczos vectors are rotated over three buffers.
+    assert len(buffers) <= 3
+    expected = build_sl_tridiag(H.dot, v0)
+    np.testing.assert_allclose(a, expected[0])
+    np.testing.assert_allclose(b, expected[1])
+
+
+def test_build_bl_tridiag_degenerate():
+    from edpyt.lanczos import build_bl_tridiag, bl_solve
+    rng = np.random.default_rng(0)
+    m = 400
+    # Three-fold degenerate ground state.
+    D = np.concatenate([[-1.,-1.,-1.], rng.random(m-3)])
+    Q = np.linalg.qr(rng.random((m,m)))[0]
+    A = (Q * D).dot(Q.T)
+    phi0 = rng.random((m,3))
+    a, b = build_bl_tridiag(A.dot, phi0)
+    w, X = bl_solve(A.dot, a, b, phi0, k=3)
+
+    np.testing.assert_allclose(w, -1.)
+    np.testing.assert_allclose(A.dot(X), -X, atol=1e-10)
+    np.testing.assert_allclose(X.T.dot(X), np.eye(3), atol=1e-8)
+
+
+def test_build_bl_tridiag_gf():
+    from edpyt.build_mb_ham import build_mb_ham
+    from edpyt.espace import build_empty_sector
+    from edpyt.gf_lanczos import block_continued_fraction
+    from edpyt.lanczos import build_bl_tridiag
+    from edpyt.matvec_product import matvec_operator, todense
+    rng = np.random.default_rng(0)
+    n = 6
+    Hs = rng.random((n,n))
+    Hs += Hs.T
+    V = np.diag(rng.random(n))
+    sct = build_empty_sector(n, 3, 3)
+    operators = build_mb_ham(Hs, V, sct)
+    phi0 = rng.random((sct.d,3))
+    # Linearly dependent starting vector is deflated.
+    phi0[:,2] = phi0[:,0] - phi0[:,1]
+    a, b = build_bl_tridiag(matvec_operator(*operators), phi0, maxn=sct.d, tol=0.)
+    assert a[0].shape == (2,2)
+    assert b[0].shape == (2,3)
+
+    z = np.array([-1.,0.5]) + 0.1j
+    A = todense(*operators)
+    expected = np.array([phi0.T.dot(np.linalg.solve(zz*np.eye(sct.d)-A, phi0)) for zz in z])
+    np.testing.assert_allclose(block_continued_fraction(a, b)(z.real, 0.1), expected, atol=1e-8)
+
+
+def test_sl_solve_basis():
+    from edpyt.lanczos import krylov_basis, sl_solve
+    v0 = np.random.random(H.shape[0])
+    w_expected, X_expected = np.linalg.eigh(H)
+    # RAM and memmap storage.
+    for memory in [None, 0]:
+        basis = krylov_basis(H.shape[0], 500, memory=memory)
+        assert (basis.path is None) == (memory is None)
+        a, b = build_sl_tridiag(H.dot, v0, basis=basis)
+        assert len(basis) == a.size
+        def matvec(v, out):
+            raise AssertionError('Second pass with stored basis.')
+        matvec.inplace = True
+        w, X = sl_solve(matvec, a, b, select=2, select_range=(0,0), basis=basis)
+        np.testing.assert_allclose(w, w_expected[0])
+        np.testing.assert_allclose(abs(X[:,0]), abs(X_expected[:,0]), atol=1e-6)
+        path = basis.path
+        basis.close()
+        if path is not None:
+            import os
+            assert not os.path.exists(path)
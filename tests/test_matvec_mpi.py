@@ -82,4 +82,63 @@
 # test_diag()
 # test_up()
 # test_dw()
-# test_matvec_product()
\ No newline at end of file
+# test_matvec_product()
+
+import numpy as np
+from mpi4py import MPI
+
+from edpyt.build_mb_ham import build_mb_ham
+from edpyt.espace import build_empty_sector
+from edpyt.matvec_product import matvec_operator
+
+from conftest import random_hamiltonian
+
+comm = MPI.COMM_WORLD
+
+
+def test_matvec_mpi_general():
+    # All processes have same matrices/vectors.
+    rng = np.random.default_rng(0)
+    n = 5
+    H, V = random_hamiltonian(n, rng, Jx=True)
+    sct = build_empty_sector(n, 1, 2) # dup=5, dwn=10
+    operators = build_mb_ham(H, V, sct)
+    vec = rng.random(sct.d)
+
+    expected = matvec_operator(*operators)(vec)
+    dup = sct.states.up.size
+    for nchunks in [1, 3]:
+        matvec = matvec_operator(*operators, comm=comm, nchunks=nchunks)
+        rows = matvec.transpose.dw_slice
+        rows = slice(rows.start*dup, rows.stop*dup)
+        res = matvec(vec[rows].copy())
+        np.testing.assert_allclose(res, expected[rows])
+        assert matvec.timings['dw'] > 0.
+        # Only the referenced elements of the vector are exchanged.
+        nl = operators[-1].tocsr()[rows]
+        assert matvec.halo.size == np.unique(nl.indices).size
+
+
+def time_matvec_mpi(n=12, nrep=20):
+    from time import perf_counter
+    rng = np.random.default_rng(0)
+    H, V = random_hamiltonian(n, rng)
+    sct = build_empty_sector(n, n//2, n//2)
+    operators = build_mb_ham(H, V, sct)
+    for nchunks in [1, 4]:
+        matvec = matvec_operator(*operators, comm=comm, nchunks=nchunks)
+        rows = matvec.transpose.dw_slice
+        vec = rng.random((rows.stop-rows.start)*sct.states.up.size)
+        out = np.empty_like(vec)
+        comm.Barrier()
+        start = perf_counter()
+        for _ in range(nrep):
+            matvec(vec, out)
+        elapsed = (perf_counter() - start) / nrep
+        if comm.rank == 0:
+            steps = ' '.join(f'{k}={v/nrep:.2e}' for k, v in matvec.timings.items())
+            print(f'nchunks={nchunks} : {elapsed:.3e} s ({steps})')
+
+
+if __name__ == '__main__':
+    time_matvec_mpi()
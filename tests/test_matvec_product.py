@@ -56,5 +56,103 @@ def time_kronsum():
     np.testing.assert_allclose(a,b)
 
 
+def test_matvec_product_fused():
+    from edpyt.ham_non_local import NonLocal
+
+    dup = 10
+    dwn = 20
+
+    Hup = UpHopping(random(dup,dup,density=0.3,format='csr'),dwn)
+    Hdw = DwHopping(random(dwn,dwn,density=0.3,format='csr'),dup)
+    Hnl = NonLocal(random(dup*dwn,dup*dwn,density=0.01,format='csr'))
+    Hdd = np.random.random(dup*dwn).view(Local)
+
+    H = todense(Hdd, Hup, Hdw, Hnl)
+
+    vec = np.random.random(dup*dwn)
+
+    # Operators are matched regardless of their order.
+    sp_matvec = matvec_operator(Hnl, Hdw, Hdd, Hup)
+    res = np.full_like(vec, np.nan)
+    sp_matvec(vec, res)
+    np.testing.assert_allclose(H.dot(vec), res)
+
+
+def test_matvec_product_multi_vector():
+
+    dup = 10
+    dwn = 20
+    k = 3
+
+    Hup = UpHopping(random(dup,dup,density=0.3,format='csr'),dwn)
+    Hdw = DwHopping(random(dwn,dwn,density=0.3,format='csr'),dup)
+    Hdd = np.random.random(dup*dwn).view(Local)
+
+    H = todense(Hdd, Hup, Hdw)
+
+    vec = np.random.random((dup*dwn,k+1))
+
+    sp_matvec = matvec_operator(Hdd, Hup, Hdw)
+    np.testing.assert_allclose(H.dot(vec[:,:k]), sp_matvec(vec[:,:k]))
+
+
+def test_matvec_product_inplace():
+
+    dup = 10
+    dwn = 20
+
+    Hup = UpHopping(random(dup,dup,density=0.3,format='csr'),dwn)
+    Hdw = DwHopping(random(dwn,dwn,density=0.3,format='csr'),dup)
+    Hdd = np.random.random(dup*dwn).view(Local)
+
+    vec = np.random.random(dup*dwn)
+
+    # Local is not the first operator.
+    for operators in [(Hdd, Hup, Hdw), (Hup, Hdw), (Hup, Hdd), (Hup, Hdw, Hdd)]:
+        sp_matvec = matvec_operator(*operators)
+        assert sp_matvec.inplace
+        out = np.random.random(dup*dwn)
+        res = sp_matvec(vec, out)
+        assert res is out
+        np.testing.assert_allclose(todense(*operators).dot(vec), out)
+
+
+def test_todense():
+    dup = 10
+    dwn = 20
+    Hup = UpHopping(random(dup,dup,density=0.3,format='csr'),dwn)
+    Hdw = DwHopping(random(dwn,dwn,density=0.3,format='csr'),dup)
+    Hdd = np.random.random(dup*dwn).view(Local)
+    expected = (np.kron(np.eye(dwn), Hup.toarray()) + np.kron(Hdw.toarray(), np.eye(dup))
+                + np.diag(Hdd))
+    H = todense(Hdd, Hup, Hdw)
+    assert H.flags.f_contiguous
+    np.testing.assert_allclose(H, expected)
+    # Overwrite
+    out = np.ones((dup*dwn,dup*dwn))
+    todense(Hup, Hdw, Hdd, out=out)
+    np.testing.assert_allclose(out, expected)
+
+
+def time_todense(n=8, nup=4, ndw=4):
+    """Direct dense assembly vs. kron products."""
+    from edpyt.build_mb_ham import build_mb_ham
+    from edpyt.espace import build_empty_sector
+    from conftest import random_hamiltonian
+    rng = np.random.default_rng(0)
+    H, V = random_hamiltonian(n, rng)
+    sct = build_empty_sector(n, nup, ndw)
+    Hdd, Hup, Hdw = build_mb_ham(H, V, sct)
+    print(f'd = {sct.d}')
+    todense(Hdd, Hup, Hdw)
+    s = perf_counter()
+    todense(Hdd, Hup, Hdw)
+    print(f'todense: {perf_counter()-s:.3f} s')
+    s = perf_counter()
+    np.kron(np.eye(Hup.dwn), Hup.toarray()) + np.kron(Hdw.toarray(), np.eye(Hdw.dup)) + np.diag(Hdd)
+    print(f'kron: {perf_counter()-s:.3f} s')
+
+
 if __name__ == '__main__':
-    time_kronsum()
\ No newline at end of file
+    time_kronsum()
+    time_todense()
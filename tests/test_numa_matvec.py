@@ -0,0 +1,67 @@
+import numpy as np
+
+from edpyt.build_mb_ham import build_mb_ham
+from edpyt.espace import build_empty_sector
+from edpyt.lanczos import build_sl_tridiag
+from edpyt.matvec_product import matvec_operator, todense
+from edpyt.numa_matvec import NumaMatvec, parse_cpulist
+from edpyt.tridiag import egs_tridiag
+
+from conftest import random_hamiltonian
+
+
+rng = np.random.default_rng(0)
+n = 6
+H, V = random_hamiltonian(n, rng, Jx=True)
+sct = build_empty_sector(n, 2, 3)
+
+
+def test_parse_cpulist():
+    assert parse_cpulist('0-3,8,10-11\n') == {0,1,2,3,8,10,11}
+
+
+def test_numa_matvec():
+    operators = build_mb_ham(H, V, sct)
+    vec = rng.random(sct.d)
+    expected = matvec_operator(*operators)(vec)
+
+    with NumaMatvec(*operators, nworkers=3) as matvec:
+        np.testing.assert_allclose(matvec(vec), expected)
+        # Shared vectors.
+        matvec.x[:] = vec
+        matvec(matvec.x, matvec.y)
+        np.testing.assert_allclose(matvec.y, expected)
+        # Lanczos.
+        a, b = build_sl_tridiag(matvec, rng.random(sct.d))
+    np.testing.assert_allclose(egs_tridiag(a, b[1:]),
+                               np.linalg.eigvalsh(todense(*operators))[0])
+
+
+def time_numa_matvec(n=14, nrep=20):
+    from time import perf_counter
+    H, V = random_hamiltonian(n, rng)
+    sct = build_empty_sector(n, n//2, n//2)
+    operators = build_mb_ham(H, V, sct)
+    vec = rng.random(sct.d)
+    out = np.empty_like(vec)
+
+    matvec = matvec_operator(*operators)
+    matvec(vec, out)
+    start = perf_counter()
+    for _ in range(nrep):
+        matvec(vec, out)
+    print(f'openmp : {(perf_counter()-start)/nrep:.3e} s')
+
+    with NumaMatvec(*operators) as matvec:
+        matvec.x[:] = vec
+        for copy in [True, False]:
+            v, o = (vec, out) if copy else (matvec.x, matvec.y)
+            matvec(v, o)
+            start = perf_counter()
+            for _ in range(nrep):
+                matvec(v, o)
+            print(f'numa ({matvec.nworkers} workers, copy={copy}) : {(perf_counter()-start)/nrep:.3e} s')
+
+
+if __name__ == '__main__':
+    time_numa_matvec()
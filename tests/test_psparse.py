@@ -37,4 +37,96 @@ def test_psparse_Multiply():
     result = np.zeros_like(w)
 
     _psparse.Multiply(A,w,result)
-    np.testing.assert_allclose(result, A.dot(w))
\ No newline at end of file
+    np.testing.assert_allclose(result, A.dot(w))
+
+def test_psparse_single_precision():
+    n = 3
+    m = 2
+
+    A = scipy.sparse.random(m, m, density=0.4, format='csr', dtype=np.float32)
+    B = scipy.sparse.random(n, n, density=0.4, format='csr', dtype=np.float32)
+    w = np.random.random(m*n).astype(np.float32)
+    W = w.reshape(n,m)
+    result = np.zeros_like(w)
+
+    _psparse.UPmultiply(A,w,result)
+    _psparse.DWmultiply(B,w,result)
+    assert result.dtype == np.float32
+    np.testing.assert_allclose(result, A.dot(W.T).T.flatten() + B.dot(W).flatten(), rtol=1e-5)
+
+
+def test_psparse_multi_vector():
+    n = 3
+    m = 2
+    k = 4
+
+    A = scipy.sparse.random(m, m, density=0.4, format='csr')
+    B = scipy.sparse.random(n, n, density=0.4, format='csr')
+    C = scipy.sparse.random(m*n, m*n, density=0.4, format='csr')
+    # Strided columns of a larger block.
+    w = np.random.random((m*n,k+2))[:,:k]
+    result = np.zeros((m*n,k))
+
+    _psparse.UPmultiply_mv(A,w,result)
+    _psparse.DWmultiply_mv(B,w,result)
+    _psparse.Multiply_mv(C,w,result)
+    for i in range(k):
+        W = w[:,i].reshape(n,m)
+        np.testing.assert_allclose(
+            result[:,i],
+            A.dot(W.T).T.flatten() + B.dot(W).flatten() + C.dot(w[:,i]))
+
+
+def test_psparse_DWmultiply_tiled():
+    n = 7
+    m = 50
+
+    A = scipy.sparse.random(n, n, density=0.4, format='csr')
+    w = np.random.random(m*n)
+    W = w.reshape(n,m)
+    for tile in [8, 64, m]:
+        result = np.zeros_like(w)
+        _psparse.DWmultiply(A,w,result,tile)
+        np.testing.assert_allclose(result, A.dot(W).flatten())
+
+
+def DWmultiply_transpose(A, w, result):
+    """DW spin multiplication with the transpose of the hilbert vector."""
+    ndw = A.shape[0]
+    nup = w.size // ndw
+    wt = np.ascontiguousarray(w.reshape(ndw,nup).T)
+    rt = np.zeros_like(wt)
+    _psparse.UPmultiply(A,wt.reshape(-1),rt.reshape(-1))
+    result.reshape(ndw,nup)[:] += rt.T
+
+
+def time_DWmultiply():
+    from time import perf_counter
+    from scipy.special import comb
+    nrep = 10
+    # (dup, dwn) for sectors with n sites.
+    for n in [10, 12, 14]:
+        for nup, ndw in [(n//2,n//2), (n//2,2), (2,n//2)]:
+            dup = int(comb(n,nup))
+            dwn = int(comb(n,ndw))
+            # Hoppings per many-body state ~ ndw * (n-ndw)
+            A = scipy.sparse.random(dwn, dwn, density=min(1.,ndw*(n-ndw)/dwn), format='csr')
+            w = np.random.random(dup*dwn)
+            result = np.zeros_like(w)
+            kernels = {
+                'strided': lambda: _psparse.DWmultiply(A,w,result,dup),
+                'tiled': lambda: _psparse.DWmultiply(A,w,result),
+                'transpose': lambda: DWmultiply_transpose(A,w,result),
+            }
+            timings = []
+            for name, kernel in kernels.items():
+                kernel()
+                start = perf_counter()
+                for _ in range(nrep):
+                    kernel()
+                timings.append(f'{name} : {(perf_counter()-start)/nrep:.2e}')
+            print(f'(dup, dwn) = ({dup:6d},{dwn:6d}) ', ' '.join(timings))
+
+
+if __name__ == '__main__':
+    time_DWmultiply()
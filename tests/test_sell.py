@@ -0,0 +1,87 @@
+import numpy as np
+import scipy
+
+from edpyt.backend import available_backends, load_backend
+from edpyt.build_mb_ham import build_mb_ham
+from edpyt.espace import build_empty_sector
+from edpyt.matvec_product import matvec_operator
+from edpyt.sell import to_sell
+
+from conftest import random_hamiltonian
+
+rng = np.random.default_rng(0)
+
+
+def test_to_sell():
+    X = scipy.sparse.random(37, 37, density=0.2, format='csr', random_state=rng)
+    for C, sigma in [(1,1), (4,1), (4,16), (8,64)]:
+        S = to_sell(X, C, sigma)
+        assert S.nnz == X.nnz
+        assert S.data.size == S.chunk_ptr[-1] >= X.nnz
+        np.testing.assert_allclose(S.tocsr().toarray(), X.toarray())
+
+
+def test_sell_multiply():
+    n = 7
+    m = 5
+    A = scipy.sparse.random(m, m, density=0.4, format='csr', random_state=rng)
+    B = scipy.sparse.random(n, n, density=0.4, format='csr', random_state=rng)
+    C = scipy.sparse.random(n*m, n*m, density=0.1, format='csr', random_state=rng)
+    w = rng.random(m*n)
+    W = w.reshape(n,m)
+    expected = A.dot(W.T).T.flatten() + B.dot(W).flatten() + C.dot(w)
+
+    for name in available_backends():
+        psparse = load_backend(name).psparse
+        for dtype in [np.float64, np.float32]:
+            result = np.zeros(m*n, dtype)
+            x = w.astype(dtype)
+            psparse.UPmultiply_sell(to_sell(A.astype(dtype), 2, 4), x, result)
+            psparse.DWmultiply_sell(to_sell(B.astype(dtype), 4, 4), x, result, 2)
+            psparse.Multiply_sell(to_sell(C.astype(dtype)), x, result)
+            np.testing.assert_allclose(result, expected, rtol=1e-5)
+
+
+def test_matvec_operator_sell():
+    n = 6
+    H, V = random_hamiltonian(n, rng, Jx=True)
+    sct = build_empty_sector(n, 3, 2)
+    operators = build_mb_ham(H, V, sct)
+    vec = rng.random(sct.d)
+    np.testing.assert_allclose(matvec_operator(*operators, fmt='sell')(vec),
+                               matvec_operator(*operators)(vec))
+
+
+def time_sell(n=14, nrep=20):
+    from time import perf_counter
+    from edpyt.backend import get_backend
+    psparse = get_backend().psparse
+    H, V = random_hamiltonian(n, rng)
+
+    def timeit(f, *args):
+        f(*args)
+        start = perf_counter()
+        for _ in range(nrep):
+            f(*args)
+        return (perf_counter() - start) / nrep
+
+    print(f'{"sector":10s} {"d":>9s} {"fill":>5s} '
+          f'{"up csr":>9s} {"up sell":>9s} {"dw csr":>9s} {"dw sell":>9s} {"speedup":>8s}')
+    for nup in range(n//2-2, n//2+1):
+        sct = build_empty_sector(n, nup, n//2)
+        _, sp_mat_up, sp_mat_dw = build_mb_ham(H, V, sct)
+        sell_up = to_sell(sp_mat_up)
+        sell_dw = to_sell(sp_mat_dw)
+        vec = rng.random(sct.d)
+        out = np.zeros_like(vec)
+        t = [timeit(psparse.UPmultiply, sp_mat_up, vec, out),
+             timeit(psparse.UPmultiply_sell, sell_up, vec, out),
+             timeit(psparse.DWmultiply, sp_mat_dw, vec, out),
+             timeit(psparse.DWmultiply_sell, sell_dw, vec, out)]
+        speedup = (t[0]+t[2]) / (t[1]+t[3])
+        print(f'{str((nup,n//2)):10s} {sct.d:9d} {sell_up.fill:5.2f} '
+              + ' '.join(f'{x:9.3e}' for x in t) + f' {speedup:8.2f}')
+
+
+if __name__ == '__main__':
+    time_sell()
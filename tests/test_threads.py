@@ -0,0 +1,68 @@
+import numpy as np
+
+from edpyt import threads
+from edpyt.backend import get_backend
+from edpyt.espace import build_espace
+from edpyt.threads import MIN_WORK, ThreadController, ranks_per_node, size_class
+
+from conftest import random_hamiltonian
+
+
+def test_ranks_per_node(monkeypatch):
+    monkeypatch.setenv('OMPI_COMM_WORLD_LOCAL_SIZE', '4')
+    assert ranks_per_node() == 4
+    monkeypatch.delenv('OMPI_COMM_WORLD_LOCAL_SIZE')
+    monkeypatch.setenv('SLURM_NTASKS_PER_NODE', '2(x3)')
+    assert ranks_per_node() == 2
+
+
+def test_controller_limit():
+    controller = ThreadController(max_threads=4)
+    assert controller.get('psparse', 10) == 1
+    assert controller.get('psparse', 3*MIN_WORK['psparse']) == 3
+    assert controller.get('psparse', 100*MIN_WORK['psparse']) == 4
+    controller.table['psparse'][size_class(1000)] = 2
+    assert controller.get('psparse', 1000) == 2
+
+    psparse = get_backend().psparse
+    previous = psparse.get_num_threads()
+    with controller.limit(1000, kernels=['psparse']):
+        if get_backend().name == 'cython':
+            assert psparse.get_num_threads() == 2
+    assert psparse.get_num_threads() == previous
+
+
+def test_controller_limit_numba_backend(monkeypatch):
+    calls = []
+    setters = {kernel:(lambda n, kernel=kernel: calls.append((kernel, n)) or (lambda: None))
+               for kernel in threads.KERNELS}
+    monkeypatch.setattr(threads, '_setters', setters)
+    monkeypatch.setattr(threads, 'get_backend', lambda: get_backend()._replace(name='numba'))
+    controller = ThreadController(max_threads=4)
+    controller.table['psparse'][size_class(1000)] = 3
+    controller.table['numba'][size_class(1000)] = 1
+    with controller.limit(1000):
+        pass
+    # psparse and numba share the numba thread pool, which is set once.
+    assert sorted(calls) == [('blas', 1), ('numba', 3)]
+
+
+def test_autotune(tmp_path):
+    path = str(tmp_path / 'threads.json')
+    controller = ThreadController(max_threads=1, path=path)
+    table = controller.autotune(sectors=[(6,3,3)], nrep=1)
+    assert table['psparse'] == {size_class(400):1}
+    assert ThreadController(max_threads=1, path=path).table == table
+
+
+def test_build_espace_with_controller():
+    rng = np.random.default_rng(0)
+    n = 4
+    H, V = random_hamiltonian(n, rng)
+    expected, egs_expected = build_espace(H, V)
+    threads.set_controller(ThreadController(max_threads=1))
+    try:
+        espace, egs = build_espace(H, V)
+    finally:
+        threads.set_controller(None)
+    assert np.isclose(egs, egs_expected)
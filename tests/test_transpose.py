@@ -19,4 +19,34 @@ def test_transpose():
     a = collect_up(b)
     np.testing.assert_allclose(a, expected)
 
-test_transpose()
\ No newline at end of file
+test_transpose()
+
+def test_transpose_uneven():
+    from edpyt.vector_transpose import VectorTranspose
+    dup = 2*size + 1
+    dwn = 3*size + 2
+    v = np.arange(dup*dwn, dtype=float).reshape(dwn,dup)
+    for nchunks in [1, 2]:
+        transpose = VectorTranspose(dup, dwn, comm, nchunks=nchunks)
+        a = v[transpose.dw_slice].copy()
+        b = transpose.collect_dw(a)
+        expected = np.hstack(transpose.chunks(b))
+        np.testing.assert_allclose(expected, v[:,transpose.up_slice])
+        np.testing.assert_allclose(transpose.collect_up(b), a)
+        np.testing.assert_allclose(transpose.allgather(a.reshape(-1)), v.reshape(-1))
+
+
+def test_vector_halo():
+    from edpyt.vector_transpose import VectorHalo, VectorTranspose
+    dup = 2*size + 1
+    dwn = 3*size + 2
+    v = np.arange(dup*dwn, dtype=float)
+    transpose = VectorTranspose(dup, dwn, comm)
+    # Different elements for each process (with repetitions).
+    rng = np.random.default_rng(rank)
+    indices = rng.integers(0, v.size, 2*dup)
+    halo = VectorHalo(indices, transpose)
+    rows = slice(transpose.dw_slice.start*dup, transpose.dw_slice.stop*dup)
+    out = halo.exchange(v[rows].copy())
+    np.testing.assert_allclose(out, v[halo.indices])
+    np.testing.assert_allclose(out[np.searchsorted(halo.indices, indices)], v[indices])
@@ -0,0 +1,135 @@
+from time import perf_counter
+
+import numpy as np
+
+from edpyt.build_mb_ham import build_mb_ham
+from edpyt.espace import solve_sector
+from edpyt.matvec_product import matvec_operator, todense
+from edpyt.trlanczos import TRLanczosWorkspace, eigsh
+
+from conftest import level_crossing_chain, random_sector
+
+
+def test_trlanczos():
+    H, V, sct = random_sector(6, 3, 3)
+    operators = build_mb_ham(H, V, sct)
+    matvec = matvec_operator(*operators)
+    w_expected, v_expected = np.linalg.eigh(todense(*operators))
+
+    w, v = eigsh(sct.d, 4, matvec)
+    np.testing.assert_allclose(w, w_expected[:4])
+    # Eigenvectors of non-degenerate eigenvalues.
+    overlap = abs(np.einsum('ij,ij->j', v, v_expected[:,:4]))
+    np.testing.assert_allclose(overlap[:2], 1.)
+    residual = todense(*operators).dot(v) - w * v
+    np.testing.assert_allclose(residual, 0., atol=1e-10)
+
+
+def test_trlanczos_workspace():
+    workspace = TRLanczosWorkspace(400, 20)
+    for n, nup, ndw in [(6,3,3),(6,2,3),(5,2,2)]:
+        H, V, sct = random_sector(n, nup, ndw)
+        operators = build_mb_ham(H, V, sct)
+        w, v = eigsh(sct.d, 3, matvec_operator(*operators), workspace=workspace)
+        np.testing.assert_allclose(w, np.linalg.eigvalsh(todense(*operators))[:3])
+        assert workspace.fits(sct.d, 20, np.float64)
+
+
+def test_trlanczos_invariant_subspace():
+    # The starting vector spans a 2-dimensional invariant subspace.
+    A = np.diag(np.arange(50.))
+    v0 = np.zeros(50)
+    v0[[10,20]] = 1.
+    w, v = eigsh(50, 3, A.dot, v0=v0)
+    np.testing.assert_allclose(w, [0.,1.,2.], atol=1e-12)
+
+
+def test_solve_sector():
+    H, V, sct = random_sector(7, 3, 3)
+    eigvals, eigvecs = solve_sector(H, V, sct, k=6)
+    expected = np.linalg.eigvalsh(todense(*build_mb_ham(H, V, sct)))
+    np.testing.assert_allclose(eigvals, expected[:6])
+
+
+def test_solve_sector_workspaces():
+    H, V, sct = random_sector(7, 3, 3)
+    workspaces = dict()
+    solve_sector(H, V, sct, k=2, workspaces=workspaces)
+    workspace = workspaces['trlanczos']
+    assert workspace.fits(sct.d, 20, np.float64)
+    # Reused by a smaller sector.
+    H, V, sct = random_sector(7, 2, 3)
+    solve_sector(H, V, sct, k=2, workspaces=workspaces)
+    assert workspaces['trlanczos'] is workspace
+
+
+def test_build_espace_warm_start():
+    from edpyt import counters
+    from edpyt.espace import build_espace
+    from edpyt.shared import params
+    H, V, sct = random_sector(7, 3, 3)
+    neig_sector = np.zeros(8*8, int)
+    neig_sector[3*8+3] = 4
+    espace, egs = build_espace(H, V, neig_sector)
+    # Slightly different bath.
+    H[1:,1:] += 1e-4 * np.diag(np.arange(6))
+    params['counters'] = True
+    try:
+        with counters.session('cold') as cold:
+            expected, egs_expected = build_espace(H, V, neig_sector)
+        with counters.session('warm') as warm:
+            espace, egs = build_espace(H, V, neig_sector, previous=espace)
+    finally:
+        params['counters'] = False
+    np.testing.assert_allclose(espace[(3,3)].eigvals, expected[(3,3)].eigvals)
+    assert warm[(3,3)]['matvec'].calls < cold[(3,3)]['matvec'].calls
+
+
+def test_build_espace_warm_start_level_crossing():
+    # The ground state of sector (3,2) changes symmetry and is
+    # orthogonal to the previous one.
+    from edpyt.espace import build_espace
+    from edpyt.shared import params
+    n = 8
+    V = np.eye(n)
+    neig_sector = np.zeros((n+1)**2, int)
+    neig_sector[3*(n+1)+2] = 1
+    for eigsh in ['trlanczos', 'davidson']:
+        params['eigsh'] = eigsh
+        try:
+            espace = None
+            for t in [-0.01, 0.01]:
+                H = level_crossing_chain(t, n)
+                expected, egs_expected = build_espace(H, V, neig_sector)
+                espace, egs = build_espace(H, V, neig_sector, previous=espace)
+        finally:
+            params['eigsh'] = 'trlanczos'
+        np.testing.assert_allclose(egs, egs_expected)
+
+
+def time_trlanczos(n=10, k=6):
+    """Thick-restart Lanczos vs. ARPACK."""
+    from edpyt import eigh_arpack
+    H, V, sct = random_sector(n, n//2, n//2)
+    matvec = matvec_operator(*build_mb_ham(H, V, sct))
+    calls = [0]
+    def counted(v, out):
+        calls[0] += 1
+        return matvec(v, out)
+    counted.inplace = True
+    counted.dtype = matvec.dtype
+    workspace = TRLanczosWorkspace(sct.d, max(2*k+1, 20))
+    solvers = {
+        'trlanczos':lambda: eigsh(sct.d, k, counted, workspace=workspace),
+        'arpack':lambda: eigh_arpack.eigsh(sct.d, k, counted),
+    }
+    print(f'd = {sct.d}, k = {k}')
+    for name, solve in solvers.items():
+        calls[0] = 0
+        start = perf_counter()
+        w, _ = solve()
+        print(f'{name:10s} {perf_counter()-start:8.3f} s {calls[0]:6d} matvecs egs = {w[0]:.12f}')
+
+
+if __name__ == '__main__':
+    time_trlanczos()